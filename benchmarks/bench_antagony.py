@@ -0,0 +1,91 @@
+"""
+Antagony table build time: the row-by-row loop create_brawler_antagony
+used to run against shared/pair_matrices.py.
+
+Generates synthetic crawls of the given sizes as brawler codes (popularity
+skewed like real picks, a few empty slots), then times:
+
+- loop: the former df.iterrows() loop over a DataFrame of names, run on
+  the first --loop-rows rows and extrapolated per row to the full size
+  (running it on 10M rows takes hours)
+- matrix: antagony_stats() on the codes, including the first-occurrence
+  scan that keeps the output order
+- render: antagony_json() and json.dumps of the result
+
+Both paths are run on the loop's rows and their JSON compared first.
+
+Run from the repository root:
+python3 -m benchmarks.bench_antagony --rows 1000000 10000000
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from shared.aggregates import antagony_json
+from shared.columnar import BRAWLER_COLUMNS
+from shared.pair_matrices import antagony_stats
+
+BRAWLERS = 80
+MISSING_SHARE = 0.01
+
+
+def synthetic_codes(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    popularity = 1 / np.arange(1, BRAWLERS + 1) ** 0.8
+    codes = rng.choice(BRAWLERS, size=(rows, 6), p=popularity / popularity.sum()).astype(np.uint16) + 1
+    codes[rng.random((rows, 6)) < MISSING_SHARE] = 0
+    return codes[:, :3], codes[:, 3:]
+
+
+def loop_antagony(df):
+    # The loop create_brawler_antagony ran before the matrix engine
+    antagony_stats = defaultdict(lambda: defaultdict(lambda: {'wins': 0, 'total': 0}))
+    for index, row in df.iterrows():
+        winners = [row['winner_1'], row['winner_2'], row['winner_3']]
+        losers = [row['loser_1'], row['loser_2'], row['loser_3']]
+        winners = [brawler for brawler in winners if pd.notna(brawler)]
+        losers = [brawler for brawler in losers if pd.notna(brawler)]
+        for winner in winners:
+            for loser in losers:
+                antagony_stats[winner][loser]['wins'] += 1
+                antagony_stats[winner][loser]['total'] += 1
+                antagony_stats[loser][winner]['total'] += 1
+    return antagony_json(antagony_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--loop-rows", type=int, default=20000, help="rows the row-by-row loop is timed on")
+    args = parser.parse_args()
+    names = [None] + [f"BRAWLER {index}" for index in range(BRAWLERS)]
+
+    winners, losers = synthetic_codes(args.loop_rows)
+    values = np.array([np.nan] + names[1:], dtype=object)
+    df = pd.DataFrame(values[np.hstack([winners, losers])], columns=BRAWLER_COLUMNS)
+    start = time.perf_counter()
+    expected = loop_antagony(df)
+    loop_per_row = (time.perf_counter() - start) / args.loop_rows
+    if json.dumps(antagony_json(antagony_stats(winners, losers, names))) != json.dumps(expected):
+        raise SystemExit("matrix output differs from the loop's")
+    print(f"Outputs match on {args.loop_rows} rows; loop: {loop_per_row * 1e6:.1f} us/row")
+
+    print(f"{'rows':>10} {'loop (est.)':>12} {'matrix':>9} {'render':>9} {'speedup':>9}")
+    for rows in args.rows:
+        winners, losers = synthetic_codes(rows)
+        start = time.perf_counter()
+        stats = antagony_stats(winners, losers, names)
+        matrix = time.perf_counter() - start
+        start = time.perf_counter()
+        json.dumps(antagony_json(stats), indent=4)
+        render = time.perf_counter() - start
+        loop = loop_per_row * rows
+        print(f"{rows:>10} {loop:>11.0f}s {matrix:>8.2f}s {render:>8.2f}s {loop / (matrix + render):>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+End-to-end crawler throughput against the local replay server.
+
+Starts benchmarks/replay_server.py in a separate process, then runs the
+crawler once per configuration, each in a fresh process and scratch
+directory, and reports battles/s, requests/s, battles per request, the
+dedup ratio (share of fetched battles that were already seen) and how long
+the crawl took to collect its first 10% of battles, which shows how quickly
+it ramps up. Server options such as latency and fault injection are the
+same as replay_server's.
+
+Run from the repository root:
+python3 -m benchmarks.bench_crawl --battles 20000 --latency-ms 80 --throttle-rate 0.01
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import replay_server
+
+# Crawler module constants overridden by each configuration
+CONFIGS = {
+    "default": {},
+    "workers-8": {"NUM_WORKERS": 8},
+    "workers-64": {"NUM_WORKERS": 64},
+    "warm-start": {"INITIAL_CONCURRENCY": 32},
+    "csv-only": {"WRITE_COLUMNAR": False},
+    "priority": {"PRIORITY_FRONTIER": True},
+    "seeded": {"SEED_RANKINGS": ("global", "US", "BR", "FR", "DE")},
+}
+# Seconds between samples of the row count for the ramp-up column
+RAMP_SAMPLE_INTERVAL = 0.05
+# RequestStats outcomes that each stand for one HTTP request
+REQUEST_OUTCOMES = ("ok", "not_found", "throttled", "server_error", "client_error", "timeout", "connection_error")
+
+
+def serve(args, ready):
+    server = replay_server.create_server(args)
+
+    async def run():
+        runner = replay_server.web.AppRunner(server.app())
+        await runner.setup()
+        site = replay_server.web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        ready.put((f"http://{host}:{port}/v1", server.source.seed_tag(), server.source.players))
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def run_crawl(base_url, seed_tag, battles, overrides, directory, verbose, results):
+    os.environ.setdefault("BRAWL_STARS_API_KEY", "local-replay")
+    os.chdir(directory)
+    os.makedirs("raw_data", exist_ok=True)
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    from data_fetching import get_battle_logs_battle_pov_csv_async as crawler
+
+    for name, value in overrides.items():
+        setattr(crawler, name, value)
+    start = time.perf_counter()
+    ramp_up = None
+
+    async def run():
+        nonlocal ramp_up
+        crawl_task = asyncio.create_task(crawler.main(seed_tag, battles, None, base_url))
+        while not crawl_task.done():
+            if ramp_up is None and crawler.count >= battles / 10:
+                ramp_up = time.perf_counter() - start
+            await asyncio.sleep(RAMP_SAMPLE_INTERVAL)
+        return crawl_task.result()
+
+    crawl = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    duplicates, unique = crawl.battle_tracker.get_counters()
+    results.put({
+        "rows": crawler.count,
+        "unique": unique,
+        "duplicates": duplicates,
+        "requests": sum(crawl.request_stats.get(outcome) for outcome in REQUEST_OUTCOMES),
+        "throttled": crawl.request_stats.get("throttled"),
+        "elapsed": elapsed,
+        "ramp_up": ramp_up if ramp_up is not None else elapsed,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    replay_server.add_arguments(parser)
+    parser.add_argument("--battles", type=int, default=20000, help="battle target of each crawl")
+    parser.add_argument("--rps", type=float, default=500, help="crawler REQUESTS_PER_SECOND")
+    parser.add_argument("--configs", nargs="+", choices=CONFIGS, default=list(CONFIGS))
+    parser.add_argument("--verbose", action="store_true", help="show the crawler's output")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(args, ready), daemon=True)
+    server.start()
+    base_url, seed_tag, players = ready.get()
+    print(
+        f"Replay server: {players} players, latency {args.latency_ms:g} ms (sigma {args.latency_sigma:g}), "
+        f"429 rate {args.throttle_rate:g}, 5xx rate {args.error_rate:g}, quota {args.max_rps or 'none'}"
+    )
+    print(
+        f"{'config':<14} {'battles':>8} {'battles/s':>10} {'requests/s':>11} {'battles/req':>12} "
+        f"{'dedup ratio':>12} {'429s':>6} {'seconds':>8} {'first 10%':>10}"
+    )
+
+    try:
+        for name in args.configs:
+            overrides = {"REQUESTS_PER_SECOND": args.rps, **CONFIGS[name]}
+            results = context.Queue()
+            with tempfile.TemporaryDirectory() as directory:
+                crawl = context.Process(
+                    target=run_crawl,
+                    args=(base_url, seed_tag, args.battles, overrides, directory, args.verbose, results),
+                )
+                crawl.start()
+                result = results.get()
+                crawl.join()
+            fetched = result["unique"] + result["duplicates"]
+            print(
+                f"{name:<14} {result['rows']:>8} {result['rows'] / result['elapsed']:>10.0f} "
+                f"{result['requests'] / result['elapsed']:>11.1f} {result['rows'] / result['requests']:>12.2f} "
+                f"{result['duplicates'] / fetched if fetched else 0:>12.3f} "
+                f"{result['throttled']:>6} {result['elapsed']:>8.2f} {result['ramp_up']:>9.2f}s"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
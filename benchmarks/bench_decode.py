@@ -0,0 +1,158 @@
+"""
+Throughput of battle log decoding.
+
+Compares the crawler's original path (json.loads of the whole response,
+then separate walks over the teams for the tags, the player's team and
+each team's brawlers) with shared.battlelog_decode.decode_battle_log,
+using the standard json module and, when installed, orjson.
+
+Run from the repository root:
+python3 -m benchmarks.bench_decode --logs 2000
+"""
+import argparse
+import json
+import random
+import time
+
+from shared import battlelog_decode
+from shared.battlelog_decode import decode_battle_log
+
+TAG_ALPHABET = "0289PYLQGRJCUV"
+MAP_MODES = {
+    "Hideout": "gemGrab",
+    "Undermine": "gemGrab",
+    "Pit Stop": "heist",
+    "Safe Zone": "heist",
+    "Belle's Rock": "knockout",
+    "Center Stage": "brawlBall",
+    # Not in the crawler's map pool
+    "Skull Creek": "duoShowdown",
+    "Bot Drop": "wipeout",
+}
+BRAWLERS = ["SHELLY", "COLT", "BULL", "BROCK", "RICO", "SPIKE", "CROW", "POCO", "PIPER", "PAM"]
+VALID_MAPS = {"Hideout", "Undermine", "Pit Stop", "Safe Zone", "Belle's Rock", "Center Stage"}
+VALID_MODES = {"gemGrab", "heist", "knockout", "brawlBall"}
+
+
+def random_tag(rng):
+    return "#" + "".join(rng.choice(TAG_ALPHABET) for _ in range(9))
+
+
+def synthetic_player(rng, tag):
+    return {
+        "tag": tag,
+        "name": "player",
+        "brawler": {
+            "id": 16000000 + rng.randrange(80),
+            "name": rng.choice(BRAWLERS),
+            "power": rng.randrange(1, 12),
+            "trophies": rng.randrange(1000),
+        },
+    }
+
+
+def synthetic_battle_log(rng, player_tag, items=25):
+    """A response shaped like /players/{tag}/battlelog, extra fields included."""
+    log = []
+    for _ in range(items):
+        map_name = rng.choice(list(MAP_MODES))
+        mode = MAP_MODES[map_name]
+        tags = [player_tag] + [random_tag(rng) for _ in range(5)]
+        rng.shuffle(tags)
+        log.append({
+            "battleTime": f"20240701T{rng.randrange(24):02d}{rng.randrange(60):02d}00.000Z",
+            "event": {"id": 15000000 + rng.randrange(500), "mode": mode, "map": map_name},
+            "battle": {
+                "mode": mode,
+                "type": rng.choice(["ranked", "soloRanked"]),
+                "result": rng.choice(["victory", "defeat"]),
+                "duration": rng.randrange(60, 180),
+                "trophyChange": rng.randrange(-8, 9),
+                "starPlayer": synthetic_player(rng, rng.choice(tags)),
+                "teams": [
+                    [synthetic_player(rng, tag) for tag in tags[:3]],
+                    [synthetic_player(rng, tag) for tag in tags[3:]],
+                ],
+            },
+        })
+    return json.dumps({"items": log, "paging": {"cursors": {}}}).encode()
+
+
+def keep(battle, event):
+    return bool(battle) and battle.get("mode") in VALID_MODES and event.get("map") in VALID_MAPS
+
+
+def decode_original(body, player_tag):
+    """The crawler's decoding before the lean path, minus dedup and output."""
+    rows = []
+    for item in json.loads(body).get("items", []):
+        battle, event = item.get("battle"), item.get("event")
+        if not keep(battle, event):
+            continue
+        teams = battle.get("teams", [])
+        player_tags = []
+        for team in teams:
+            for player in team:
+                player_tags.append(player["tag"])
+        player_tags.sort()
+        if len(teams) == 2:
+            primary_team_index = None
+            for index, team in enumerate(teams):
+                if any(player["tag"] == player_tag for player in team):
+                    primary_team_index = index
+                    break
+            primary_team = sorted(p["brawler"]["name"] for p in teams[primary_team_index])
+            opposing_team = sorted(p["brawler"]["name"] for p in teams[1 - primary_team_index])
+            rows.append((item.get("battleTime"), player_tags, primary_team, opposing_team))
+    return rows
+
+
+def measure(name, decode, logs):
+    start = time.perf_counter()
+    battles = 0
+    for player_tag, body in logs:
+        battles += len(decode(body, player_tag))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<24} {len(logs) / elapsed:>9.0f} logs/s  "
+        f"{battles / elapsed / 1e3:>7.1f}K battles/s  {elapsed * 1e6 / len(logs):>6.1f} us/log"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    logs = []
+    for _ in range(args.logs):
+        player_tag = random_tag(rng)
+        logs.append((player_tag, synthetic_battle_log(rng, player_tag)))
+    size = sum(len(body) for _, body in logs) / len(logs)
+    print(f"{args.logs} battle logs, {size / 1024:.1f} KiB each")
+
+    baseline = measure("original (json)", decode_original, logs)
+
+    backends = [("json", json.loads)]
+    if battlelog_decode.JSON_BACKEND == "orjson":
+        backends.append(("orjson", battlelog_decode.json_loads))
+    else:
+        print("orjson is not installed; skipping it")
+    default_loads = battlelog_decode.json_loads
+    try:
+        for backend, loads in backends:
+            battlelog_decode.json_loads = loads
+            elapsed = measure(
+                f"lean ({backend})",
+                lambda body, player_tag: decode_battle_log(body, player_tag, keep=keep)[0],
+                logs,
+            )
+            print(f"{'':<24} {baseline / elapsed:.2f}x the original path")
+    finally:
+        battlelog_decode.json_loads = default_loads
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Memory and throughput of the crawler's battle dedup structures.
+
+Compares the original set of concatenated battleTime + tag strings with
+DigestSet and BattleDedupIndex's Bloom-only mode, and measures the Bloom
+filter's observed false-positive rate.
+
+Run from the repository root:
+python3 -m benchmarks.bench_dedup --battles 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from shared.dedup import BattleDedupIndex, DigestSet, battle_digest
+
+TAG_ALPHABET = "0289PYLQGRJCUV"
+
+
+def synthetic_battles(count, seed=0):
+    rng = random.Random(seed)
+    battles = []
+    for _ in range(count):
+        battle_time = f"2024{rng.randrange(1, 13):02d}{rng.randrange(1, 29):02d}T{rng.randrange(24):02d}{rng.randrange(60):02d}{rng.randrange(60):02d}.000Z"
+        tags = sorted("#" + "".join(rng.choice(TAG_ALPHABET) for _ in range(9)) for _ in range(6))
+        battles.append((battle_time, tags))
+    return battles
+
+
+def measure(name, build, make_keys, probes):
+    # Memory pass: keys are produced lazily, so only what the index keeps
+    # alive (e.g. the strings held by a set) is counted
+    tracemalloc.start()
+    index = build()
+    for key in make_keys():
+        index.add(key)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = len(index)
+    del index
+
+    # Throughput pass, without tracemalloc overhead
+    keys = list(make_keys())
+    index = build()
+    start = time.perf_counter()
+    for key in keys:
+        if key not in index:
+            index.add(key)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    false_hits = sum(1 for key in probes if key in index)
+    probe_time = time.perf_counter() - start
+
+    print(
+        f"{name:<26} {current / size:>6.1f} B/battle  peak {peak / 2**20:>7.1f} MiB  "
+        f"check+insert {len(keys) / insert_time / 1e6:>5.2f} M/s  "
+        f"probe {len(probes) / probe_time / 1e6:>5.2f} M/s  "
+        f"false duplicates {false_hits / len(probes):.5f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--battles", type=int, default=1000000)
+    args = parser.parse_args()
+
+    battles = synthetic_battles(args.battles)
+    unseen = synthetic_battles(min(args.battles, 200000), seed=1)
+
+    def strings():
+        return (battle_time + "".join(tags) for battle_time, tags in battles)
+
+    def digests():
+        return (battle_digest(battle_time, tags) for battle_time, tags in battles)
+
+    unseen_strings = [battle_time + "".join(tags) for battle_time, tags in unseen]
+    unseen_digests = [battle_digest(battle_time, tags) for battle_time, tags in unseen]
+
+    print(f"{args.battles} battles, {len(unseen)} unseen probes")
+    measure("set of strings", set, strings, unseen_strings)
+    measure("DigestSet", DigestSet, digests, unseen_digests)
+    measure("Bloom only (0.1% budget)", lambda: BattleDedupIndex(bloom_capacity=args.battles), digests, unseen_digests)
+
+
+if __name__ == "__main__":
+    main()
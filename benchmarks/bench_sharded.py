@@ -0,0 +1,76 @@
+"""
+Sharded crawl throughput by number of shards.
+
+Starts benchmarks/replay_server.py in a separate process, then runs
+data_fetching/get_battle_logs_sharded.py once per shard count, each shard
+with its own key, and reports battles/s and the speedup over one shard.
+The server's --max-rps quota applies per key, so with a quota set this
+measures scaling with keys; without one, with cores.
+
+Run from the repository root:
+python3 -m benchmarks.bench_sharded --battles 50000 --max-rps 50 --shards 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from benchmarks import replay_server
+from benchmarks.bench_crawl import serve
+
+
+def run_sharded(base_url, seed_tag, battles, shards, requests_per_second, directory, verbose, results):
+    os.environ["BRAWL_STARS_API_KEYS"] = ",".join(f"local-replay-{index}" for index in range(shards))
+    os.environ["BRAWL_STARS_REQUESTS_PER_SECOND"] = str(requests_per_second)
+    os.chdir(directory)
+    os.makedirs("raw_data", exist_ok=True)
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    from data_fetching import get_battle_logs_sharded
+
+    rows, elapsed = get_battle_logs_sharded.main(seed_tag, battles, shards, base_url)
+    results.put({"rows": rows, "elapsed": elapsed})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    replay_server.add_arguments(parser)
+    parser.add_argument("--battles", type=int, default=50000, help="battle target of each crawl")
+    parser.add_argument("--rps", type=float, default=500, help="crawler requests per second per key")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--verbose", action="store_true", help="show the crawler's output")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(args, ready), daemon=True)
+    server.start()
+    base_url, seed_tag, players = ready.get()
+    print(
+        f"Replay server: {players} players, latency {args.latency_ms:g} ms, "
+        f"quota {args.max_rps or 'none'} per key, {os.cpu_count()} CPUs"
+    )
+    print(f"{'shards':>6} {'battles':>8} {'battles/s':>10} {'speedup':>8} {'seconds':>8}")
+
+    baseline = None
+    try:
+        for shards in args.shards:
+            results = context.Queue()
+            with tempfile.TemporaryDirectory() as directory:
+                crawl = context.Process(
+                    target=run_sharded,
+                    args=(base_url, seed_tag, args.battles, shards, args.rps, directory, args.verbose, results),
+                )
+                crawl.start()
+                result = results.get()
+                crawl.join()
+            rate = result["rows"] / result["elapsed"]
+            baseline = baseline or rate
+            print(f"{shards:>6} {result['rows']:>8} {rate:>10.0f} {rate / baseline:>7.2f}x {result['elapsed']:>8.2f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Synergy table build time: the row-by-row loop create_brawler_synergy used
+to run against synergy_matrices() in shared/pair_matrices.py.
+
+Uses the synthetic crawls of bench_antagony and random overall win rates,
+then times:
+
+- loop: the former df.iterrows() loop over a DataFrame of names, run on
+  the first --loop-rows rows and extrapolated per row to the full size
+- matrix: synergy_matrices() on the codes
+- render: synergy_json_from_matrices() and json.dumps of the result
+
+Both paths are run on the loop's rows and their JSON compared first.
+
+Run from the repository root:
+python3 -m benchmarks.bench_synergy --rows 1000000 10000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_antagony import BRAWLERS, synthetic_codes
+from shared.aggregates import synergy_json, synergy_json_from_matrices
+from shared.columnar import BRAWLER_COLUMNS
+from shared.pair_matrices import synergy_matrices
+
+
+def loop_synergy(df, brawlers, brawler_winrates):
+    # The loop create_brawler_synergy ran before the matrix engine
+    pairs = {brawler: {} for brawler in brawlers}
+    for index, row in df.iterrows():
+        winners = [row["winner_1"], row["winner_2"], row["winner_3"]]
+        losers = [row["loser_1"], row["loser_2"], row["loser_3"]]
+        winners = [winner for winner in winners if pd.notna(winner)]
+        losers = [loser for loser in losers if pd.notna(loser)]
+        if (
+            len(winners) != 3
+            or len(losers) != 3
+            or len(winners) != len(set(winners))
+            or len(losers) != len(set(losers))
+        ):
+            continue
+        for primary_idx in range(3):
+            for secondary_idx in range(3):
+                if primary_idx == secondary_idx:
+                    continue
+                pairs[winners[primary_idx]].setdefault(winners[secondary_idx], [0, 0])[0] += 1
+                pairs[losers[primary_idx]].setdefault(losers[secondary_idx], [0, 0])[1] += 1
+    return synergy_json(pairs, brawlers, brawler_winrates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--loop-rows", type=int, default=20000, help="rows the row-by-row loop is timed on")
+    args = parser.parse_args()
+    names = [None] + [f"BRAWLER {index}" for index in range(BRAWLERS)]
+    brawlers = names[1:]
+    winrates = list(np.random.default_rng(1).uniform(0.4, 0.6, BRAWLERS))
+    brawler_winrates = dict(zip(brawlers, winrates))
+
+    winners, losers = synthetic_codes(args.loop_rows)
+    values = np.array([np.nan] + brawlers, dtype=object)
+    df = pd.DataFrame(values[np.hstack([winners, losers])], columns=BRAWLER_COLUMNS)
+    start = time.perf_counter()
+    expected = loop_synergy(df, brawlers, brawler_winrates)
+    loop_per_row = (time.perf_counter() - start) / args.loop_rows
+    wins, losses = synergy_matrices(winners, losers, len(names))
+    if json.dumps(synergy_json_from_matrices(brawlers, wins[1:, 1:], losses[1:, 1:], winrates)) != json.dumps(expected):
+        raise SystemExit("matrix output differs from the loop's")
+    print(f"Outputs match on {args.loop_rows} rows; loop: {loop_per_row * 1e6:.1f} us/row")
+
+    print(f"{'rows':>10} {'loop (est.)':>12} {'matrix':>9} {'render':>9} {'speedup':>9}")
+    for rows in args.rows:
+        winners, losers = synthetic_codes(rows)
+        start = time.perf_counter()
+        wins, losses = synergy_matrices(winners, losers, len(names))
+        matrix = time.perf_counter() - start
+        start = time.perf_counter()
+        json.dumps(synergy_json_from_matrices(brawlers, wins[1:, 1:], losses[1:, 1:], winrates), indent=4)
+        render = time.perf_counter() - start
+        loop = loop_per_row * rows
+        print(f"{rows:>10} {loop:>11.0f}s {matrix:>8.2f}s {render:>8.2f}s {loop / (matrix + render):>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
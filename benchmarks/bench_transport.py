@@ -0,0 +1,141 @@
+"""
+Connection reuse and bytes transferred by the HTTP clients.
+
+Starts benchmarks/replay_server.py in a separate process and issues the
+same requests through each client, reading the connections opened and the
+response bytes sent from the server's /stats:
+
+- player lookups as utils.get_player_name made them (requests.get per
+  call) and as it makes them now (shared.transport.create_sync_session),
+  one at a time
+- concurrent battle log fetches through a default aiohttp.ClientSession
+  (the crawler's previous transport), through create_session(), through
+  create_session() with compression refused, and with keep-alive off
+
+The server is plain HTTP on localhost, so a new connection costs a TCP
+handshake only; against the real API each one is also a TLS handshake
+over the internet.
+
+Run from the repository root:
+python3 -m benchmarks.bench_transport --lookups 500 --fetches 5000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import urllib.request
+
+import aiohttp
+import requests
+
+from benchmarks import replay_server
+from benchmarks.bench_crawl import serve
+from shared.transport import create_session, create_sync_session
+
+CONCURRENCY = 32
+
+
+def server_stats(base_url):
+    with urllib.request.urlopen(base_url.rsplit("/v1", 1)[0] + "/stats") as response:
+        return json.load(response)
+
+
+def lookup_per_call(base_url, tags):
+    for tag in tags:
+        with requests.get(f"{base_url}/players/{tag.replace('#', '%23')}") as response:
+            response.json()
+
+
+def lookup_pooled(base_url, tags):
+    with create_sync_session() as session:
+        for tag in tags:
+            with session.get(f"{base_url}/players/{tag.replace('#', '%23')}") as response:
+                response.json()
+
+
+async def fetch_all(session, base_url, tags):
+    queue = asyncio.Queue()
+    for tag in tags:
+        queue.put_nowait(tag)
+
+    async def worker():
+        while not queue.empty():
+            tag = queue.get_nowait()
+            async with session.get(f"{base_url}/players/{tag.replace('#', '%23')}/battlelog") as response:
+                await response.read()
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+
+
+async def fetch_default(base_url, tags):
+    async with aiohttp.ClientSession() as session:
+        await fetch_all(session, base_url, tags)
+
+
+async def fetch_pooled(base_url, tags):
+    async with create_session(limit=CONCURRENCY, limit_per_host=CONCURRENCY) as session:
+        await fetch_all(session, base_url, tags)
+
+
+async def fetch_uncompressed(base_url, tags):
+    async with create_session(CONCURRENCY, CONCURRENCY, headers={"Accept-Encoding": "identity"}) as session:
+        await fetch_all(session, base_url, tags)
+
+
+async def fetch_no_keepalive(base_url, tags):
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY, force_close=True)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await fetch_all(session, base_url, tags)
+
+
+def measure(name, run, base_url, tags):
+    before = server_stats(base_url)
+    start = time.perf_counter()
+    run(base_url, tags)
+    elapsed = time.perf_counter() - start
+    after = server_stats(base_url)
+    requests_made = after["requests"] - before["requests"]
+    connections = after["connections"] - before["connections"]
+    kilobytes = (after["bytes_sent"] - before["bytes_sent"]) / 1024
+    print(
+        f"{name:<32} {requests_made:>8} {connections:>11} {requests_made / max(connections, 1):>9.1f} "
+        f"{kilobytes / requests_made:>9.2f} {kilobytes / 1024:>8.2f} {requests_made / elapsed:>9.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    replay_server.add_arguments(parser)
+    parser.set_defaults(latency_ms=5.0)
+    parser.add_argument("--lookups", type=int, default=500, help="sequential player lookups per client")
+    parser.add_argument("--fetches", type=int, default=5000, help="concurrent battle log fetches per client")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=serve, args=(args, ready), daemon=True)
+    server.start()
+    base_url, _, players = ready.get()
+    tags = [replay_server.player_tag(index % players) for index in range(max(args.lookups, args.fetches))]
+    print(f"Replay server: {players} players, latency {args.latency_ms:g} ms, gzip level {args.compress_level}")
+    print(
+        f"{'client':<32} {'requests':>8} {'connections':>11} {'req/conn':>9} "
+        f"{'KB/resp':>9} {'MB total':>8} {'req/s':>9}"
+    )
+    try:
+        measure("lookups: requests.get per call", lookup_per_call, base_url, tags[:args.lookups])
+        measure("lookups: pooled session", lookup_pooled, base_url, tags[:args.lookups])
+        for name, fetch in [
+            ("fetches: default ClientSession", fetch_default),
+            ("fetches: pooled session", fetch_pooled),
+            ("fetches: pooled, uncompressed", fetch_uncompressed),
+            ("fetches: no keep-alive", fetch_no_keepalive),
+        ]:
+            measure(name, lambda url, batch: asyncio.run(fetch(url, batch)), base_url, tags[:args.fetches])
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Local stand-in for the Brawl Stars API's battle log endpoint.
+
+Serves GET /v1/players/{tag}/battlelog from either a synthetic player graph
+or a directory of recorded responses, with configurable latency, injected
+429s and 5xx errors, and an optional requests-per-second quota. Synthetic
+graphs also serve player profiles from GET /v1/players/{tag} and player
+rankings from GET /v1/rankings/{location}/players. Responses are
+gzipped for clients that accept it, as the real API does. Request counts by
+status, response bytes sent and connections seen are served as JSON from
+GET /stats.
+
+Run from the repository root, then point the crawler at it:
+python3 -m benchmarks.replay_server --players 20000 --port 8080
+BRAWL_STARS_API_URL=http://127.0.0.1:8080/v1 BRAWL_STARS_API_KEY=local \\
+    python3 -m data_fetching.get_battle_logs_battle_pov_csv_async --player-tag <seed tag>
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import random
+import time
+import weakref
+import zlib
+from collections import Counter, deque
+from itertools import accumulate
+
+from aiohttp import web
+
+from shared.tags import TAG_ALPHABET
+
+TAG_LENGTH = 9
+BATTLES_PER_LOG = 25
+# (map, mode) pairs; the last two are outside the crawler's map pool and
+# exercise its filter
+EVENTS = [
+    ("Hideout", "gemGrab"),
+    ("Undermine", "gemGrab"),
+    ("Hard Rock Mine", "gemGrab"),
+    ("Pit Stop", "heist"),
+    ("Safe Zone", "heist"),
+    ("Bridge Too Far", "heist"),
+    ("Belle's Rock", "knockout"),
+    ("Flaring Phoenix", "knockout"),
+    ("Center Stage", "brawlBall"),
+    ("Pinball Dreams", "brawlBall"),
+    ("Shooting Star", "bounty"),
+    ("Hot Potato", "hotZone"),
+    ("Skull Creek", "duoShowdown"),
+    ("Bot Drop", "wipeout"),
+]
+BRAWLERS = [
+    "SHELLY", "COLT", "BULL", "BROCK", "RICO", "SPIKE", "BARLEY", "JESSIE",
+    "NITA", "DYNAMIKE", "EL PRIMO", "MORTIS", "CROW", "POCO", "BO", "PIPER",
+    "PAM", "TARA", "DARRYL", "PENNY", "FRANK", "GENE", "TICK", "LEON",
+    "ROSA", "CARL", "BIBI", "8-BIT", "SANDY", "BEA", "EMZ", "MR. P",
+]
+# Rankings: most players per ranking, as in the real API, and the number of
+# countries the synthetic players are spread over
+RANKING_LIMIT = 200
+COUNTRIES = 50
+# Error bodies as the real API words them
+ERROR_REASONS = {404: "notFound", 429: "throttled", 503: "inMaintenance"}
+
+
+def player_tag(index):
+    """Tag of the synthetic player `index`, always TAG_LENGTH characters."""
+    chars = []
+    for _ in range(TAG_LENGTH):
+        index, digit = divmod(index, len(TAG_ALPHABET))
+        chars.append(TAG_ALPHABET[digit])
+    return "#" + "".join(reversed(chars))
+
+
+class SyntheticGraph:
+    """
+    A bounded population of players who play battles with each other.
+
+    Each battle has six distinct players, so every battle shows up in up to
+    six battle logs and a full crawl sees it that many times, as in the
+    real API. A player's log is the last BATTLES_PER_LOG battles they took
+    part in.
+
+    Players differ like real ones: activity is Pareto distributed, so a few
+    players fill their logs quickly while many have short, old logs, and
+    `casual_share` of the players mostly play modes outside the crawler's
+    map pool and are mostly matched with each other.
+    """
+
+    def __init__(self, players, seed=0, casual_share=0.25, casual_off_pool=0.7, ranked_off_pool=0.05):
+        self.players = players
+        self.seed = seed
+        self.tags = {player_tag(index): index for index in range(players)}
+        rng = random.Random(seed)
+        activity = [rng.paretovariate(1.5) for _ in range(players)]
+        # Rankings list the most active players, like the real ones mostly do
+        self.by_activity = sorted(range(players), key=lambda index: -activity[index])
+        casual = [rng.random() < casual_share for _ in range(players)]
+        groups = {
+            flag: [index for index in range(players) if casual[index] == flag] or list(range(players))
+            for flag in (False, True)
+        }
+        group_weights = {flag: list(accumulate(activity[index] for index in members)) for flag, members in groups.items()}
+        all_weights = list(accumulate(activity))
+        on_pool_events = list(range(len(EVENTS) - 2))
+        off_pool_events = [len(EVENTS) - 2, len(EVENTS) - 1]
+
+        battle_count = players * BATTLES_PER_LOG // 6
+        # Battles are 10 seconds apart and the newest one ends at startup
+        self.epoch = int(time.time()) - battle_count * 10
+        self.battles = []
+        self.logs = [deque(maxlen=BATTLES_PER_LOG) for _ in range(players)]
+        for battle_id in range(battle_count):
+            host = rng.choices(range(players), cum_weights=all_weights)[0]
+            # Matchmaking mostly pairs players of the same kind
+            if rng.random() < 0.8:
+                members, weights = groups[casual[host]], group_weights[casual[host]]
+            else:
+                members, weights = range(players), all_weights
+            participants = [host]
+            while len(participants) < 6:
+                index = rng.choices(members, cum_weights=weights)[0]
+                if index not in participants:
+                    participants.append(index)
+            rng.shuffle(participants)
+            off_pool = rng.random() < (casual_off_pool if casual[host] else ranked_off_pool)
+            event = rng.choice(off_pool_events if off_pool else on_pool_events)
+            self.battles.append((participants, event, rng.randrange(2)))
+            for index in participants:
+                self.logs[index].append(battle_id)
+
+    def seed_tag(self):
+        return player_tag(0)
+
+    def battle_log(self, tag):
+        index = self.tags.get(tag)
+        if index is None:
+            return None
+        items = [self._item(battle_id, index) for battle_id in reversed(self.logs[index])]
+        return json.dumps({"items": items, "paging": {"cursors": {}}}).encode()
+
+    def player(self, tag):
+        index = self.tags.get(tag)
+        if index is None:
+            return None
+        rng = random.Random(index * 104729 + self.seed)
+        trophies = rng.randrange(1000, 60000)
+        return json.dumps({
+            "tag": tag,
+            "name": f"player {index}",
+            "trophies": trophies,
+            "highestTrophies": trophies + rng.randrange(2000),
+            "expLevel": rng.randrange(1, 300),
+        }).encode()
+
+    def ranking(self, location, limit):
+        # Each country holds an arbitrary but fixed slice of the players
+        if location == "global":
+            members = self.by_activity
+        else:
+            country = zlib.crc32(location.encode()) % COUNTRIES
+            members = [index for index in self.by_activity if index % COUNTRIES == country]
+        items = []
+        for rank, index in enumerate(members[:limit], 1):
+            items.append({
+                "tag": player_tag(index),
+                "name": f"player {index}",
+                "trophies": 80000 - 50 * rank,
+                "rank": rank,
+            })
+        return json.dumps({"items": items, "paging": {"cursors": {}}}).encode()
+
+    def _item(self, battle_id, index):
+        participants, event, winning_team = self.battles[battle_id]
+        map_name, mode = EVENTS[event]
+        # Brawler picks only depend on the battle, so every log agrees
+        rng = random.Random(battle_id * 7919 + self.seed)
+        battle_time = time.gmtime(self.epoch + battle_id * 10)
+        teams = [
+            [
+                {
+                    "tag": player_tag(participant),
+                    "name": f"player {participant}",
+                    "brawler": {
+                        "id": 16000000 + rng.randrange(len(BRAWLERS)),
+                        "name": rng.choice(BRAWLERS),
+                        "power": rng.randrange(1, 12),
+                        "trophies": rng.randrange(1000),
+                    },
+                }
+                for participant in team
+            ]
+            for team in (participants[:3], participants[3:])
+        ]
+        on_winning_team = (participants.index(index) < 3) == (winning_team == 0)
+        return {
+            "battleTime": time.strftime("%Y%m%dT%H%M%S.000Z", battle_time),
+            "event": {"id": 15000000 + event, "mode": mode, "map": map_name},
+            "battle": {
+                "mode": mode,
+                "type": "soloRanked" if battle_id % 3 == 0 else "ranked",
+                "result": "victory" if on_winning_team else "defeat",
+                "duration": 60 + battle_id % 120,
+                "trophyChange": 8 if on_winning_team else -8,
+                "teams": teams,
+            },
+        }
+
+
+class RecordedLogs:
+    """Battle logs recorded as `<tag without #>.json` files in a directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.players = len([name for name in os.listdir(directory) if name.endswith(".json")])
+
+    def seed_tag(self):
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                return "#" + name[: -len(".json")]
+        return None
+
+    def battle_log(self, tag):
+        path = os.path.join(self.directory, f"{tag.lstrip('#')}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def player(self, tag):
+        # Only battle logs are recorded
+        return None
+
+    def ranking(self, location, limit):
+        return None
+
+
+class ReplayServer:
+    """
+    Request handler with the latency, fault and quota model.
+
+    Latency is log-normal with the given median and sigma (sigma 0 gives a
+    constant delay). When `max_rps` is set, requests beyond that rate get
+    429s with a Retry-After header; like the real API, the quota applies
+    per key (Authorization header), so sharded crawls can use several. `throttle_rate` and
+    `error_rate` inject 429s and 503s at random on top of it. Bodies are
+    gzipped at `compress_level` when the request accepts gzip (0 disables
+    compression).
+    """
+
+    def __init__(self, source, latency_ms=50.0, latency_sigma=0.5, throttle_rate=0.0,
+                 error_rate=0.0, retry_after=1.0, max_rps=None, seed=0, compress_level=1):
+        self.source = source
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_rps = max_rps
+        self.compress_level = compress_level
+        self.rng = random.Random(seed)
+        # key -> [tokens, last refill]
+        self.quotas = {}
+        self.statuses = Counter()
+        self.bytes_sent = 0
+        # Open client connections, to count each one once
+        self.transports = weakref.WeakSet()
+        self.connections = 0
+        self.started = time.monotonic()
+
+    def _latency(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def _over_quota(self, key):
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        quota = self.quotas.setdefault(key, [self.max_rps, now])
+        quota[0] = min(self.max_rps, quota[0] + (now - quota[1]) * self.max_rps)
+        quota[1] = now
+        if quota[0] < 1:
+            return True
+        quota[0] -= 1
+        return False
+
+    def _respond(self, request, status, body=None, headers=None):
+        self.statuses[status] += 1
+        if request.transport is not None and request.transport not in self.transports:
+            self.transports.add(request.transport)
+            self.connections += 1
+        if body is None:
+            body = json.dumps({"reason": ERROR_REASONS[status]}).encode()
+        headers = dict(headers or {})
+        if self.compress_level and "gzip" in request.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, self.compress_level)
+            headers["Content-Encoding"] = "gzip"
+        self.bytes_sent += len(body)
+        return web.Response(status=status, body=body, headers=headers, content_type="application/json")
+
+    async def _serve(self, request, lookup):
+        await asyncio.sleep(self._latency())
+        if self._over_quota(request.headers.get("Authorization")) or self.rng.random() < self.throttle_rate:
+            return self._respond(request, 429, headers={"Retry-After": f"{self.retry_after:g}"})
+        if self.rng.random() < self.error_rate:
+            return self._respond(request, 503)
+        body = lookup(request)
+        if body is None:
+            return self._respond(request, 404)
+        return self._respond(request, 200, body)
+
+    async def battle_log(self, request):
+        return await self._serve(request, lambda request: self.source.battle_log(request.match_info["tag"]))
+
+    async def player(self, request):
+        return await self._serve(request, lambda request: self.source.player(request.match_info["tag"]))
+
+    async def ranking(self, request):
+        try:
+            limit = min(RANKING_LIMIT, int(request.query.get("limit", RANKING_LIMIT)))
+        except ValueError:
+            limit = RANKING_LIMIT
+        return await self._serve(
+            request, lambda request: self.source.ranking(request.match_info["location"], limit)
+        )
+
+    async def stats(self, request):
+        elapsed = time.monotonic() - self.started
+        return web.json_response({
+            "requests": sum(self.statuses.values()),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "bytes_sent": self.bytes_sent,
+            "connections": self.connections,
+            "uptime": elapsed,
+        })
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/v1/players/{tag}/battlelog", self.battle_log)
+        app.router.add_get("/v1/players/{tag}", self.player)
+        app.router.add_get("/v1/rankings/{location}/players", self.ranking)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def add_arguments(parser):
+    """Adds the server's source, latency and fault options to `parser`."""
+    parser.add_argument("--players", type=int, default=20000, help="size of the synthetic player graph")
+    parser.add_argument("--recordings", metavar="DIR", help="serve recorded <tag>.json logs instead")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--max-rps", type=float, help="answer requests beyond this rate per key with 429")
+    parser.add_argument("--compress-level", type=int, default=1, help="gzip level for clients that accept it, 0 to disable")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def create_server(args):
+    if args.recordings:
+        source = RecordedLogs(args.recordings)
+    else:
+        source = SyntheticGraph(args.players, args.seed)
+    return ReplayServer(
+        source,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        max_rps=args.max_rps,
+        seed=args.seed,
+        compress_level=args.compress_level,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    server = create_server(args)
+    print(
+        f"Serving {server.source.players} players at http://{args.host}:{args.port}/v1, "
+        f"seed tag {server.source.seed_tag()}"
+    )
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,32 @@
 import os
 import time
+import argparse
 import hashlib
 import csv
+import json
 import asyncio
 import aiohttp
 from dotenv import load_dotenv
 from datetime import datetime
+from shared.rate_limiter import RateLimiter
+from shared.retry import CircuitBreaker, RequestStats, backoff_delay
+from shared.checkpoint import CrawlCheckpoint, journal_path_for, load_checkpoint
+from shared.battle_writer import BattleWriter
+from shared.battle_data import aggregates_path_for, columnar_path_for
+from shared.aggregates import BRAWLER_DATA, AggregateSink
+from shared.columnar import ColumnarBattleWriter
+from shared.dedup import BattleDedupIndex, battle_digest
+from shared.frontier import PlayerFrontier, PriorityFrontier
+from shared.tags import decode_tag, encode_tag
+from shared.battlelog_decode import battle_timestamp, decode_battle_log
+from shared.metrics import CrawlMetrics, start_metrics_server
+from shared.watermarks import PlayerWatermarks, next_poll_time
+from shared.transport import ConnectionStats, create_session
+from shared.battle_filter import DEFAULT_CONFIG, load_battle_filter
+from shared.columnar import BATTLE_COLUMNS, BRAWLER_COLUMNS
+from shared.profiles import ProfileCache, ProfileService
+from shared.seeding import SeedSources
+from shared.fetch_outcomes import FetchOutcomes
 
 # Load environment variables from .env file
 start_time = time.time()
@@ -19,13 +40,36 @@ if not API_KEY:
 
 # Headers for the API request
 HEADERS = {"Authorization": f"Bearer {API_KEY}"}
+# Point this at a local stand-in (see benchmarks/replay_server.py) to test the crawler offline
+API_BASE_URL = os.getenv("BRAWL_STARS_API_URL", "https://api.brawlstars.com/v1")
+
+# Mode, map rotation and battle type rules of kept battles (see shared/battle_filter.py)
+BATTLE_FILTER_CONFIG = os.getenv("BATTLE_FILTER_CONFIG", DEFAULT_CONFIG)
+
+# Request quota of the API key, shared by every worker through the rate limiter
+REQUESTS_PER_SECOND = float(os.getenv("BRAWL_STARS_REQUESTS_PER_SECOND", "20"))
+
+# Connect/read timeouts so a dead socket never holds a worker for long
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5, sock_read=10)
+# Attempts per player for 429s, 5xx, timeouts and connection errors
+MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+
+# Set to the expected battle count to replace the exact battle dedup table
+# with a fixed-size Bloom filter; ~0.1% of new battles are then discarded
+# as false duplicates and lookups are slower, so only use it to cap memory.
+DEDUP_BLOOM_CAPACITY = None
 
 
 class BattleLogTracker:
     def __init__(self):
         self.duplicate_battles = 0
         self.unique_battles = 0
-        self.processed_battles = set()
+        # Battles skipped without a dedup check because a previous fetch of
+        # the same player already covered them
+        self.stale_battles = 0
+        self.processed_battles = BattleDedupIndex(bloom_capacity=DEDUP_BLOOM_CAPACITY)
         self.lock = asyncio.Lock()
 
     def update_unique_battles(self):
@@ -34,6 +78,9 @@ class BattleLogTracker:
     def update_duplicate_battles(self):
         self.duplicate_battles += 1
 
+    def update_stale_battles(self):
+        self.stale_battles += 1
+
     def get_counters(self):
         return self.duplicate_battles, self.unique_battles
 
@@ -70,153 +117,412 @@ class BrawlerStats:
         return self.brawler_winrates, self.brawler_pickrates
 
 
-def get_player_team_index(player_tag, teams):
-    for index, team in enumerate(teams):
-        for player in team:
-            if player["tag"] == player_tag:
-                return index
-    return None
+def create_battle_hash(battle_time, player_tags):
+    return battle_digest(battle_time, player_tags)
 
 
-def create_battle_hash(battle_time, player_tags):
-    unique_string = battle_time + "".join(player_tags)
-    return unique_string
+async def request_battle_log(crawl, player_tag):
+    """
+    Fetches a player's battle log, retrying transient failures.
+
+    Returns:
+    bytes: the raw battle log body, or None if the request failed for good
+    """
+    crawl.battle_logs_requested += 1
+    return await request_api(crawl, f'/players/{player_tag.replace("#", "%23")}/battlelog')
+
+
+async def request_profile(crawl, player_tag):
+    """Fetches a player's profile; the `fetch` of the crawl's ProfileService."""
+    return await request_api(crawl, f'/players/{player_tag.replace("#", "%23")}')
+
+
+async def request_api(crawl, path):
+    """
+    GETs an API path under the crawl's rate limiter and circuit breaker,
+    retrying transient failures.
+
+    Returns:
+    bytes: the raw response body, or None if the request failed for good
+    """
+    BASE_URL = crawl.base_url + path
+    rate_limiter, circuit_breaker, request_stats, metrics = (
+        crawl.rate_limiter,
+        crawl.circuit_breaker,
+        crawl.request_stats,
+        crawl.metrics,
+    )
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        wait_start = time.monotonic()
+        await circuit_breaker.wait()
+        await rate_limiter.acquire()
+        request_start = time.monotonic()
+        metrics.observe_wait(request_start - wait_start)
+        status, retry_after, outcome = None, None, None
+        try:
+            # Leaving the block releases the connection, whatever the outcome
+            async with crawl.session.get(BASE_URL, timeout=REQUEST_TIMEOUT) as response:
+                status = response.status
+                retry_after = response.headers.get("Retry-After")
+                if status == 200:
+                    body = await response.read()
+                    outcome = "ok"
+                elif status == 404:
+                    outcome = "not_found"
+                elif status == 429:
+                    outcome = "throttled"
+                elif status >= 500:
+                    outcome = "server_error"
+                else:
+                    outcome = "client_error"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            outcome = "connection_error"
+        except Exception:
+            # Counted as a failure, which also frees the breaker's probe if
+            # this request was it; the worker logs the error
+            circuit_breaker.record_failure()
+            raise
+        finally:
+            latency = time.monotonic() - request_start
+            rate_limiter.release(status, latency, retry_after)
+        request_stats.record(outcome)
+        metrics.record_response(status, latency, outcome)
+
+        if outcome in ("server_error", "timeout", "connection_error"):
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+
+        if outcome == "ok":
+            return body
+        if outcome in ("not_found", "client_error"):
+            return None
+        if attempt < MAX_ATTEMPTS:
+            request_stats.record("retried")
+            # 429s are already paused by the rate limiter's Retry-After handling
+            if outcome != "throttled":
+                await asyncio.sleep(backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY))
+
+    request_stats.record("gave_up")
+    print(f"Failed to fetch {path}: {outcome}")
+    return None
 
 
-def valid_battle(battle, event, only_ranked):
-    if not battle or not event.get("map") or not event.get("mode"):
+async def fetch_battle_log(crawl, current_player_tag):
+    """
+    Fetches a player's battle log and writes its new valid battles.
+
+    The fetch is recorded in crawl.fetch_outcomes once its request is made.
+
+    Returns:
+    int: number of rows written for this player
+    """
+    battle_tracker, checkpoint, fetch_outcomes = crawl.battle_tracker, crawl.checkpoint, crawl.fetch_outcomes
+    if battle_tracker.unique_battles > crawl.battle_quantity:
+        return 0
+    # Backpressure: hold new requests while the writer is behind
+    await crawl.writer.wait_for_space()
+    current_player_code = encode_tag(current_player_tag)
+    body = await request_battle_log(crawl, current_player_tag)
+    if body is None:
+        fetch_outcomes.record(False, failed=True)
+        return 0
+    processing_start = time.perf_counter()
+    try:
+        records, items = decode_battle_log(
+            body, current_player_tag, keep=crawl.battle_filter, with_players=crawl.trophies
+        )
+    except ValueError:
+        crawl.request_stats.record("bad_payload")
+        fetch_outcomes.record(False, failed=True)
+        return 0
+    # Share of this log that passed the filter, a hint for its players' logs
+    valid_share = len(records) / items if items else 0.0
+    shard = crawl.shard
+    new_rows = 0
+    new_players = 0
+    watermark = crawl.watermarks.get(current_player_code)
+    battle_times = []
+    profiles = {}
+    if crawl.profiles is not None:
+        # Awaited off the processing clock: the lookups wait on the network
+        processing_time = time.perf_counter() - processing_start
+        profiles = await look_up_profiles(crawl, records, watermark)
+        processing_start = time.perf_counter() - processing_time
+
+    for record in records:  # In a Battle
+        player_tags = record.player_tags
+        battle_time = battle_timestamp(record.battle_time)
+        if battle_time is not None:
+            battle_times.append(battle_time)
+            # Already ingested when this player was last fetched
+            if battle_time <= watermark:
+                battle_tracker.update_stale_battles()
+                continue
+
+        row = None
+        if record.primary_team is not None:
+            primary_team, opposing_team = record.primary_team, record.opposing_team
+            if record.result == "victory":
+                winners, losers = primary_team, opposing_team
+            else:
+                winners, losers = opposing_team, primary_team
+
+            while len(primary_team) < 3:
+                primary_team.append("N/A")
+            while len(opposing_team) < 3:
+                opposing_team.append("N/A")
+            row = [
+                record.event_mode,
+                record.map_name,
+                winners[0],
+                winners[1],
+                winners[2],
+                losers[0],
+                losers[1],
+                losers[2],
+            ]
+            if crawl.trophies:
+                row += trophy_cells(record, profiles)
+
+        # Avoid duplicate battles; in a sharded crawl only the battle's
+        # owner dedups and writes it
+        battle_hash = create_battle_hash(record.battle_time, player_tags)
+        if shard is None or shard.owns_battle(battle_hash):
+            is_new = record_battle(crawl, battle_hash, row)
+        else:
+            is_new = shard.forward_battle(battle_hash, row)
+
+        if row is None:
+            continue
+        if is_new:
+            new_rows += 1
+        if crawl.refresh:
+            # Refreshes only re-poll known players
+            continue
+        # Duplicates are reported too: they tell the frontier how much of
+        # these players' logs is already known
+        for player in player_tags:
+            try:
+                player_code = encode_tag(player)
+            except ValueError:
+                continue
+            if shard is not None and not shard.owns_player(player_code):
+                shard.forward_player(player_code, battle_time, valid_share)
+            elif crawl.frontier.observe(player_code, battle_time, valid_share):
+                checkpoint.log_frontier(player)
+                new_players += 1
+
+    # Once the target is reached the log may have been cut short, so the
+    # player stays unvisited and a resumed crawl fetches them again
+    if not crawl.target_reached.is_set():
+        # Later fetches of this player only need battles after the newest one seen
+        watermark = max(battle_times + [watermark])
+        next_poll = next_poll_time(time.time(), battle_times, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+        crawl.watermarks.update(current_player_code, watermark, next_poll)
+        checkpoint.log_watermark(current_player_tag, watermark, next_poll)
+        checkpoint.log_player(current_player_tag)
+    # Players handed to other shards are not counted: only their owner knows if they are new
+    fetch_outcomes.record(new_rows or new_players)
+    crawl.metrics.observe_processing(time.perf_counter() - processing_start)
+    return new_rows
+
+
+async def look_up_profiles(crawl, records, watermark):
+    """
+    Looks up the profiles of the players of a log's battles that may be new.
+
+    Battles already deduped or older than the watermark are skipped, so
+    their players' profiles are not requested. A battle owned by another
+    shard cannot be checked here and is looked up regardless.
+
+    Returns:
+    dict: player tag -> profile or None
+    """
+    battle_tracker, shard = crawl.battle_tracker, crawl.shard
+    tags = []
+    for record in records:
+        if record.team_players is None:
+            continue
+        battle_time = battle_timestamp(record.battle_time)
+        if battle_time is not None and battle_time <= watermark:
+            continue
+        battle_hash = create_battle_hash(record.battle_time, record.player_tags)
+        if (shard is None or shard.owns_battle(battle_hash)) and battle_tracker.is_battle_processed(battle_hash):
+            continue
+        for team in record.team_players:
+            tags.extend(tag for tag, _ in team)
+    return await crawl.profiles.get_many(tags)
+
+
+def trophy_cells(record, profiles):
+    """
+    TROPHY_COLUMNS cells of a battle: the brawler trophies, then the
+    player trophies, of winners 1-3 and losers 1-3. Padding slots and
+    unknown values are left empty.
+    """
+    primary_players, opposing_players = record.team_players
+    if record.result == "victory":
+        winners, losers = primary_players, opposing_players
+    else:
+        winners, losers = opposing_players, primary_players
+    slots = (winners + [None] * 3)[:3] + (losers + [None] * 3)[:3]
+    brawler_trophies, player_trophies = [], []
+    for slot in slots:
+        if slot is None:
+            brawler_trophies.append("")
+            player_trophies.append("")
+            continue
+        tag, trophies = slot
+        profile = profiles.get(tag)
+        brawler_trophies.append("" if trophies is None else trophies)
+        player_trophies.append("" if profile is None or profile["trophies"] is None else profile["trophies"])
+    return brawler_trophies + player_trophies
+
+
+def seed_frontier(crawl, tags):
+    """
+    Queues seed tags; players already visited or queued are skipped, as are
+    players of other shards.
+
+    Returns:
+    int: number of tags queued
+    """
+    added = 0
+    for tag in tags:
+        try:
+            player_code = encode_tag(tag)
+        except ValueError:
+            continue
+        if crawl.shard is not None and not crawl.shard.owns_player(player_code):
+            continue
+        if crawl.frontier.add(player_code):
+            crawl.checkpoint.log_frontier(tag)
+            added += 1
+    return added
+
+
+def reserve_row(crawl):
+    """
+    Takes one row of the battle target before it is written: across all
+    shards in a sharded crawl (see ShardRouter.reserve_row), else from the
+    rows this crawl wrote.
+
+    Returns:
+    bool: False once the target is reached
+    """
+    if crawl.shard is not None:
+        return crawl.shard.reserve_row()
+    return count < crawl.battle_quantity
+
+
+def record_battle(crawl, battle_hash, row):
+    """
+    Dedups a battle and writes its row if it is new.
+
+    Args:
+    battle_hash (int): battle digest
+    row (list): CSV row, or None for battles that are only deduped
+
+    Returns:
+    bool: True if the battle was new
+    """
+    global count  # Declare that we are using the global variable
+    battle_tracker = crawl.battle_tracker
+    if battle_tracker.is_battle_processed(battle_hash):
+        battle_tracker.update_duplicate_battles()
         return False
-    
-    valid_maps = {
-        "Canal Grande",
-        "Hideout",
-        "Shooting Star",
-        "Belle's Rock",
-        "Flaring Phoenix",
-        "Out in the Open",
-        "Center Stage",
-        "Galaxy Arena",
-        "Penalty Kick",
-        "Pinball Dreams",
-        "Retina",
-        "Dueling Beetles",
-        "Parallel Plays",
-        "Hot Potato",
-        "Kaboom Canyon",
-        "Bridge Too Far",
-        "Pit Stop",
-        "Safe Zone",
-        "Split",
-        "Double Swoosh",
-        "Hard Rock Mine",
-        "Undermine",
-    }
-    if battle.get("mode") not in ["gemGrab", "knockout", "heist", "hotZone", "bounty", "brawlBall"] or event.get("map") not in valid_maps or "5V5" in event.get("mode"):  
+    if row is not None and not reserve_row(crawl):
+        # The crawl wrote its target; the battle stays unrecorded
+        crawl.target_reached.set()
         return False
+    battle_tracker.add_processed_battle(battle_hash)
+    battle_tracker.update_unique_battles()
+    crawl.checkpoint.log_battle(battle_hash)
+    if row is not None:
+        count += 1
+        crawl.writer.write_row(row)
+    return True
 
-    if only_ranked and battle and battle.get('type') != "soloRanked":
-        return False
 
-    return True
+def receive_players(crawl, players):
+    # Sightings handed off by other shards
+    for player_code, battle_time, valid_share in players:
+        if crawl.frontier.observe(player_code, battle_time, valid_share):
+            crawl.checkpoint.log_frontier(decode_tag(player_code))
 
 
-async def fetch_battle_log(
-    session,
-    current_player_tag,
-    seen_players,
-    to_traverse,
-    battle_tracker,
-    csv_writer,
-    semaphore,
-    num_battles,
-):
-    BASE_URL = f'https://api.brawlstars.com/v1/players/{current_player_tag.replace("#", "%23")}/battlelog'
-    async with semaphore:  # Acquire semaphore before making the request
-        if battle_tracker.unique_battles > num_battles:
-            return
-        response = await session.get(BASE_URL, headers=HEADERS)
-        if response.status == 200:
-            battle_log = await response.json()
-            if current_player_tag not in seen_players:  # Avoid seen players
-                for item in battle_log.get("items", []):  # In a Battle
-                    battle, event = item.get("battle"), item.get("event")
-                    if not valid_battle(battle, event, False):
-                        continue
-
-                    teams = battle.get("teams", [])
-                    player_tags = []
-                    for team in teams:
-                        for player in team:
-                            player_tags.append(player["tag"])
-                    player_tags.sort()
-
-                    # Avoid duplicate battles
-                    battle_hash = create_battle_hash(
-                        item.get("battleTime"), player_tags
-                    )
-                    if battle_tracker.is_battle_processed(battle_hash):
-                        battle_tracker.update_duplicate_battles()
-                        continue
-                    battle_tracker.add_processed_battle(battle_hash)
-                    battle_tracker.update_unique_battles()
-
-                    if len(teams) == 2:
-                        primary_team_index = get_player_team_index(
-                            current_player_tag, teams
-                        )
-                        primary_team_victory = (
-                            True
-                            if (
-                                battle.get("result")
-                                and battle.get("result") == "victory"
-                            )
-                            else False
-                        )
-                        primary_team = sorted(
-                            p["brawler"]["name"] for p in teams[primary_team_index]
-                        )
-                        opposing_team = sorted(
-                            p["brawler"]["name"] for p in teams[1 - primary_team_index]
-                        )
-                        winnners, losers = [], []
-                        if primary_team_victory:
-                            winners = primary_team
-                            losers = opposing_team
-                        else:
-                            winners = opposing_team
-                            losers = primary_team
-
-                        while len(primary_team) < 3:
-                            primary_team.append("N/A")
-                        while len(opposing_team) < 3:
-                            opposing_team.append("N/A")
-                        global count  # Declare that we are using the global variable
-                        count += 1
-                        print(count)
-                        csv_writer.writerow(
-                            [
-                                item.get("event").get("mode"),
-                                item.get("event").get("map"),
-                                winners[0],
-                                winners[1],
-                                winners[2],
-                                losers[0],
-                                losers[1],
-                                losers[2],
-                            ]
-                        )
-                        for player in player_tags:
-                            to_traverse.add(player)
-
-            seen_players.add(current_player_tag)
-        else:
-            print(f"Failed to fetch battle log: RESPONSE {response.status}")
-            global failures
-            failures += 1
+def receive_battles(crawl, battles):
+    # Battles this shard owns, found by other shards
+    for battle_hash, row in battles:
+        record_battle(crawl, battle_hash, row)
 
 
 count = 0
-failures = 0
+
+# Number of long-lived fetch workers, the ceiling for the rate limiter's
+# adaptive concurrency window
+NUM_WORKERS = 32
+INITIAL_CONCURRENCY = 5
+# Tags held in the frontier queue; beyond that, overflow tags are spilled
+# to disk in chunks of FRONTIER_SPILL_THRESHOLD
+FRONTIER_SIZE = 10000
+FRONTIER_SPILL_THRESHOLD = 100000
+# Set to the expected number of distinct players to keep the seen-player set
+# in a fixed-size Bloom filter instead of an exact table
+SEEN_PLAYERS_BLOOM_CAPACITY = None
+# Fetch the players expected to yield the most new valid battles first
+# instead of in discovery order (see PriorityFrontier). Off by default:
+# bench_crawl shows no reliable yield gain and about 16% less throughput
+PRIORITY_FRONTIER = False
+# Seconds between checkpoint commits
+CHECKPOINT_INTERVAL = 30
+# Output stage: rows buffered before fetches pause, and the flush policy
+WRITER_MAX_PENDING = 50000
+FLUSH_ROWS = 20000
+FLUSH_INTERVAL = 5.0
+WRITE_BUFFER_SIZE = 1 << 20
+# Also write a dictionary-encoded columnar copy of the crawl (see shared/columnar.py)
+WRITE_COLUMNAR = True
+WRITE_PARQUET = False
+# Keep brawler, map, antagony and synergy counts up to date while writing,
+# saved every AGGREGATE_SNAPSHOT_INTERVAL seconds (see shared/aggregates.py)
+WRITE_AGGREGATES = True
+AGGREGATE_SNAPSHOT_INTERVAL = 60
+# Re-poll schedule for --refresh (see shared/watermarks.py), in seconds.
+# Players without a battle in REFRESH_ACTIVE_WINDOW are no longer polled.
+MIN_POLL_INTERVAL = 3600
+MAX_POLL_INTERVAL = 7 * 24 * 3600
+REFRESH_ACTIVE_WINDOW = 14 * 24 * 3600
+# Seconds between metrics snapshot lines in <csv>.metrics (see shared/metrics.py)
+METRICS_INTERVAL = 10
+# Append each slot's brawler trophies (from the battle log) and player
+# trophies (from the players' profiles, see shared/profiles.py) to new crawls
+WRITE_TROPHIES = False
+# Profiles cached and for how long, in seconds
+PROFILE_CACHE_SIZE = 200000
+PROFILE_TTL = 6 * 3600
+# Profile requests allowed per battle log request; lookups past the budget
+# leave the player trophies empty. At 0.5 about one player trophy cell in
+# ten is filled, filling all of them takes about 11 (see README)
+PROFILE_REQUEST_SHARE = 0.5
+PROFILE_BATCH_SIZE = 16
+# Warm start: seed a new or resumed crawl's frontier from these sources as
+# well as its start tag (see shared/seeding.py). SEED_RANKINGS are ranking
+# locations such as "global" or "US"; SEED_PREVIOUS_RUNS is a directory of
+# earlier crawls, e.g. "raw_data".
+SEED_FILES = ()
+SEED_RANKINGS = ()
+SEED_PREVIOUS_RUNS = None
+SEED_LIMIT = 20000
+# Starting concurrency window when seeding queued work for every worker;
+# an unseeded crawl starts at INITIAL_CONCURRENCY while its frontier grows
+SEEDED_CONCURRENCY = 32
+TROPHY_COLUMNS = [f"{column}_brawler_trophies" for column in BRAWLER_COLUMNS] + [
+    f"{column}_player_trophies" for column in BRAWLER_COLUMNS
+]
 
 def format_number(value):
     if value >= 1_000_000:
@@ -227,77 +533,455 @@ def format_number(value):
         return str(value)
     
 
-async def main(initial_player_tag, battle_quantity):
-    battle_tracker = BattleLogTracker()
-    seen_players, to_traverse = set(), set()
-    to_traverse.add(initial_player_tag)
+def default_csv_file_name(battle_quantity):
+    date_time_str = datetime.now().strftime("%m-%d-%Y_%I:%M_%p").lower()
+    return f"raw_data/battle_logs_{date_time_str}_{format_number(battle_quantity)}.csv"
 
-    # Initialize a semaphore to limit concurrent requests
-    semaphore = asyncio.Semaphore(5)  # Limit to 10 concurrent requests
 
-    date_time_str = datetime.now().strftime("%m-%d-%Y_%I:%M_%p").lower()
-    csv_file_name = (
-        f"raw_data/battle_logs_{date_time_str}_{format_number(battle_quantity)}.csv"
+def create_frontier(csv_file_name):
+    frontier_class = PriorityFrontier if PRIORITY_FRONTIER else PlayerFrontier
+    return frontier_class(
+        FRONTIER_SIZE,
+        spill_path=f"{csv_file_name}.frontier",
+        spill_threshold=FRONTIER_SPILL_THRESHOLD,
+        seen_capacity=SEEN_PLAYERS_BLOOM_CAPACITY,
     )
-    # Open CSV file for writing
-    with open(csv_file_name, "w", newline="") as csvfile:
-        csv_writer = csv.writer(csvfile)
-        # Write CSV header
-        csv_writer.writerow(
-            [
-                "battle_mode",
-                "map_name",
-                "winner_1",
-                "winner_2",
-                "winner_3",
-                "loser_1",
-                "loser_2",
-                "loser_3",
-            ]
+
+
+class CrawlContext:
+    """Shared state and services handed to every crawl worker."""
+
+    def __init__(
+        self,
+        session,
+        frontier,
+        battle_tracker,
+        writer,
+        rate_limiter,
+        circuit_breaker,
+        request_stats,
+        checkpoint,
+        metrics,
+        watermarks,
+        battle_filter,
+        battle_quantity,
+        base_url=API_BASE_URL,
+        refresh=False,
+        shard=None,
+        profiles=None,
+        fetch_outcomes=None,
+    ):
+        self.session = session
+        self.frontier = frontier
+        self.battle_tracker = battle_tracker
+        self.writer = writer
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.request_stats = request_stats
+        self.checkpoint = checkpoint
+        self.metrics = metrics
+        self.watermarks = watermarks
+        self.battle_filter = battle_filter
+        self.refresh = refresh
+        # ShardRouter of a sharded crawl (see shared/sharding.py), else None
+        self.shard = shard
+        # ProfileService when the crawl writes TROPHY_COLUMNS, else None
+        self.profiles = profiles
+        self.trophies = profiles is not None
+        self.battle_quantity = battle_quantity
+        self.base_url = base_url.rstrip("/")
+        self.target_reached = asyncio.Event()
+        # Workers between taking a tag and finishing its fetch
+        self.fetching = 0
+        self.battle_logs_requested = 0
+        # What each fetch produced
+        self.fetch_outcomes = fetch_outcomes if fetch_outcomes is not None else FetchOutcomes()
+
+
+async def crawl_worker(crawl):
+    # Long-lived worker: keeps pulling tags until the target is reached or
+    # the crawl is cancelled. Stopping at the target matters: get() does not
+    # yield while tags are queued, so a worker that kept going would drain
+    # the whole frontier before main() could cancel it.
+    while not crawl.target_reached.is_set():
+        player_code = await crawl.frontier.get()
+        player_tag = decode_tag(player_code)
+        crawl.fetching += 1
+        new_battles = 0
+        try:
+            new_battles = await fetch_battle_log(crawl, player_tag)
+        except Exception as error:
+            # One bad response or bug must not take the worker down with it
+            crawl.request_stats.record("worker_error")
+            print(f"Failed to process {player_tag}: {error!r}")
+        finally:
+            crawl.fetching -= 1
+            crawl.frontier.record_yield(player_code, new_battles)
+            crawl.frontier.task_done()
+        if count >= crawl.battle_quantity:
+            crawl.target_reached.set()
+
+
+async def checkpoint_periodically(crawl):
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        crawl.writer.request_checkpoint(
+            crawl.checkpoint.snapshot(count, crawl.battle_tracker)
         )
 
-        async with aiohttp.ClientSession() as session:
-            while to_traverse and count < battle_quantity:
-                # Copy the current traversal set to avoid modifying it while iterating
-                traverse_copy = to_traverse.copy()
-                to_traverse.clear()
-                tasks = []
-                for (
-                    player_tag
-                ) in (
-                    traverse_copy
-                ):  # Process every player in the traversal copy, resulting in newly encountered players being processed
-                    if count >= battle_quantity:
-                        break
-                    tasks.append(
-                        fetch_battle_log(
-                            session,
-                            player_tag,
-                            seen_players,
-                            to_traverse,
-                            battle_tracker,
-                            csv_writer,
-                            semaphore,
-                            battle_quantity,
-                        )
-                    )
-
-                await asyncio.gather(*tasks)
-
-                # Flush the file every 10,000 battles
-                if battle_tracker.unique_battles % 10000 == 0:
-                    print(f"Backing up data at {battle_tracker.unique_battles} battles")
-                    csvfile.flush()
+
+async def report_metrics_periodically(crawl, metrics_file):
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        metrics_file.write(json.dumps(crawl.metrics.snapshot()) + "\n")
+        metrics_file.flush()
+
+
+async def main(initial_player_tag, battle_quantity, resume_csv=None, base_url=API_BASE_URL, metrics_port=None,
+               refresh=False, shard=None, csv_file_name=None, filter_config=None, trophies=None, seeds=None):
+    """
+    Runs a crawl, or one shard of a sharded crawl (see get_battle_logs_sharded.py).
+
+    Args:
+    initial_player_tag (str): tag to start a new crawl from
+    battle_quantity (int): number of battles to collect
+    resume_csv (str): CSV of a previous crawl to resume or, with `refresh`, refresh
+    base_url (str): API root
+    metrics_port (int): serve live metrics on this local port
+    refresh (bool): re-poll the resumed crawl's due players instead of exploring
+    shard (ShardRouter): this process's shard; the crawl then runs until the
+        coordinator stops it rather than to `battle_quantity`
+    csv_file_name (str): output path of a new crawl instead of a timestamped one in raw_data
+    filter_config (str): battle filter config instead of BATTLE_FILTER_CONFIG
+    trophies (bool): write TROPHY_COLUMNS in a new crawl, WRITE_TROPHIES by
+        default; a resumed crawl keeps its CSV's columns
+    seeds (SeedSources): more players to start from; built from the SEED_*
+        settings by default. Not used by refreshes.
+
+    Returns:
+    CrawlContext: the finished crawl
+    """
+    global count
+    battle_tracker = BattleLogTracker()
+    battle_filter = load_battle_filter(filter_config or BATTLE_FILTER_CONFIG)
+    rate_limiter = RateLimiter(
+        REQUESTS_PER_SECOND,
+        initial_concurrency=INITIAL_CONCURRENCY,
+        max_concurrency=NUM_WORKERS,
+    )
+    circuit_breaker = CircuitBreaker()
+    request_stats = RequestStats()
+
+    if resume_csv:
+        frontier = create_frontier(resume_csv)
+        # Only a refresh re-fetches players, so only it needs their watermarks
+        watermarks = PlayerWatermarks(track=refresh)
+        # Streamed into the dedup index, frontier and watermarks; a refresh
+        # re-polls due players instead of exploring, so it skips the frontier
+        state = load_checkpoint(
+            journal_path_for(resume_csv),
+            battles=battle_tracker.processed_battles,
+            frontier=None if refresh else frontier,
+            watermarks=watermarks if refresh else None,
+        )
+        if not state.committed:
+            if refresh:
+                raise SystemExit(f"{resume_csv} has no committed checkpoint to refresh")
+            # Stopped before its first checkpoint: nothing to resume, so start it over
+            print(f"{resume_csv} has no committed checkpoint; starting the crawl over")
+            csv_file_name, resume_csv = resume_csv, None
+    if resume_csv:
+        # Continue a previous crawl from its last committed checkpoint
+        csv_file_name = resume_csv
+        if refresh:
+            for player_code in watermarks.due(time.time(), REFRESH_ACTIVE_WINDOW):
+                frontier.add(player_code)
+            battle_quantity += state.count
+        battle_tracker.unique_battles = state.unique_battles
+        battle_tracker.duplicate_battles = state.duplicate_battles
+        count = state.count
+        with open(csv_file_name, newline="") as f:
+            trophies = TROPHY_COLUMNS[0] in next(csv.reader(f), [])
+        # Drop rows written after the last checkpoint; their battles were not committed
+        csvfile = open(csv_file_name, "r+", newline="", buffering=WRITE_BUFFER_SIZE)
+        csvfile.truncate(state.csv_offset)
+        csvfile.seek(state.csv_offset)
+        if refresh:
+            print(
+                f"Refreshing {csv_file_name} at {count} battles: {len(frontier)} of "
+                f"{len(watermarks)} known players are due"
+            )
+        else:
+            print(
+                f"Resuming {csv_file_name} at {count} battles, {state.visited_players} "
+                f"players visited and {len(frontier)} in the frontier"
+            )
+    else:
+        csv_file_name = csv_file_name or default_csv_file_name(battle_quantity)
+        # Open CSV file for writing
+        csvfile = open(csv_file_name, "w", newline="", buffering=WRITE_BUFFER_SIZE)
+        if trophies is None:
+            trophies = WRITE_TROPHIES
+        # Write CSV header
+        csv.writer(csvfile).writerow(BATTLE_COLUMNS + (TROPHY_COLUMNS if trophies else []))
+        frontier = create_frontier(csv_file_name)
+        # Other shards start empty and get players handed off
+        seeded = shard is None or shard.owns_player(encode_tag(initial_player_tag))
+        if seeded:
+            frontier.add(encode_tag(initial_player_tag))
+        watermarks = PlayerWatermarks(track=False)
+
+    checkpoint = CrawlCheckpoint(journal_path_for(csv_file_name))
+    if not resume_csv:
+        if seeded:
+            checkpoint.log_frontier(initial_player_tag)
+        # Commit the header and start tag at once, so a crawl stopped before
+        # its first periodic checkpoint still resumes from them
+        checkpoint.commit(csvfile, checkpoint.snapshot(count, battle_tracker))
+    sinks = []
+    columnar_path = columnar_path_for(csv_file_name)
+    # A resumed crawl only continues a columnar copy it already started
+    if WRITE_COLUMNAR and (not resume_csv or os.path.isdir(columnar_path)):
+        sinks.append(
+            ColumnarBattleWriter(
+                columnar_path,
+                resume_rows=count if resume_csv else None,
+                parquet=WRITE_PARQUET,
+            )
+        )
+    aggregates_path = aggregates_path_for(csv_file_name)
+    if WRITE_AGGREGATES:
+        sinks.append(
+            AggregateSink(
+                aggregates_path,
+                AGGREGATE_SNAPSHOT_INTERVAL,
+                brawler_data=BRAWLER_DATA,
+                resume_rows=count if resume_csv else None,
+                resume_csv=csv_file_name if resume_csv else None,
+            )
+        )
+    writer = BattleWriter(
+        csvfile,
+        checkpoint,
+        max_pending=WRITER_MAX_PENDING,
+        flush_rows=FLUSH_ROWS,
+        flush_interval=FLUSH_INTERVAL,
+        progress_total=battle_quantity,
+        rows_written=count,
+        sinks=sinks,
+    )
+    connection_stats = ConnectionStats()
+    fetch_outcomes = FetchOutcomes()
+    profiles = None
+    if trophies:
+        profiles = ProfileService(
+            lambda tag: request_profile(crawl, tag),
+            ProfileCache(PROFILE_CACHE_SIZE, PROFILE_TTL),
+            batch_size=PROFILE_BATCH_SIZE,
+            budget=lambda: PROFILE_REQUEST_SHARE * crawl.battle_logs_requested + PROFILE_BATCH_SIZE,
+        )
+    metrics = CrawlMetrics(
+        counters=lambda: {
+            "unique_battles": battle_tracker.unique_battles,
+            "duplicate_battles": battle_tracker.duplicate_battles,
+            "stale_battles": battle_tracker.stale_battles,
+            "rows": count,
+            "connections_opened": connection_stats.opened,
+            **battle_filter.counters(),
+            **(profiles.counters() if profiles else {}),
+            **fetch_outcomes.counters(),
+        },
+        gauges=lambda: {
+            "frontier_size": len(frontier),
+            "in_flight": rate_limiter.in_flight,
+            "concurrency_window": rate_limiter.concurrency,
+            "writer_queue": len(writer.pending),
+        },
+    )
+    metrics_path = f"{csv_file_name}.metrics"
+    metrics_server = await start_metrics_server(metrics, metrics_port) if metrics_port else None
+    with csvfile, open(metrics_path, "a") as metrics_file:
+        # One pooled connection per worker at most, all to the API host
+        async with create_session(
+            limit=NUM_WORKERS,
+            limit_per_host=NUM_WORKERS,
+            headers=HEADERS,
+            trace_configs=[connection_stats.trace_config()],
+        ) as session:
+            crawl = CrawlContext(
+                session,
+                frontier,
+                battle_tracker,
+                writer,
+                rate_limiter,
+                circuit_breaker,
+                request_stats,
+                checkpoint,
+                metrics,
+                watermarks,
+                battle_filter,
+                battle_quantity,
+                base_url,
+                refresh,
+                shard,
+                profiles,
+                fetch_outcomes,
+            )
+            if seeds is None:
+                seeds = SeedSources(
+                    files=SEED_FILES, rankings=SEED_RANKINGS, previous_runs=SEED_PREVIOUS_RUNS, limit=SEED_LIMIT
+                )
+            if seeds and not refresh:
+                # Fill the frontier before the workers start so they all have work
+                seed_tags = await seeds.collect(
+                    lambda path: request_api(crawl, path), exclude_journal=journal_path_for(csv_file_name)
+                )
+                seeded_players = seed_frontier(crawl, seed_tags)
+                print(f"Seeded the frontier with {seeded_players} of {len(seed_tags)} tags ({seeds.summary()}).")
+                if seeded_players >= NUM_WORKERS:
+                    # The window still halves on 429s and slow responses
+                    rate_limiter.concurrency = max(rate_limiter.concurrency, min(SEEDED_CONCURRENCY, NUM_WORKERS))
+            writer.start()
+            workers = [
+                asyncio.create_task(crawl_worker(crawl)) for _ in range(NUM_WORKERS)
+            ]
+            checkpointer = asyncio.create_task(checkpoint_periodically(crawl))
+            monitors = [
+                asyncio.create_task(metrics.monitor()),
+                asyncio.create_task(report_metrics_periodically(crawl, metrics_file)),
+            ]
+            # Stop when the battle target is reached or the frontier runs dry
+            exhausted = asyncio.create_task(frontier.join())
+            reached = asyncio.create_task(crawl.target_reached.wait())
+            stop_conditions = [exhausted, reached]
+            if shard:
+                # A shard's frontier can run dry while others still hand it
+                # players; the coordinator decides when the crawl is over
+                stop_conditions = [reached]
+                monitors += [
+                    asyncio.create_task(shard.receive(
+                        lambda players: receive_players(crawl, players),
+                        lambda battles: receive_battles(crawl, battles),
+                    )),
+                    asyncio.create_task(shard.run(
+                        crawl,
+                        rows=lambda: count,
+                        idle=lambda: not crawl.fetching and not len(frontier),
+                    )),
+                ]
+            try:
+                # The writer task only ends early when a write failed
+                await asyncio.wait([*stop_conditions, writer.task], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                # Also reached on Ctrl-C, so an interrupted crawl can be resumed
+                tasks = [exhausted, reached, checkpointer, *monitors, *workers]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if profiles:
+                    await profiles.close()
+                if writer.error is None:
+                    writer.request_checkpoint(checkpoint.snapshot(count, battle_tracker))
+                await writer.close()
+                checkpoint.close()
+                frontier.close()
+                metrics_file.write(json.dumps(metrics.snapshot()) + "\n")
+                if shard:
+                    shard.publish(count, battle_tracker, idle=True)
+                if metrics_server:
+                    await metrics_server.cleanup()
+            if writer.error is not None:
+                # The journal keeps the last commit before the failure, so --resume works
+                raise writer.error
 
     dupes, battles = battle_tracker.get_counters()
-    print(f"Evaluated {battles} unique battles.")
-    print(f"Ignored {dupes} duplicate battles.")
-    print(f"Encountered {failures} request failures.")
     end_time = time.time()
     elapsed_time = end_time - start_time
+    print()  # End the writer's progress bar line
+    print(f"Evaluated {battles} unique battles.")
+    print(f"Ignored {dupes} duplicate battles.")
+    if battle_tracker.stale_battles:
+        print(f"Skipped {battle_tracker.stale_battles} battles older than their player's watermark.")
+    print(battle_filter.summary())
+    print(f"Request outcomes: {request_stats.summary()}.")
+    print(fetch_outcomes.summary())
+    if profiles:
+        print(profiles.summary())
+    print(f"Circuit breaker opened {circuit_breaker.times_opened} times.")
+    print(f"Throttled {rate_limiter.throttled} times, final concurrency {rate_limiter.concurrency:.1f}.")
+    print(
+        f"Opened {connection_stats.opened} connections, "
+        f"{100 * connection_stats.reuse_ratio():.1f}% of requests reused one."
+    )
+    print(f"Left {len(frontier)} players in the frontier.")
+    print(
+        f"Wrote {checkpoint.commits} checkpoints in {checkpoint.time_spent:.2f} seconds "
+        f"({100 * checkpoint.time_spent / elapsed_time:.2f}% of crawl time)"
+    )
     print(f"Script executed in {elapsed_time:.2f} seconds")
     print(f'CSV file saved as "{csv_file_name}"')
-
-
-# Run the main function
-asyncio.run(main("#PLYYP2RRQ", 3000000))
+    if any(isinstance(sink, ColumnarBattleWriter) for sink in sinks):
+        print(f'Columnar copy saved as "{columnar_path}"')
+    if WRITE_AGGREGATES:
+        print(f'Aggregates saved in "{aggregates_path}"')
+    print(f'Metrics snapshots saved as "{metrics_path}"')
+    return crawl
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl Brawl Stars battle logs into a CSV.")
+    parser.add_argument("--player-tag", default="#PLYYP2RRQ", help="tag to start the crawl from")
+    parser.add_argument("--battles", type=int, default=3000000, help="number of battles to collect")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", metavar="CSV", help="continue the crawl that wrote this CSV")
+    mode.add_argument(
+        "--refresh",
+        metavar="CSV",
+        help="append new battles of the crawl's known, active players that are due for a poll",
+    )
+    parser.add_argument("--base-url", default=API_BASE_URL, help="API root, e.g. a local replay server")
+    parser.add_argument("--metrics-port", type=int, help="serve live metrics on this local port")
+    parser.add_argument(
+        "--filter-config", help=f"battle filter config (default {BATTLE_FILTER_CONFIG})"
+    )
+    parser.add_argument(
+        "--seed-file", action="append", default=list(SEED_FILES), help="file of more tags to start from, one per line"
+    )
+    parser.add_argument(
+        "--seed-ranking",
+        action="append",
+        default=list(SEED_RANKINGS),
+        metavar="LOCATION",
+        help='start from the top players of a ranking: "global" or a country code such as "US"',
+    )
+    parser.add_argument(
+        "--seed-previous-runs",
+        metavar="DIR",
+        default=SEED_PREVIOUS_RUNS,
+        help="start from the players of earlier crawls in this directory, e.g. raw_data",
+    )
+    parser.add_argument(
+        "--trophies",
+        action="store_true",
+        default=WRITE_TROPHIES,
+        help="add brawler and player trophy columns to a new crawl",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.player_tag,
+            args.battles,
+            args.resume or args.refresh,
+            args.base_url,
+            args.metrics_port,
+            refresh=bool(args.refresh),
+            filter_config=args.filter_config,
+            trophies=args.trophies,
+            seeds=SeedSources(
+                files=args.seed_file,
+                rankings=args.seed_ranking,
+                previous_runs=args.seed_previous_runs,
+                limit=SEED_LIMIT,
+            ),
+        )
+    )
@@ -0,0 +1,212 @@
+"""
+Sharded crawl: one crawler process per shard, each with its own API key,
+rate limiter and event loop.
+
+Players and battles are partitioned across shards by hash (see
+shared/sharding.py); sightings of other shards' players and battles they
+own are handed off through per-shard queues, so every player is fetched by
+one shard and every battle is written by one shard. Shards write to
+`<csv>.shards/`, and their outputs are merged into one CSV (and columnar
+copy) once the target is reached or every frontier has run dry.
+
+Keys come from BRAWL_STARS_API_KEYS, a comma-separated list in the
+environment or .env, falling back to BRAWL_STARS_API_KEY. There is one
+shard per key by default; shards sharing a key split its
+BRAWL_STARS_REQUESTS_PER_SECOND quota.
+
+Run from the repository root:
+python3 -m data_fetching.get_battle_logs_sharded --battles 3000000
+"""
+import argparse
+import asyncio
+import csv
+import multiprocessing
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from shared.aggregates import BRAWLER_DATA, AggregateSink
+from shared.battle_data import aggregates_path_for, columnar_path_for
+from shared.seeding import SeedSources
+from shared.columnar import ColumnarBattleWriter
+from shared.sharding import STATUS_FIELDS, ShardRouter, crawl_finished, read_status
+
+# Seconds between coordinator status polls
+POLL_INTERVAL = 0.5
+# Rows per block when merging shard outputs
+MERGE_BLOCK_ROWS = 50000
+
+
+def load_api_keys():
+    load_dotenv()
+    keys = os.getenv("BRAWL_STARS_API_KEYS") or os.getenv("BRAWL_STARS_API_KEY") or ""
+    return [key.strip() for key in keys.split(",") if key.strip()]
+
+
+def shard_csv_path(csv_file_name, index):
+    return os.path.join(f"{os.path.splitext(csv_file_name)[0]}.shards", f"shard{index}.csv")
+
+
+def run_shard(index, api_key, key_shares, inboxes, status, stop, seed_tag, battles, base_url, csv_file_name,
+              seeds=None):
+    # The crawler reads its key when imported, so set it first
+    os.environ["BRAWL_STARS_API_KEY"] = api_key
+    # Keep the shards' progress bars and summaries off the terminal
+    sys.stdout = sys.stderr = open(f"{os.path.splitext(csv_file_name)[0]}.log", "w", buffering=1)
+    from data_fetching import get_battle_logs_battle_pov_csv_async as crawler
+
+    crawler.REQUESTS_PER_SECOND /= key_shares
+    # The merged dataset gets one columnar copy and one set of aggregates instead
+    crawler.WRITE_COLUMNAR = False
+    crawler.WRITE_AGGREGATES = False
+    shard = ShardRouter(index, inboxes, status, stop, target=battles)
+    # Every shard collects the same seeds and keeps the players it owns
+    asyncio.run(crawler.main(
+        seed_tag, battles, base_url=base_url, shard=shard, csv_file_name=csv_file_name, seeds=seeds or None
+    ))
+    # Hand-offs still queued once the crawl is stopped are dropped rather
+    # than blocking this process's exit
+    for inbox in inboxes:
+        inbox.cancel_join_thread()
+
+
+def merge_shards(shard_csvs, csv_file_name, columnar=True, aggregates=True):
+    """
+    Concatenates shard CSVs into one dataset, plus a columnar copy and its
+    aggregates (see shared/aggregates.py).
+
+    Returns:
+    int: number of rows merged
+    """
+    sinks = []
+    if columnar:
+        sinks.append(ColumnarBattleWriter(columnar_path_for(csv_file_name)))
+    if aggregates:
+        sinks.append(AggregateSink(aggregates_path_for(csv_file_name), brawler_data=BRAWLER_DATA))
+    rows = 0
+    with open(csv_file_name, "w", newline="") as merged:
+        writer = csv.writer(merged)
+        for index, path in enumerate(shard_csvs):
+            with open(path, newline="") as shard_file:
+                reader = csv.reader(shard_file)
+                header = next(reader)
+                if index == 0:
+                    writer.writerow(header)
+                block = []
+                for row in reader:
+                    block.append(row)
+                    if len(block) >= MERGE_BLOCK_ROWS:
+                        writer.writerows(block)
+                        for sink in sinks:
+                            sink.write_block(block)
+                        rows += len(block)
+                        block = []
+                writer.writerows(block)
+                if block:
+                    for sink in sinks:
+                        sink.write_block(block)
+                rows += len(block)
+    for sink in sinks:
+        sink.close()
+    return rows
+
+
+def wait_for_shards(processes, status, battles):
+    """Polls shard status until the target is reached, every shard is done or one fails."""
+    previous = None
+    while True:
+        time.sleep(POLL_INTERVAL)
+        statuses = read_status(status, len(processes))
+        rows = sum(shard["rows"] for shard in statuses)
+        print(f"\rCollected {rows} of {battles} battles", end="", flush=True)
+        if rows >= battles:
+            return "target reached"
+        # Seen twice in a row with the same hand-off totals, so no hand-off
+        # was in transit between the shards' status updates
+        totals = sum(shard["sent"] for shard in statuses)
+        if crawl_finished(statuses):
+            if previous == totals:
+                return "frontier exhausted"
+            previous = totals
+        else:
+            previous = None
+        if any(not process.is_alive() for process in processes):
+            return "a shard exited early"
+
+
+def main(initial_player_tag, battle_quantity, shards=None, base_url=None, seeds=None):
+    keys = load_api_keys()
+    if not keys:
+        raise ValueError("Please set BRAWL_STARS_API_KEYS (or BRAWL_STARS_API_KEY) in the .env file.")
+    shards = shards or len(keys)
+    # Imported here so spawned shards, which re-import this module, get
+    # their own key before the crawler reads it
+    os.environ.setdefault("BRAWL_STARS_API_KEY", keys[0])
+    from data_fetching import get_battle_logs_battle_pov_csv_async as crawler
+
+    base_url = base_url or crawler.API_BASE_URL
+    csv_file_name = crawler.default_csv_file_name(battle_quantity)
+    shard_csvs = [shard_csv_path(csv_file_name, index) for index in range(shards)]
+    os.makedirs(os.path.dirname(shard_csvs[0]), exist_ok=True)
+
+    start = time.time()
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(shards)]
+    status = context.Array("q", shards * len(STATUS_FIELDS))
+    stop = context.Event()
+    processes = []
+    for index in range(shards):
+        key = keys[index % len(keys)]
+        key_shares = len(range(index % len(keys), shards, len(keys)))
+        processes.append(context.Process(
+            target=run_shard,
+            args=(index, key, key_shares, inboxes, status, stop, initial_player_tag, battle_quantity,
+                  base_url, shard_csvs[index], seeds),
+        ))
+    for process in processes:
+        process.start()
+    print(f"Crawling with {shards} shards on {len(keys)} API keys")
+
+    try:
+        reason = wait_for_shards(processes, status, battle_quantity)
+    except KeyboardInterrupt:
+        reason = "interrupted"
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+
+    statuses = read_status(status, shards)
+    crawl_time = time.time() - start
+    rows = merge_shards(shard_csvs, csv_file_name)
+    print()  # End the progress line
+    print(f"Stopped: {reason}.")
+    for index, shard in enumerate(statuses):
+        print(
+            f"Shard {index}: {shard['rows']} rows, {shard['unique_battles']} unique and "
+            f"{shard['duplicate_battles']} duplicate battles, exit code {processes[index].exitcode}"
+        )
+    print(f"Crawled {rows} battles in {crawl_time:.2f} seconds ({rows / crawl_time:.0f} battles/s)")
+    print(f'CSV file saved as "{csv_file_name}"')
+    print(f'Columnar copy saved as "{columnar_path_for(csv_file_name)}"')
+    print(f'Aggregates saved in "{aggregates_path_for(csv_file_name)}"')
+    print(f'Shard outputs and logs are in "{os.path.dirname(shard_csvs[0])}"')
+    return rows, crawl_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl battle logs with one process per API key.")
+    parser.add_argument("--player-tag", default="#PLYYP2RRQ", help="tag to start the crawl from")
+    parser.add_argument("--battles", type=int, default=3000000, help="number of battles to collect")
+    parser.add_argument("--shards", type=int, help="crawler processes (default: one per API key)")
+    parser.add_argument("--base-url", help="API root, e.g. a local replay server")
+    parser.add_argument("--seed-file", action="append", default=[], help="file of more tags to start from")
+    parser.add_argument(
+        "--seed-ranking", action="append", default=[], metavar="LOCATION", help='e.g. "global" or "US"'
+    )
+    parser.add_argument("--seed-previous-runs", metavar="DIR", help="reuse the players of earlier crawls here")
+    args = parser.parse_args()
+    seeds = SeedSources(files=args.seed_file, rankings=args.seed_ranking, previous_runs=args.seed_previous_runs)
+    main(args.player_tag, args.battles, args.shards, args.base_url, seeds)
@@ -8,6 +8,7 @@ from aiohttp import ClientResponseError, ClientConnectionError, ClientPayloadErr
 from dotenv import load_dotenv
 from shared.utils import print_progress_bar
 from shared.class_definitions import BattleLogTracker, BrawlerStats
+from shared.rate_limiter import RateLimiter
 
 # Load environment variables from .env file
 start_time = time.time()
@@ -40,10 +41,15 @@ def create_battle_hash(battle_time, teams):
     unique_string = battle_time + ''.join(player_tags)
     return hashlib.sha256(unique_string.encode()).hexdigest()
 
-async def fetch_battle_log(session, current_player_tag, brawler_stats, seen_players, to_traverse, battle_tracker, csv_writer):
+async def fetch_battle_log(session, current_player_tag, brawler_stats, seen_players, to_traverse, battle_tracker, csv_writer, rate_limiter):
     BASE_URL = f'https://api.brawlstars.com/v1/players/{current_player_tag.replace("#", "%23")}/battlelog'
+    await rate_limiter.acquire()
+    request_start = time.monotonic()
+    status, retry_after = None, None
     try:
         async with session.get(BASE_URL, headers=HEADERS) as response:
+            status = response.status
+            retry_after = response.headers.get('Retry-After')
             if response.status == 200:
                 battle_log = await response.json()
                 if current_player_tag not in seen_players:  # Avoid seen players
@@ -97,6 +103,8 @@ async def fetch_battle_log(session, current_player_tag, brawler_stats, seen_play
     except (ClientResponseError, ClientConnectionError, ClientPayloadError) as e:
         print(f"Error fetching data: {str(e)}")
         return False
+    finally:
+        rate_limiter.release(status, time.monotonic() - request_start, retry_after)
 
     return True
 
@@ -105,6 +113,7 @@ async def main(initial_player_tag, battle_quantity):
     brawler_stats = BrawlerStats()
     seen_players, to_traverse = set(), set()
     to_traverse.add(initial_player_tag)
+    rate_limiter = RateLimiter(float(os.getenv('BRAWL_STARS_REQUESTS_PER_SECOND', '20')))
 
     # Open CSV file for writing
     with open('new_battle_data_rev2.csv', 'w', newline='') as csvfile:
@@ -122,16 +131,11 @@ async def main(initial_player_tag, battle_quantity):
                     print_progress_bar(battle_tracker.unique_battles, battle_quantity, prefix='Progress:', suffix='Complete', length=100)
                     if battle_tracker.unique_battles >= battle_quantity:
                         break
-                    tasks.append(fetch_battle_log(session, player_tag, brawler_stats, seen_players, to_traverse, battle_tracker, csv_writer))
+                    tasks.append(fetch_battle_log(session, player_tag, brawler_stats, seen_players, to_traverse, battle_tracker, csv_writer, rate_limiter))
 
-                results = await asyncio.gather(*tasks)
+                # The rate limiter paces requests and backs off on 429s, so no fixed sleeps are needed
+                await asyncio.gather(*tasks)
 
-                # Introduce a delay to avoid rate limiting and exponential backoff for failed requests
-                if not all(results):
-                    await asyncio.sleep(10)
-                else:
-                    await asyncio.sleep(1)
-                
                 # Flush the file every 10,000 battles
                 if battle_tracker.unique_battles % 10000 == 0:
                     print(f'Backing up data at {battle_tracker.unique_battles} battles')
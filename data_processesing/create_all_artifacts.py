@@ -0,0 +1,106 @@
+"""
+Writes every artifact of the create_* scripts from one read of a crawl:
+
+- all_brawler_stats_<timestamp>.csv (create_brawler_stats)
+- brawler_map_winrates.json (create_map_brawler_winrates)
+- brawler_antagony.json (create_brawler_antagony)
+- brawler_synergy.json (create_brawler_synergy), when
+  important_data/brawler_data.csv exists
+
+The crawl is read and encoded to integer codes once, and every artifact is
+computed from those arrays. The stats cube is saved next to the crawl
+too, so later create_* runs and cube queries do not reread it. The
+content of each file is the same as the script's. Prints the time each
+stage took.
+
+Run from the repository root, on the most recent crawl in raw_data or on
+the given one:
+python3 -m data_processesing.create_all_artifacts [crawl] [--output-dir .]
+"""
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from shared.aggregates import BRAWLER_DATA, antagony_json, brawler_stats_frame, map_winrates_json, synergy_json_from_codes
+from shared.battle_data import brawler_stats_file_name, dataset_signature, find_most_recent_dataset, load_battle_codes, stats_cube_path_for
+from shared.pair_matrices import antagony_stats
+from shared.stats_cube import StatsCube
+
+
+@contextmanager
+def stage(timings, name):
+    start = time.perf_counter()
+    yield
+    timings.append((name, time.perf_counter() - start))
+
+
+def write_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+def create_all_artifacts(dataset, output_dir='.', brawler_data=BRAWLER_DATA):
+    """
+    Args:
+    dataset (str): a crawl `.csv` file or `.columnar` directory
+    output_dir (str): where the artifacts are written
+    brawler_data (str): brawlers and their win rates, for brawler_synergy.json
+
+    Returns:
+    list: (stage, seconds) of each stage, in order
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    timings = []
+
+    with stage(timings, 'read and encode'):
+        source = dataset_signature(dataset)
+        battles = load_battle_codes(dataset)
+        winners, losers = battles.brawler_codes()
+        names = battles.vocabularies['brawler']
+
+    with stage(timings, 'stats cube'):
+        cube = StatsCube.from_battles(battles, source)
+        cube.save(stats_cube_path_for(dataset))
+
+    with stage(timings, 'brawler stats'):
+        brawler_stats = brawler_stats_frame(*cube.brawler_totals())
+        brawler_stats_path = os.path.join(output_dir, brawler_stats_file_name(dataset))
+        os.makedirs(os.path.dirname(brawler_stats_path), exist_ok=True)
+        brawler_stats.to_csv(brawler_stats_path, index=False)
+
+    with stage(timings, 'map winrates'):
+        write_json(map_winrates_json(cube.map_brawler_stats()), os.path.join(output_dir, 'brawler_map_winrates.json'))
+
+    with stage(timings, 'antagony'):
+        write_json(antagony_json(antagony_stats(winners, losers, names)), os.path.join(output_dir, 'brawler_antagony.json'))
+
+    if os.path.exists(brawler_data):
+        with stage(timings, 'synergy'):
+            synergy = synergy_json_from_codes(winners, losers, names, brawler_data)
+            write_json(synergy, os.path.join(output_dir, 'brawler_synergy.json'))
+    else:
+        print(f"{brawler_data} not found; skipping brawler_synergy.json")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write every processing artifact of a crawl from one read of it.")
+    parser.add_argument('dataset', nargs='?', help="crawl .csv file or .columnar directory (default: most recent in raw_data)")
+    parser.add_argument('--output-dir', default='.', help="where the artifacts are written")
+    args = parser.parse_args()
+
+    dataset = args.dataset or find_most_recent_dataset('raw_data')
+    if not dataset:
+        print("No files found in the directory.")
+        return
+    timings = create_all_artifacts(dataset, args.output_dir)
+    print(f"Processed data from {dataset} and saved the artifacts to {args.output_dir}")
+    for name, seconds in timings:
+        print(f"{name:>16}: {seconds:7.3f}s")
+    print(f"{'total':>16}: {sum(seconds for _, seconds in timings):7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from shared.columnar import MISSING_VALUES
+from shared.pair_matrices import synergy_matrices, synergy_scores
+
+FORMAT_VERSION = 1
+# Lists the brawlers and their win rates; needed for brawler_synergy.json
+BRAWLER_DATA = "important_data/brawler_data.csv"
+
+# Brawler classes of the brawler stats table; brawlers in none are dropped
+BRAWLER_CLASSES = {
+    "damage_dealer": ["8-Bit", "Carl", "Chester", "Chuck", "Clancy", "Colette", "Colt", "Eve",
+                      "Lola", "Nita", "Pearl", "R-T", "Rico", "Shelly", "Spike", "Surge", "Tara"],
+    "controller": ["Amber", "Bo", "Jessie", "Lou", "Charlie", "Mr. P", "Emz", "Otis",
+                   "Gale", "Sandy", "Gene", "Griff", "Squeak", "Willow", "Penny"],
+    "sniper": ["Angelo", "Bea", "Belle", "Bonnie", "Brock", "Janet", "Maisie", "Mandy",
+               "Nani", "Piper"],
+    "thrower": ["Barley", "Dynamike", "Grom", "Larry & Lawrie", "Sprout", "Tick"],
+    "assassin": ["Buzz", "Cordelius", "Crow", "Edgar", "Fang", "Leon", "Lily",
+                 "Melodie", "Mico", "Mortis", "Sam", "Stu"],
+    "tank": ["Ash", "Bibi", "Bull", "Buster", "Darryl", "Draco", "El Primo", "Frank",
+             "Hank", "Jacky", "Meg", "Rosa"],
+    "support": ["Berry", "Byron", "Doug", "Gray", "Gus", "Kit", "Max", "Pam", "Poco",
+                "Ruffs"],
+}
+
+
+def brawler_class(brawler):
+    for name, members in BRAWLER_CLASSES.items():
+        if brawler in members:
+            return name
+    return None
+
+
+class BattleAggregates:
+    """
+    Count tables behind the processing scripts' outputs, updated one battle
+    row at a time.
+
+    - brawlers: brawler -> [wins, games] (create_brawler_stats)
+    - map_brawlers: map -> brawler -> {"wins", "losses"} (create_map_brawler_winrates)
+    - antagony: brawler -> opponent -> {"wins", "total"} (create_brawler_antagony)
+    - pairs: brawler -> teammate -> [wins, losses], for full teams of three
+      distinct brawlers (create_brawler_synergy)
+
+    The nested tables gain keys in the same order as the scripts' tables
+    do, so rendering them with the functions below gives the scripts'
+    outputs exactly, ties included.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.brawlers = {}
+        self.map_brawlers = {}
+        self.antagony = {}
+        self.pairs = {}
+
+    def update(self, row):
+        """Adds one crawl row: mode, map, three winners, three losers."""
+        self.rows += 1
+        map_name = row[1]
+        winners = [brawler for brawler in row[2:5] if brawler not in MISSING_VALUES]
+        losers = [brawler for brawler in row[5:8] if brawler not in MISSING_VALUES]
+
+        # Lookups first: building each default entry on every call would
+        # cost more than the counting itself
+        brawlers = self.brawlers
+        for brawler in winners:
+            stats = brawlers.get(brawler)
+            if stats is None:
+                stats = brawlers[brawler] = [0, 0]
+            stats[0] += 1
+            stats[1] += 1
+        for brawler in losers:
+            stats = brawlers.get(brawler)
+            if stats is None:
+                stats = brawlers[brawler] = [0, 0]
+            stats[1] += 1
+
+        map_stats = self.map_brawlers.get(map_name)
+        if map_stats is None:
+            map_stats = self.map_brawlers[map_name] = {}
+        for team, key in ((winners, "wins"), (losers, "losses")):
+            for brawler in team:
+                stats = map_stats.get(brawler)
+                if stats is None:
+                    stats = map_stats[brawler] = {"wins": 0, "losses": 0}
+                stats[key] += 1
+
+        antagony = self.antagony
+        loser_tables = None
+        for winner in winners if losers else ():
+            winner_table = antagony.get(winner)
+            if winner_table is None:
+                winner_table = antagony[winner] = {}
+            if loser_tables is None:
+                # Created after the first winner's, as the script does
+                loser_tables = []
+                for loser in losers:
+                    table = antagony.get(loser)
+                    if table is None:
+                        table = antagony[loser] = {}
+                    loser_tables.append(table)
+            for loser, loser_table in zip(losers, loser_tables):
+                stats = winner_table.get(loser)
+                if stats is None:
+                    stats = winner_table[loser] = {"wins": 0, "total": 0}
+                stats["wins"] += 1
+                stats["total"] += 1
+                stats = loser_table.get(winner)
+                if stats is None:
+                    stats = loser_table[winner] = {"wins": 0, "total": 0}
+                stats["total"] += 1
+
+        if len(winners) != 3 or len(losers) != 3 or len(set(winners)) != 3 or len(set(losers)) != 3:
+            return
+        pairs = self.pairs
+        for team, column in ((winners, 0), (losers, 1)):
+            for brawler in team:
+                teammates = pairs.get(brawler)
+                if teammates is None:
+                    teammates = pairs[brawler] = {}
+                for teammate in team:
+                    if teammate != brawler:
+                        counts = teammates.get(teammate)
+                        if counts is None:
+                            counts = teammates[teammate] = [0, 0]
+                        counts[column] += 1
+
+    def update_rows(self, rows):
+        for row in rows:
+            self.update(row)
+
+    def to_dict(self):
+        return {
+            "version": FORMAT_VERSION,
+            "rows": self.rows,
+            "brawlers": self.brawlers,
+            "map_brawlers": self.map_brawlers,
+            "antagony": self.antagony,
+            "pairs": self.pairs,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported aggregates version {data.get('version')!r}")
+        aggregates = cls()
+        aggregates.rows = data["rows"]
+        aggregates.brawlers = data["brawlers"]
+        aggregates.map_brawlers = data["map_brawlers"]
+        aggregates.antagony = data["antagony"]
+        aggregates.pairs = data["pairs"]
+        return aggregates
+
+
+def brawler_stats_frame(brawler_ids, wins, games, slots):
+    """
+    The brawler stats table of create_brawler_stats.
+
+    Args:
+    brawler_ids (list): brawlers in sorted order
+    wins (list): wins of each brawler
+    games (list): games of each brawler
+    slots (int): brawler slots in the crawl (six per battle, missing ones included)
+
+    Returns:
+    pd.DataFrame: one row per classified brawler, sorted by win rate
+    """
+    wins = np.asarray(wins, dtype=np.int64)
+    games = np.asarray(games, dtype=np.int64)
+    brawler_stats = pd.DataFrame({"brawler_id": list(brawler_ids), "win_rate": wins / games})
+    brawler_stats["usage_rate"] = games / slots
+
+    # Standardize win rate and usage rate
+    brawler_stats["standardized_winrate"] = (
+        (brawler_stats["win_rate"] - brawler_stats["win_rate"].mean()) / brawler_stats["win_rate"].std()
+    )
+    brawler_stats["standardized_usage_rate"] = (
+        (brawler_stats["usage_rate"] - brawler_stats["usage_rate"].mean()) / brawler_stats["usage_rate"].std()
+    )
+
+    # Calculate composite score
+    alpha = 1  # weight for winrate
+    beta = 0.01  # weight for usage rate
+    brawler_stats["composite_score"] = (
+        alpha * brawler_stats["standardized_winrate"] + beta * brawler_stats["standardized_usage_rate"]
+    )
+
+    # Rank brawlers by composite score
+    brawler_stats["rank"] = brawler_stats["composite_score"].rank(ascending=False)
+
+    # Sort by win rate
+    brawler_stats = brawler_stats.sort_values("win_rate", ascending=False)
+
+    # Add class column and drop brawlers without a class
+    brawler_stats["class"] = brawler_stats["brawler_id"].apply(brawler_class)
+    brawler_stats = brawler_stats.dropna(subset=["class"])
+
+    # Format columns to have a maximum of three decimal places
+    for column in ["win_rate", "usage_rate", "standardized_winrate", "standardized_usage_rate",
+                   "composite_score", "rank"]:
+        brawler_stats[column] = brawler_stats[column].round(3)
+    return brawler_stats
+
+
+def map_winrates_json(map_brawler_stats):
+    """Per map, brawlers ranked by winrate, as in brawler_map_winrates.json."""
+    map_brawler_winrates = {}
+    for map_name, brawlers in map_brawler_stats.items():
+        entries = map_brawler_winrates.setdefault(map_name, [])
+        for brawler, stats in brawlers.items():
+            total_games = stats["wins"] + stats["losses"]
+            winrate = (stats["wins"] / total_games) * 100 if total_games > 0 else 0
+            entries.append({"brawler": brawler, "winrate": winrate, "ranking": None})
+
+    # Rank brawlers by winrate on each map
+    for map_name, brawlers in map_brawler_winrates.items():
+        brawlers.sort(key=lambda x: x["winrate"], reverse=True)
+        for rank, brawler in enumerate(brawlers, start=1):
+            brawler["ranking"] = rank
+    return map_brawler_winrates
+
+
+def antagony_json(antagony_stats):
+    """Per brawler, opponents by the share of games won against them, as in brawler_antagony.json."""
+    antagony_data = {}
+    for brawler, opponents in antagony_stats.items():
+        percentages = {
+            opponent: (stats["wins"] / stats["total"]) * 100
+            for opponent, stats in opponents.items()
+            if stats["total"] > 0
+        }
+        antagony = sorted(percentages.items(), key=lambda x: x[1], reverse=True)
+        antagony_data[brawler] = [
+            {"brawler": opponent, "percentage": percentage} for opponent, percentage in antagony if opponent != brawler
+        ]
+    return antagony_data
+
+
+def synergy_json(pairs, brawlers, brawler_winrates):
+    """
+    Per brawler, teammates by the winrate of the pair, as in brawler_synergy.json.
+
+    Args:
+    pairs (dict): brawler -> teammate -> [wins, losses]
+    brawlers (list): every brawler of the output, as in important_data/brawler_data.csv
+    brawler_winrates (dict): brawler -> overall win rate
+    """
+    wins = np.zeros((len(brawlers), len(brawlers)), dtype=np.int64)
+    losses = np.zeros_like(wins)
+    for i, brawler in enumerate(brawlers):
+        teammates = pairs.get(brawler, {})
+        for j, inner_brawler in enumerate(brawlers):
+            wins[i, j], losses[i, j] = teammates.get(inner_brawler, (0, 0))
+    return synergy_json_from_matrices(brawlers, wins, losses, [brawler_winrates[brawler] for brawler in brawlers])
+
+
+def synergy_json_from_matrices(brawlers, wins, losses, winrates):
+    """
+    brawler_synergy.json from teammate count matrices (see
+    shared.pair_matrices.synergy_matrices) indexed like `brawlers`.
+
+    Args:
+    brawlers (list): every brawler of the output, as in important_data/brawler_data.csv
+    wins (np.ndarray): (n, n) teammate wins
+    losses (np.ndarray): (n, n) teammate losses
+    winrates (list): overall win rate of each brawler
+    """
+    winrate, synergy = synergy_scores(wins, losses, winrates)
+    brawler_pairs = {}
+    for i, brawler in enumerate(brawlers):
+        inner = {}
+        for j, inner_brawler in enumerate(brawlers):
+            if inner_brawler == brawler:
+                continue
+            pair_wins, pair_losses = int(wins[i, j]), int(losses[i, j])
+            inner[inner_brawler] = {
+                "wins": pair_wins,
+                "losses": pair_losses,
+                # Pairs without games keep the integer 0 of the original script
+                "winrate": round(float(winrate[i, j]), 4) if pair_wins + pair_losses > 0 else 0,
+                # round() of a Python float, not np.round: they differ on halves
+                "synergy": round(float(synergy[i, j]), 4),
+            }
+        brawler_pairs[brawler] = dict(sorted(inner.items(), key=lambda item: item[1]["winrate"], reverse=True))
+    return {brawler: brawler_pairs[brawler] for brawler in sorted(brawler_pairs)}
+
+
+def synergy_json_from_codes(winners, losers, names, brawler_data=BRAWLER_DATA):
+    """
+    brawler_synergy.json from a crawl's brawler codes (see
+    shared.battle_data.load_brawler_codes).
+
+    Args:
+    names (list): brawler of each code; names[0] is the missing value
+    brawler_data (str): CSV of the brawlers of the output and their win rates
+    """
+    # brawler_data.csv is read once, for both the brawlers and their win rates
+    brawler_data = pd.read_csv(brawler_data)
+    brawlers = list(dict.fromkeys(brawler_data["brawler_id"]))
+    brawler_winrates = dict(zip(brawler_data["brawler_id"], brawler_data["win_rate"]))
+
+    # Teammate win/loss counts of every brawler pair, accumulated as matrices
+    wins, losses = synergy_matrices(winners, losers, len(names))
+
+    # Reorder the matrices like brawler_data; a brawler the crawl never saw
+    # maps to code 0, whose rows and columns are all zero
+    codes = {name: code for code, name in enumerate(names) if code}
+    index = np.array([codes.get(brawler, 0) for brawler in brawlers], dtype=np.int64)
+    wins, losses = wins[np.ix_(index, index)], losses[np.ix_(index, index)]
+    return synergy_json_from_matrices(brawlers, wins, losses, [brawler_winrates[brawler] for brawler in brawlers])
+
+
+def _write_atomically(path, write):
+    # Readers never see a half-written snapshot
+    temporary = f"{path}.tmp"
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def _write_json(data, path):
+    def write(temporary):
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=4)
+
+    _write_atomically(path, write)
+
+
+class AggregateSink:
+    """
+    Writer sink that keeps BattleAggregates of every row the crawler writes
+    and saves them to `directory` every `snapshot_interval` seconds and when
+    the crawl ends:
+
+    - counts.json: the raw count tables, with the number of rows they cover
+    - brawler_stats.csv, brawler_map_winrates.json, brawler_antagony.json:
+      what the create_* scripts would produce from the crawl
+    - brawler_synergy.json, when `brawler_data` (important_data/brawler_data.csv,
+      which lists the brawlers and their win rates) exists
+
+    Snapshots replace the previous files atomically. A resumed crawl loads
+    counts.json if it covers exactly the `resume_rows` rows kept in the CSV,
+    and otherwise recounts them from `resume_csv`.
+
+    Sink interface used by BattleWriter: write_block(rows), flush(), close().
+    """
+
+    def __init__(self, directory, snapshot_interval=60.0, brawler_data=None, resume_rows=None, resume_csv=None):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.brawler_data = brawler_data
+        os.makedirs(directory, exist_ok=True)
+        self.aggregates = BattleAggregates()
+        if resume_rows is not None:
+            self._reopen(resume_rows, resume_csv)
+        self.last_snapshot = time.monotonic()
+        self.snapshots = 0
+
+    def _counts_path(self):
+        return os.path.join(self.directory, "counts.json")
+
+    def _reopen(self, resume_rows, resume_csv):
+        if os.path.exists(self._counts_path()):
+            with open(self._counts_path()) as f:
+                aggregates = BattleAggregates.from_dict(json.load(f))
+            if aggregates.rows == resume_rows:
+                self.aggregates = aggregates
+                return
+        # The last snapshot covers rows dropped on resume, or none at all
+        for chunk in pd.read_csv(resume_csv, dtype=str, keep_default_na=False, chunksize=100000):
+            remaining = resume_rows - self.aggregates.rows
+            if remaining <= 0:
+                break
+            self.aggregates.update_rows(chunk.values[:remaining].tolist())
+
+    def write_block(self, rows):
+        self.aggregates.update_rows(rows)
+
+    def flush(self):
+        if time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def close(self):
+        self.snapshot()
+
+    def snapshot(self):
+        aggregates = self.aggregates
+        _write_json(aggregates.to_dict(), self._counts_path())
+        if aggregates.brawlers:
+            brawler_ids = sorted(aggregates.brawlers)
+            stats = brawler_stats_frame(
+                brawler_ids,
+                [aggregates.brawlers[brawler][0] for brawler in brawler_ids],
+                [aggregates.brawlers[brawler][1] for brawler in brawler_ids],
+                6 * aggregates.rows,
+            )
+            _write_atomically(
+                os.path.join(self.directory, "brawler_stats.csv"),
+                lambda path: stats.to_csv(path, index=False),
+            )
+        _write_json(map_winrates_json(aggregates.map_brawlers), os.path.join(self.directory, "brawler_map_winrates.json"))
+        _write_json(antagony_json(aggregates.antagony), os.path.join(self.directory, "brawler_antagony.json"))
+        if self.brawler_data and os.path.exists(self.brawler_data):
+            brawler_data = pd.read_csv(self.brawler_data)
+            _write_json(
+                synergy_json(
+                    aggregates.pairs,
+                    list(dict.fromkeys(brawler_data["brawler_id"])),
+                    dict(zip(brawler_data["brawler_id"], brawler_data["win_rate"])),
+                ),
+                os.path.join(self.directory, "brawler_synergy.json"),
+            )
+        self.last_snapshot = time.monotonic()
+        self.snapshots += 1
@@ -0,0 +1,172 @@
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from shared.columnar import BATTLE_COLUMNS, BRAWLER_COLUMNS, VOCABULARY_OF, ColumnarBattles, load_columnar
+
+COLUMNAR_SUFFIX = ".columnar"
+AGGREGATES_SUFFIX = ".aggregates"
+PAIR_INDEX_SUFFIX = ".pairs"
+STATS_CUBE_SUFFIX = ".cube"
+
+
+def find_most_recent_dataset(directory):
+    """
+    Finds the most recent crawl in a directory.
+
+    Only crawl outputs count: `.csv` files and `.columnar` directories.
+    Checkpoint journals and frontier spill files next to them are ignored.
+    When a crawl has both, the columnar copy is preferred since it loads
+    much faster, unless it is unfinished (see columnar_complete).
+
+    Args:
+    directory (str): directory holding crawl outputs, e.g. 'raw_data'
+
+    Returns:
+    str: path of the most recent dataset, or None if there is none
+    """
+    datasets = glob.glob(os.path.join(directory, "*.csv"))
+    datasets += [path for path in glob.glob(os.path.join(directory, f"*{COLUMNAR_SUFFIX}")) if columnar_complete(path)]
+    if not datasets:
+        return None
+    most_recent = max(datasets, key=os.path.getctime)
+    if most_recent.endswith(".csv"):
+        columnar = columnar_path_for(most_recent)
+        if columnar_complete(columnar):
+            return columnar
+    return most_recent
+
+
+def columnar_complete(path):
+    """
+    Whether a columnar copy was closed: its `.npy` files only appear then,
+    so a crawl still running or killed is read from its CSV instead.
+    """
+    return os.path.exists(os.path.join(path, "dictionary.json")) and all(
+        os.path.exists(os.path.join(path, f"{column}.npy")) for column in BATTLE_COLUMNS
+    )
+
+
+def columnar_path_for(csv_file_name):
+    return os.path.splitext(csv_file_name)[0] + COLUMNAR_SUFFIX
+
+
+def aggregates_path_for(csv_file_name):
+    return os.path.splitext(csv_file_name)[0] + AGGREGATES_SUFFIX
+
+
+# Indexes are keyed on the dataset they were read from, not the crawl: a
+# CSV and its columnar copy each get their own, so reading one after the
+# other does not rebuild them
+def pair_index_path_for(dataset):
+    return os.path.normpath(dataset) + PAIR_INDEX_SUFFIX
+
+
+def stats_cube_path_for(dataset):
+    return os.path.normpath(dataset) + STATS_CUBE_SUFFIX
+
+
+def brawler_stats_file_name(dataset):
+    """
+    Where create_brawler_stats and create_all_artifacts write a crawl's
+    brawler stats: all_brawler_stats_<timestamp>.csv after the crawl's
+    timestamp, or data_processing/all_brawler_stats.csv when its name has none.
+    """
+    match = re.search(r'battle_logs_(.*)\.(?:csv|columnar)', dataset)
+    return f'all_brawler_stats_{match.group(1)}.csv' if match else 'data_processing/all_brawler_stats.csv'
+
+
+def load_battle_frame(path):
+    """
+    Loads a crawl as a DataFrame with the crawler's CSV columns.
+
+    Args:
+    path (str): a crawl `.csv` file or `.columnar` directory
+
+    Returns:
+    pd.DataFrame: one row per battle; missing brawlers are NaN
+    """
+    if os.path.isdir(path):
+        return load_columnar(path).to_dataframe()
+    return pd.read_csv(path)
+
+
+def load_brawler_codes(path):
+    """
+    Loads a crawl's brawler slots as integer codes.
+
+    A columnar crawl's codes are used as they are; a CSV is read like
+    load_battle_frame reads it, so the same cells count as missing, and
+    its names are numbered in order of appearance.
+
+    Args:
+    path (str): a crawl `.csv` file or `.columnar` directory
+
+    Returns:
+    tuple: (winners, losers, names), where winners and losers are (rows, 3)
+    code arrays and names[code] is the brawler of a code; code 0 is a
+    missing brawler and names[0] is None
+    """
+    if os.path.isdir(path):
+        battles = load_columnar(path)
+        winners, losers = battles.brawler_codes()
+        return winners, losers, battles.vocabularies["brawler"]
+    frame = pd.read_csv(path, usecols=BRAWLER_COLUMNS)
+    codes, names = _encode(frame[BRAWLER_COLUMNS].to_numpy())
+    return codes[:, :3], codes[:, 3:], names
+
+
+def load_battle_codes(path):
+    """
+    Loads a crawl's mode, map and brawler columns as integer codes.
+
+    A columnar crawl is memory-mapped as it is; a CSV is read like
+    load_battle_frame reads it and encoded the way ColumnarBattleWriter
+    encodes rows, with values numbered in order of appearance.
+
+    Args:
+    path (str): a crawl `.csv` file or `.columnar` directory
+
+    Returns:
+    ColumnarBattles: codes of BATTLE_COLUMNS and their vocabularies; code 0
+    is a missing value
+    """
+    if os.path.isdir(path):
+        return load_columnar(path)
+    frame = pd.read_csv(path, usecols=BATTLE_COLUMNS)
+    codes, vocabularies = {}, {}
+    for vocabulary in dict.fromkeys(VOCABULARY_OF.values()):
+        columns = [column for column in BATTLE_COLUMNS if VOCABULARY_OF[column] == vocabulary]
+        values, vocabularies[vocabulary] = _encode(frame[columns].to_numpy())
+        for position, column in enumerate(columns):
+            codes[column] = values[:, position]
+    return ColumnarBattles(codes, vocabularies)
+
+
+def _encode(values):
+    # Columns sharing a vocabulary are numbered together; NaN gets code 0
+    codes, names = pd.factorize(values.ravel())
+    dtype = np.uint16 if len(names) < np.iinfo(np.uint16).max else np.int64
+    return (codes + 1).astype(dtype).reshape(values.shape), [None] + list(names)
+
+
+def dataset_signature(path):
+    """
+    Sizes and modification times of a dataset's files: a CSV, or the
+    dictionary and code arrays of a columnar directory. The signature
+    changes whenever the crawl is appended to or rewritten, which tells
+    the indexes built from a crawl when they are stale.
+    """
+    if os.path.isdir(path):
+        files = sorted(name for name in os.listdir(path) if name.endswith((".npy", ".json")))
+        paths = [os.path.join(path, name) for name in files]
+    else:
+        files, paths = [os.path.basename(path)], [path]
+    signature = {}
+    for name, file_path in zip(files, paths):
+        stat = os.stat(file_path)
+        signature[name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
@@ -0,0 +1,126 @@
+import json
+import os
+from collections import Counter
+
+FORMAT_VERSION = 1
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "battle_filter.json")
+# Rejection reasons, in the order the rules are checked
+REASONS = ("missing_event", "mode", "map", "event_mode", "battle_type")
+
+
+class BattleFilter:
+    """
+    Decides which battle log items the crawler keeps, and counts why the
+    others were discarded.
+
+    The rules come from a config (see load_battle_filter) and are compiled
+    into frozensets once, so a check is a few set lookups. An item is kept
+    when its battle mode is one of `modes`, its map is in `maps`, its event
+    mode contains none of `excluded_event_modes` (e.g. 5v5 variants) and,
+    when `battle_types` is set, its battle type is one of them (e.g. only
+    "soloRanked").
+
+    Every discarded item used request budget without adding a battle, so
+    `rejected` counts them by reason and `rejected_maps` by map name; maps
+    missing from the rotation show up at the top of the latter.
+
+    Instances are callables taking (battle, event) dicts, the `keep`
+    argument of shared.battlelog_decode.decode_battle_log.
+    """
+
+    def __init__(self, modes, maps, excluded_event_modes=(), battle_types=None, rotation=None):
+        self.modes = frozenset(modes)
+        self.maps = frozenset(maps)
+        self.excluded_event_modes = tuple(excluded_event_modes)
+        self.battle_types = frozenset(battle_types) if battle_types is not None else None
+        self.rotation = rotation
+        self.accepted = 0
+        self.rejected = Counter()
+        self.rejected_maps = Counter()
+
+    def __call__(self, battle, event):
+        map_name, event_mode = event.get("map"), event.get("mode")
+        if not battle or not map_name or not event_mode:
+            self.rejected["missing_event"] += 1
+            return False
+        if battle.get("mode") not in self.modes:
+            self.rejected["mode"] += 1
+            return False
+        if map_name not in self.maps:
+            self.rejected["map"] += 1
+            self.rejected_maps[map_name] += 1
+            return False
+        for excluded in self.excluded_event_modes:
+            if excluded in event_mode:
+                self.rejected["event_mode"] += 1
+                return False
+        if self.battle_types is not None and battle.get("type") not in self.battle_types:
+            self.rejected["battle_type"] += 1
+            return False
+        self.accepted += 1
+        return True
+
+    @property
+    def checked(self):
+        return self.accepted + sum(self.rejected.values())
+
+    def rejected_share(self):
+        """Share of the checked items that were discarded."""
+        checked = self.checked
+        return (checked - self.accepted) / checked if checked else 0.0
+
+    def counters(self):
+        """Item counts for CrawlMetrics, one per rejection reason."""
+        counters = {"items_checked": self.checked, "items_kept": self.accepted}
+        for reason in REASONS:
+            counters[f"items_rejected_{reason}"] = self.rejected[reason]
+        return counters
+
+    def summary(self, top_maps=5):
+        reasons = ", ".join(f"{reason}={count}" for reason, count in self.rejected.most_common())
+        rotation = f" under the {self.rotation} rotation" if self.rotation else ""
+        text = (
+            f"Discarded {self.checked - self.accepted} of {self.checked} fetched items{rotation} "
+            f"({100 * self.rejected_share():.1f}%)"
+        )
+        if reasons:
+            text += f": {reasons}"
+        if self.rejected_maps:
+            maps = ", ".join(f"{name} ({count})" for name, count in self.rejected_maps.most_common(top_maps))
+            text += f". Most discarded maps: {maps}"
+        return text + "."
+
+
+def load_battle_filter(path=DEFAULT_CONFIG):
+    """
+    Builds a BattleFilter from a JSON config.
+
+    The config holds a format `version` (currently 1), an optional
+    `rotation` label, the `modes` and `maps` lists, optional
+    `excluded_event_modes` substrings and optional `battle_types` (null
+    keeps every type). Editing the config changes the map rotation without
+    touching code.
+
+    Args:
+    path (str): config file, shared/battle_filter.json by default
+
+    Returns:
+    BattleFilter
+
+    Raises:
+    ValueError: if the config's version is not supported or a rule is missing
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if config.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported battle filter config version {config.get('version')!r} in {path}")
+    for key in ("modes", "maps"):
+        if not config.get(key):
+            raise ValueError(f"Battle filter config {path} has no {key!r}")
+    return BattleFilter(
+        config["modes"],
+        config["maps"],
+        excluded_event_modes=config.get("excluded_event_modes", ()),
+        battle_types=config.get("battle_types"),
+        rotation=config.get("rotation"),
+    )
@@ -0,0 +1,168 @@
+import asyncio
+import csv
+import time
+from collections import deque
+
+from shared.utils import print_progress_bar
+
+
+class _CheckpointRequest:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+
+class BattleWriter:
+    """
+    Output stage of the crawler, run as its own task.
+
+    Workers hand rows over with write_row(), which only appends to an
+    in-memory buffer, so no file I/O happens on their path. The writer task
+    takes rows off the buffer in blocks of `block_rows`, writes each block
+    from a worker thread and flushes the file every `flush_rows` rows or
+    `flush_interval` seconds, whichever comes first.
+
+    When more than `max_pending` rows are waiting, wait_for_space() blocks
+    new fetches until the writer catches up. Workers call it before a
+    request rather than while processing a response, so a player's rows and
+    checkpoint entries are always produced together.
+
+    Checkpoint requests are queued behind the rows that came before them, so
+    the CSV is flushed up to exactly those rows before the checkpoint is
+    committed.
+
+    Extra outputs plug in as `sinks`: objects with write_block(rows),
+    flush() and close(). Every block written to the CSV is also passed to
+    each sink, and sinks are flushed with the CSV and before checkpoints.
+    Sinks with a sync() method are also synced to disk before checkpoints.
+
+    If a write fails, the writer task stops and keeps the exception in
+    `error`. Waiting workers are released, and write_row() and
+    wait_for_space() raise from then on, so no worker blocks on a writer
+    that is gone.
+    """
+
+    def __init__(self, csvfile, checkpoint=None, max_pending=50000, block_rows=5000,
+                 flush_rows=20000, flush_interval=5.0, progress_total=None, rows_written=0, sinks=()):
+        self.csvfile = csvfile
+        self.csv_writer = csv.writer(csvfile)
+        self.checkpoint = checkpoint
+        self.max_pending = max_pending
+        self.block_rows = block_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.progress_total = progress_total
+        self.sinks = list(sinks)
+        self.pending = deque()
+        self.rows_written = rows_written
+        self.unflushed_rows = 0
+        self.last_flush = time.monotonic()
+        self.has_work = asyncio.Event()
+        self.has_space = asyncio.Event()
+        self.has_space.set()
+        self.closing = False
+        self.error = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("the battle writer failed") from self.error
+
+    def write_row(self, row):
+        self._check()
+        self.pending.append(row)
+        if len(self.pending) >= self.max_pending:
+            self.has_space.clear()
+        self.has_work.set()
+
+    async def wait_for_space(self):
+        await self.has_space.wait()
+        self._check()
+
+    def request_checkpoint(self, snapshot):
+        self.pending.append(_CheckpointRequest(snapshot))
+        self.has_work.set()
+
+    async def run(self):
+        try:
+            await self._run()
+        except Exception as error:
+            # Kept for the workers and main() rather than raised from the task
+            self.error = error
+            self.has_space.set()
+
+    async def _run(self):
+        while not (self.closing and not self.pending):
+            try:
+                await asyncio.wait_for(self.has_work.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.has_work.clear()
+            await self._drain()
+            if self.unflushed_rows and (
+                self.unflushed_rows >= self.flush_rows
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            ):
+                await asyncio.to_thread(self._flush)
+        await asyncio.to_thread(self._flush)
+        for sink in self.sinks:
+            await asyncio.to_thread(sink.close)
+
+    async def close(self):
+        """
+        Writes out everything still buffered and stops the writer task.
+        A failed writer is left as it is; its error stays in `error`.
+        """
+        if self.error is not None:
+            return
+        self.closing = True
+        self.has_work.set()
+        await self.task
+
+    async def _drain(self):
+        while self.pending:
+            block = []
+            while self.pending and len(block) < self.block_rows:
+                if isinstance(self.pending[0], _CheckpointRequest):
+                    break
+                block.append(self.pending.popleft())
+            if block:
+                await asyncio.to_thread(self._write_block, block)
+            if self.pending and isinstance(self.pending[0], _CheckpointRequest):
+                request = self.pending.popleft()
+                await asyncio.to_thread(self._commit, request.snapshot)
+            if len(self.pending) < self.max_pending // 2:
+                self.has_space.set()
+
+    def _write_block(self, block):
+        self.csv_writer.writerows(block)
+        for sink in self.sinks:
+            sink.write_block(block)
+        self.rows_written += len(block)
+        self.unflushed_rows += len(block)
+
+    def _flush(self):
+        self.csvfile.flush()
+        for sink in self.sinks:
+            sink.flush()
+        self.unflushed_rows = 0
+        self.last_flush = time.monotonic()
+        if self.progress_total:
+            print_progress_bar(
+                min(self.rows_written, self.progress_total),
+                self.progress_total,
+                prefix="Battles:",
+                suffix=f"{self.rows_written} written",
+                length=50,
+            )
+
+    def _commit(self, snapshot):
+        for sink in self.sinks:
+            sink.flush()
+            if hasattr(sink, "sync"):
+                sink.sync()
+        self.unflushed_rows = 0
+        self.last_flush = time.monotonic()
+        self.checkpoint.commit(self.csvfile, snapshot)
@@ -0,0 +1,124 @@
+import calendar
+from collections import namedtuple
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    import json
+
+    json_loads = json.loads
+    JSON_BACKEND = "json"
+
+# Only the fields the pipeline uses. The team fields are the sorted brawler
+# names of the requesting player's team and of the other team; they are None
+# unless the battle had exactly two teams and the player was found in one.
+# With with_players, team_players holds the same two teams as lists of
+# (player tag, brawler trophies) in the order of the brawler names.
+BattleRecord = namedtuple(
+    "BattleRecord",
+    [
+        "battle_time",
+        "event_mode",
+        "map_name",
+        "result",
+        "player_tags",
+        "primary_team",
+        "opposing_team",
+        "team_players",
+    ],
+    defaults=(None,),
+)
+
+
+def decode_battle_log(body, player_tag, keep=None, with_players=False):
+    """
+    Decodes a /players/{tag}/battlelog response into BattleRecords.
+
+    Uses orjson when it is installed. Each item is checked with `keep`
+    before its teams are touched, and the teams are then walked once to
+    collect the tags, find the player's team and gather brawler names.
+
+    Args:
+    body (bytes): raw response body
+    player_tag (str): tag of the player whose battle log this is
+    keep (callable): optional filter taking (battle, event) dicts
+    with_players (bool): also fill each record's team_players
+
+    Returns:
+    tuple: (list of BattleRecord for every kept item, number of items in the log)
+
+    Raises:
+    ValueError: if the body is not valid JSON
+    """
+    records = []
+    items = json_loads(body).get("items", ())
+    for item in items:
+        battle, event = item.get("battle"), item.get("event") or {}
+        if keep is not None and not keep(battle, event):
+            continue
+        if not battle:
+            continue
+
+        teams = battle.get("teams") or ()
+        player_tags = []
+        team_brawlers = []
+        team_players = []
+        primary_index = None
+        for index, team in enumerate(teams):
+            brawlers = []
+            for player in team:
+                tag = player["tag"]
+                if tag == player_tag and primary_index is None:
+                    primary_index = index
+                player_tags.append(tag)
+                brawlers.append(player["brawler"]["name"])
+            if with_players:
+                # Sorted like the names: a stable sort of (name, player) pairs
+                players = sorted(
+                    ((name, (player["tag"], player["brawler"].get("trophies"))) for name, player in zip(brawlers, team)),
+                    key=lambda pair: pair[0],
+                )
+                team_players.append([player for _, player in players])
+            brawlers.sort()
+            team_brawlers.append(brawlers)
+        player_tags.sort()
+
+        primary_team = opposing_team = players = None
+        if len(teams) == 2 and primary_index is not None:
+            primary_team = team_brawlers[primary_index]
+            opposing_team = team_brawlers[1 - primary_index]
+            if with_players:
+                players = (team_players[primary_index], team_players[1 - primary_index])
+
+        records.append(
+            BattleRecord(
+                item.get("battleTime"),
+                event.get("mode"),
+                event.get("map"),
+                battle.get("result"),
+                player_tags,
+                primary_team,
+                opposing_team,
+                players,
+            )
+        )
+    return records, len(items)
+
+
+def battle_timestamp(battle_time):
+    """
+    Converts a battleTime such as '20240701T123000.000Z' to Unix seconds.
+
+    Returns:
+    int: seconds since the epoch, or None if the value is malformed
+    """
+    try:
+        return calendar.timegm((
+            int(battle_time[0:4]), int(battle_time[4:6]), int(battle_time[6:8]),
+            int(battle_time[9:11]), int(battle_time[11:13]), int(battle_time[13:15]),
+        ))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,236 @@
+import os
+import time
+
+import numpy as np
+
+from shared.tags import encode_tag
+
+# Journal bytes read at a time when a checkpoint is loaded
+JOURNAL_BLOCK_SIZE = 1 << 22
+# Value of each hex digit character
+_HEX_VALUES = np.zeros(256, dtype=np.uint8)
+_HEX_VALUES[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16)
+_HEX_VALUES[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+
+class CheckpointState:
+    """Commit marker of a checkpoint journal, and what replaying it loaded."""
+
+    def __init__(self):
+        # False when the journal has no commit marker, i.e. nothing to resume
+        self.committed = False
+        # Journal bytes up to and including the last commit marker
+        self.journal_size = 0
+        self.csv_offset = 0
+        self.count = 0
+        self.unique_battles = 0
+        self.duplicate_battles = 0
+        # P entries replayed; a player refreshed again is counted again
+        self.visited_players = 0
+        # F entries queued, i.e. players never visited
+        self.frontier_players = 0
+
+
+class CrawlCheckpoint:
+    """
+    Append-only journal of crawl state, kept next to the output CSV.
+
+    Visited players, frontier additions and battle hashes are buffered in
+    memory as they happen, taken with snapshot() and appended to the journal
+    by commit(). Each commit first flushes the CSV and then writes a commit
+    marker holding the CSV byte offset and counters, so a committed journal
+    always describes exactly the rows before that offset. Only the delta since the last
+    commit is written, which keeps each checkpoint cheap.
+
+    Journal lines are tab separated:
+    P <tag>        player visited
+    F <tag>        player added to the frontier
+    B <digest>     battle processed, as a hex 64-bit digest
+    W <tag> <watermark> <next poll>    player's newest ingested battle and next poll, in Unix seconds
+    C <offset> <count> <unique> <duplicates>    commit marker
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.journal = open(journal_path, "a", encoding="utf-8")
+        self.pending = []
+        self.commits = 0
+        self.time_spent = 0.0
+
+    def log_player(self, player_tag):
+        self.pending.append(f"P\t{player_tag}\n")
+
+    def log_frontier(self, player_tag):
+        self.pending.append(f"F\t{player_tag}\n")
+
+    def log_battle(self, battle_hash):
+        self.pending.append(f"B\t{battle_hash:016x}\n")
+
+    def log_watermark(self, player_tag, watermark, next_poll):
+        self.pending.append(f"W\t{player_tag}\t{int(watermark)}\t{int(next_poll)}\n")
+
+    def snapshot(self, count, battle_tracker):
+        """
+        Takes the entries logged since the last snapshot together with the
+        current counters. Call it in the same step that produced the rows it
+        covers, then pass it to commit() once those rows are in the CSV.
+        """
+        duplicate_battles, unique_battles = battle_tracker.get_counters()
+        lines, self.pending = self.pending, []
+        return lines, count, unique_battles, duplicate_battles
+
+    def commit(self, csvfile, snapshot):
+        start = time.perf_counter()
+        lines, count, unique_battles, duplicate_battles = snapshot
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+        lines.append(
+            f"C\t{csvfile.tell()}\t{count}\t{unique_battles}\t{duplicate_battles}\n"
+        )
+        self.journal.writelines(lines)
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.commits += 1
+        self.time_spent += time.perf_counter() - start
+
+    def close(self):
+        self.journal.close()
+
+
+def journal_path_for(csv_file_name):
+    return f"{csv_file_name}.journal"
+
+
+def load_checkpoint(journal_path, battles=None, frontier=None, watermarks=None):
+    """
+    Replays a checkpoint journal up to its last commit marker.
+
+    Entries written after the last commit (e.g. by a crash mid-checkpoint)
+    are discarded and truncated from the file, so the journal can be
+    appended to again.
+
+    Entries are streamed into the crawl's own structures rather than
+    collected first, reading the journal in blocks: a first pass finds the
+    last commit marker and counts the battles before it, a second parses
+    each block's battle digests at once into one preallocated uint64
+    array and replays the players and watermarks, and a third queues the
+    frontier players, which are only known to be unvisited once every P
+    entry is in. Structures left as None are not loaded.
+
+    Args:
+    journal_path (str): path of the journal file
+    battles (BattleDedupIndex): receives the committed battle digests
+    frontier (PlayerFrontier): visited players are marked seen, the others queued
+    watermarks (PlayerWatermarks): receives the committed watermarks
+
+    Returns:
+    CheckpointState: the last commit marker and the entries replayed
+    """
+    state = CheckpointState()
+    battle_count = battles_read = 0
+    commit_line = None
+    for offset, block, starts, ends in _journal_blocks(journal_path):
+        kinds = block[starts]
+        commits = np.flatnonzero(kinds == ord("C"))
+        if len(commits):
+            last = commits[-1]
+            state.journal_size = offset + int(ends[last]) + 1
+            commit_line = block[starts[last]:ends[last]].tobytes()
+            battle_count = battles_read + int(np.count_nonzero(kinds[:last] == ord("B")))
+        battles_read += int(np.count_nonzero(kinds == ord("B")))
+
+    with open(journal_path, "r+b") as journal:
+        journal.truncate(state.journal_size)
+    if commit_line is None:
+        return state
+    state.committed = True
+    values = commit_line.decode("utf-8").split("\t")[1:]
+    state.csv_offset, state.count, state.unique_battles, state.duplicate_battles = map(int, values)
+
+    digests = np.empty(battle_count if battles is not None else 0, dtype=np.uint64)
+    battle_index = 0
+    for _, block, starts, ends in _journal_blocks(journal_path):
+        kinds = block[starts]
+        if battles is not None:
+            battle_starts = starts[kinds == ord("B")]
+            digests[battle_index:battle_index + len(battle_starts)] = _hex_digests(block, battle_starts)
+            battle_index += len(battle_starts)
+        players = kinds == ord("P")
+        state.visited_players += int(np.count_nonzero(players))
+        replayed = np.zeros(len(kinds), dtype=bool)
+        if frontier is not None:
+            replayed |= players
+        if watermarks is not None:
+            replayed |= kinds == ord("W")
+        for line in np.flatnonzero(replayed).tolist():
+            kind, player_tag, *values = block[starts[line]:ends[line]].tobytes().decode("utf-8").split("\t")
+            if kind == "P":
+                frontier.mark_seen(encode_tag(player_tag))
+            else:
+                watermarks.update(encode_tag(player_tag), int(values[0]), int(values[1]))
+    if battles is not None:
+        battles.update(digests)
+
+    if frontier is not None:
+        for _, block, starts, ends in _journal_blocks(journal_path):
+            for line in np.flatnonzero(block[starts] == ord("F")).tolist():
+                if frontier.add(encode_tag(block[starts[line] + 2:ends[line]].tobytes().decode("utf-8"))):
+                    state.frontier_players += 1
+    return state
+
+
+def _journal_blocks(journal_path, block_size=JOURNAL_BLOCK_SIZE):
+    """
+    Reads a journal in blocks of whole lines; a last line cut off mid-write
+    is left out.
+
+    Yields:
+    tuple: (offset of the block in the file, the block as a uint8 array,
+    start and end (newline) offsets of its lines)
+    """
+    offset = 0
+    carry = b""
+    with open(journal_path, "rb") as journal:
+        while True:
+            chunk = journal.read(block_size)
+            if not chunk:
+                return
+            data = carry + chunk
+            block = np.frombuffer(data, dtype=np.uint8)
+            ends = np.flatnonzero(block == ord("\n"))
+            if not len(ends):
+                carry = data
+                continue
+            carry = data[ends[-1] + 1:]
+            yield offset, block, np.concatenate(([0], ends[:-1] + 1)), ends
+            offset += int(ends[-1]) + 1
+
+
+def _hex_digests(block, starts):
+    # B lines hold exactly 16 hex digits after "B\t" (see log_battle): look
+    # each digit up, pair them into bytes and read those as big-endian uint64
+    digits = _HEX_VALUES[block[starts.astype(np.int32)[:, None] + np.arange(2, 18, dtype=np.int32)]]
+    packed = (digits[:, 0::2] << 4) | digits[:, 1::2]
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def read_journal_players(journal_path):
+    """
+    Reads the players of a checkpoint journal without replaying or
+    truncating it, so it is safe on a crawl that is still running.
+
+    Uncommitted entries are included; callers use the tags as hints only.
+
+    Returns:
+    tuple: (visited player tags, frontier tags never visited), each in journal order
+    """
+    visited, frontier = {}, {}
+    with open(journal_path, encoding="utf-8", errors="replace") as journal:
+        for line in journal:
+            if not line.endswith("\n"):
+                break  # Cut off mid-write
+            if line.startswith("P\t"):
+                visited[line[2:].rstrip("\n")] = None
+            elif line.startswith("F\t"):
+                frontier[line[2:].rstrip("\n")] = None
+    return list(visited), [tag for tag in frontier if tag not in visited]
@@ -0,0 +1,211 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BATTLE_COLUMNS = [
+    "battle_mode",
+    "map_name",
+    "winner_1",
+    "winner_2",
+    "winner_3",
+    "loser_1",
+    "loser_2",
+    "loser_3",
+]
+BRAWLER_COLUMNS = BATTLE_COLUMNS[2:]
+# Every brawler slot shares one vocabulary
+VOCABULARY_OF = {
+    "battle_mode": "battle_mode",
+    "map_name": "map_name",
+    **{column: "brawler" for column in BRAWLER_COLUMNS},
+}
+FORMAT_VERSION = 1
+CODE_DTYPE = np.uint16
+# Code 0 is reserved for missing values such as the crawler's "N/A" padding
+MISSING_VALUES = {None, "", "N/A"}
+
+
+class ColumnarBattleWriter:
+    """
+    Writer sink that stores crawl rows as dictionary-encoded columns.
+
+    Each column of BATTLE_COLUMNS is stored as uint16 codes; mode, map and
+    brawler names are kept once in dictionary.json. While the crawl runs the
+    codes are appended to raw `<column>.u16` files; close() turns them into
+    `<column>.npy` files (and `battles.parquet` when pyarrow is installed
+    and `parquet` is set) that load_columnar() reads back.
+
+    Sink interface used by BattleWriter: write_block(rows), flush(), close(),
+    and sync(), which makes the flushed codes durable before a checkpoint
+    commits them, so a resume never truncates a column past its end.
+    """
+
+    def __init__(self, directory, resume_rows=None, parquet=False):
+        self.directory = directory
+        self.parquet = parquet
+        os.makedirs(directory, exist_ok=True)
+        self.vocabularies = {"battle_mode": [None], "map_name": [None], "brawler": [None]}
+        self.rows = 0
+        if resume_rows is not None and os.path.exists(self._dictionary_path()):
+            self._reopen(resume_rows)
+        self.codes = {
+            vocabulary: {value: code for code, value in enumerate(values)}
+            for vocabulary, values in self.vocabularies.items()
+        }
+        # Without a dictionary no checkpoint covered any row, so start over
+        mode = "ab" if resume_rows is not None and os.path.exists(self._dictionary_path()) else "wb"
+        self.files = {column: open(self._raw_path(column), mode) for column in BATTLE_COLUMNS}
+
+    def _dictionary_path(self):
+        return os.path.join(self.directory, "dictionary.json")
+
+    def _raw_path(self, column):
+        return os.path.join(self.directory, f"{column}.u16")
+
+    def _npy_path(self, column):
+        return os.path.join(self.directory, f"{column}.npy")
+
+    def _reopen(self, resume_rows):
+        with open(self._dictionary_path()) as f:
+            self.vocabularies = json.load(f)["vocabularies"]
+        # Rows written after the last checkpoint are dropped, like in the CSV
+        for column in BATTLE_COLUMNS:
+            if not os.path.exists(self._raw_path(column)) and os.path.exists(self._npy_path(column)):
+                np.load(self._npy_path(column)).astype(CODE_DTYPE).tofile(self._raw_path(column))
+                os.remove(self._npy_path(column))
+            with open(self._raw_path(column), "r+b") as f:
+                f.truncate(resume_rows * np.dtype(CODE_DTYPE).itemsize)
+        self.rows = resume_rows
+
+    def _encode(self, vocabulary, value):
+        if value in MISSING_VALUES:
+            return 0
+        codes = self.codes[vocabulary]
+        code = codes.get(value)
+        if code is None:
+            code = len(self.vocabularies[vocabulary])
+            codes[value] = code
+            self.vocabularies[vocabulary].append(value)
+        return code
+
+    def write_block(self, rows):
+        block = np.empty((len(rows), len(BATTLE_COLUMNS)), dtype=CODE_DTYPE)
+        for i, row in enumerate(rows):
+            block[i] = [
+                self._encode(VOCABULARY_OF[column], value)
+                for column, value in zip(BATTLE_COLUMNS, row)
+            ]
+        for index, column in enumerate(BATTLE_COLUMNS):
+            block[:, index].tofile(self.files[column])
+        self.rows += len(rows)
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+        self._write_dictionary()
+
+    def sync(self):
+        for f in self.files.values():
+            os.fsync(f.fileno())
+        self._write_dictionary(durable=True)
+
+    def _write_dictionary(self, durable=False):
+        temporary_path = self._dictionary_path() + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(
+                {
+                    "format_version": FORMAT_VERSION,
+                    "rows": self.rows,
+                    "columns": BATTLE_COLUMNS,
+                    "column_vocabularies": VOCABULARY_OF,
+                    "vocabularies": self.vocabularies,
+                },
+                f,
+            )
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporary_path, self._dictionary_path())
+
+    def close(self):
+        self.flush()
+        for column, f in self.files.items():
+            f.close()
+            codes = np.fromfile(self._raw_path(column), dtype=CODE_DTYPE)
+            np.save(self._npy_path(column), codes)
+            os.remove(self._raw_path(column))
+        if self.parquet:
+            write_parquet(load_columnar(self.directory), os.path.join(self.directory, "battles.parquet"))
+
+
+class ColumnarBattles:
+    """A columnar crawl loaded into memory: integer codes plus their vocabularies."""
+
+    def __init__(self, codes, vocabularies):
+        self.codes = codes
+        self.vocabularies = vocabularies
+        self.rows = len(codes[BATTLE_COLUMNS[0]])
+
+    def brawler_codes(self):
+        """Returns (winners, losers) as (rows, 3) code arrays; 0 means missing."""
+        winners = np.stack([self.codes[c] for c in BRAWLER_COLUMNS[:3]], axis=1)
+        losers = np.stack([self.codes[c] for c in BRAWLER_COLUMNS[3:]], axis=1)
+        return winners, losers
+
+    def to_dataframe(self, categorical=False):
+        """
+        Same columns as the crawler CSV, with missing brawlers as NaN.
+
+        By default values are plain strings, exactly as pd.read_csv returns
+        them; with `categorical` they stay pandas Categoricals over the codes.
+        """
+        columns = {}
+        for column in BATTLE_COLUMNS:
+            vocabulary = self.vocabularies[VOCABULARY_OF[column]]
+            codes = np.asarray(self.codes[column])
+            if categorical:
+                columns[column] = pd.Categorical.from_codes(
+                    codes.astype(np.int32) - 1, categories=vocabulary[1:]
+                )
+            else:
+                values = np.array([np.nan] + vocabulary[1:], dtype=object)
+                columns[column] = values[codes]
+        return pd.DataFrame(columns)
+
+
+def load_columnar(directory, mmap=True):
+    """
+    Loads a columnar crawl written by ColumnarBattleWriter.
+
+    Args:
+    directory (str): the `.columnar` directory
+    mmap (bool): memory-map the code arrays instead of reading them
+
+    Returns:
+    ColumnarBattles: codes and vocabularies of the crawl
+    """
+    with open(os.path.join(directory, "dictionary.json")) as f:
+        dictionary = json.load(f)
+    codes = {
+        column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode="r" if mmap else None)
+        for column in dictionary["columns"]
+    }
+    return ColumnarBattles(codes, dictionary["vocabularies"])
+
+
+def write_parquet(battles, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow is not installed; skipping the Parquet copy of the crawl")
+        return
+    arrays = {}
+    for column in BATTLE_COLUMNS:
+        vocabulary = battles.vocabularies[VOCABULARY_OF[column]]
+        codes = np.asarray(battles.codes[column]).astype(np.int32)
+        indices = pa.array(codes - 1, mask=codes == 0)
+        arrays[column] = pa.DictionaryArray.from_arrays(indices, pa.array(vocabulary[1:], type=pa.string()))
+    pq.write_table(pa.table(arrays), path)
@@ -0,0 +1,94 @@
+import json
+import os
+
+import numpy as np
+
+from shared.battle_data import dataset_signature
+
+# Index directory -> index opened by this process
+_opened = {}
+
+
+def save_index(directory, arrays, header_name, header):
+    """
+    Saves an index of a crawl as a directory of `<name>.npy` arrays plus a
+    JSON header. Each file is written to a temporary name and moved in
+    place, and the header goes last, so a half-written index never carries
+    the signature of its dataset.
+
+    Args:
+    directory (str): the index directory
+    arrays (dict): array name -> np.ndarray
+    header_name (str): file name of the header, e.g. index.json
+    header (dict): JSON header; holds `format_version` and `source`, the
+        signature of the dataset the index was built from
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        # np.save adds the suffix to a path without one
+        temporary_path = os.path.join(directory, f"{name}.tmp.npy")
+        np.save(temporary_path, array)
+        os.replace(temporary_path, os.path.join(directory, f"{name}.npy"))
+    temporary_path = os.path.join(directory, f"{header_name}.tmp")
+    with open(temporary_path, "w") as f:
+        json.dump(header, f)
+    os.replace(temporary_path, os.path.join(directory, header_name))
+
+
+def load_index(directory, names, header_name, format_version, mmap=False):
+    """
+    Loads an index written by save_index().
+
+    Args:
+    names (tuple): arrays to load
+    format_version (int): the only header format_version accepted
+    mmap (bool): memory-map the arrays instead of reading them
+
+    Returns:
+    tuple: (header dict, dict of array name -> np.ndarray)
+
+    Raises:
+    OSError: if a file is missing
+    ValueError: if the index has another format version
+    """
+    with open(os.path.join(directory, header_name)) as f:
+        header = json.load(f)
+    if header.get("format_version") != format_version:
+        raise ValueError(f"{directory} has {header_name} format {header.get('format_version')}")
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in names
+    }
+    return header, arrays
+
+
+def open_index(dataset, directory, load, build):
+    """
+    Opens an index of a crawl, building it first when there is none or
+    when the crawl changed since it was built. Indexes opened before by
+    this process are reused while their dataset is unchanged.
+
+    Args:
+    dataset (str): a crawl `.csv` file or `.columnar` directory
+    directory (str): where the index is kept
+    load (callable): directory -> index, raising OSError or ValueError when
+        there is no usable one; indexes carry their dataset's signature as `source`
+    build (callable): (dataset, signature, directory) -> index, saved to
+        `directory` and built from the dataset read after `signature` was taken
+
+    Returns:
+    the index
+    """
+    # Taken first: a crawl appended to while it is read gets rebuilt next time
+    signature = dataset_signature(dataset)
+    index = _opened.get(directory)
+    if index is not None and index.source == signature:
+        return index
+    try:
+        index = load(directory)
+    except (OSError, ValueError):
+        index = None
+    if index is None or index.source != signature:
+        index = build(dataset, signature, directory)
+    _opened[directory] = index
+    return index
@@ -0,0 +1,287 @@
+import hashlib
+import math
+
+import numpy as np
+
+# Multiplier for Fibonacci hashing (2^64 / golden ratio)
+_FIBONACCI = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+# Keys update() places per _insert_bulk() call
+BULK_INSERT_BLOCK = 1 << 18
+
+
+def mix64(key):
+    """Finalizer from MurmurHash3: spreads every input bit over all 64 output bits."""
+    key ^= key >> 33
+    key = (key * 0xFF51AFD7ED558CCD) & _MASK64
+    key ^= key >> 33
+    key = (key * 0xC4CEB9FE1A85EC53) & _MASK64
+    return key ^ (key >> 33)
+
+
+def battle_digest(battle_time, player_tags):
+    """
+    Fixed-width 64-bit digest of a battle, used as its dedup key.
+
+    With n battles the chance of any two colliding is about n^2 / 2^65,
+    i.e. ~3e-6 for 10M battles and ~3e-4 for 100M.
+
+    Args:
+    battle_time (str): battleTime of the battle
+    player_tags (list): sorted tags of every player in the battle
+
+    Returns:
+    int: nonzero unsigned 64-bit digest
+    """
+    key = (battle_time + "".join(player_tags)).encode()
+    digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    # Zero marks an empty slot in DigestSet
+    return digest or 1
+
+
+class DigestSet:
+    """
+    Set of nonzero 64-bit integers in a flat open-addressing table.
+
+    Keys live in one NumPy uint64 array with linear probing, so each entry
+    costs 8 bytes / load factor (~11-16 bytes) instead of the ~150 bytes of
+    a str in a Python set. Slots come from Fibonacci hashing of the key, so
+    structured keys such as packed player tags spread as well as digests.
+    """
+
+    def __init__(self, capacity=1 << 16, max_load=0.7):
+        self.max_load = max_load
+        self.size = 0
+        self._allocate(1 << max(4, math.ceil(math.log2(capacity / max_load))))
+
+    def _allocate(self, slots):
+        self.table = np.zeros(slots, dtype=np.uint64)
+        # A memoryview gives cheap per-slot access from Python code
+        self._slots = memoryview(self.table).cast("B").cast("Q")
+        self.mask = slots - 1
+        self.shift = 64 - (slots.bit_length() - 1)
+        self.resize_at = int(slots * self.max_load)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        slots, mask = self._slots, self.mask
+        slot = ((key * _FIBONACCI) & _MASK64) >> self.shift
+        while True:
+            current = slots[slot]
+            if current == key:
+                return True
+            if current == 0:
+                return False
+            slot = (slot + 1) & mask
+
+    def add(self, key):
+        """Adds a key and returns True if it was not already present."""
+        slots, mask = self._slots, self.mask
+        slot = ((key * _FIBONACCI) & _MASK64) >> self.shift
+        while True:
+            current = slots[slot]
+            if current == key:
+                return False
+            if current == 0:
+                break
+            slot = (slot + 1) & mask
+        slots[slot] = key
+        self.size += 1
+        if self.size > self.resize_at:
+            self._grow(len(self.table) * 2)
+        return True
+
+    def update(self, keys):
+        if isinstance(keys, np.ndarray):
+            keys = keys.astype(np.uint64, copy=False)
+        else:
+            keys = np.fromiter(keys, dtype=np.uint64)
+        merged = np.union1d(self.keys(), keys[keys != 0])
+        slots = len(self.table)
+        while len(merged) > slots * self.max_load:
+            slots *= 2
+        self._allocate(slots)
+        # In blocks, so the probing arrays stay small next to the table
+        for start in range(0, len(merged), BULK_INSERT_BLOCK):
+            self._insert_bulk(merged[start:start + BULK_INSERT_BLOCK])
+        self.size = len(merged)
+
+    def keys(self):
+        return self.table[self.table != 0]
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def _grow(self, slots):
+        keys = self.keys()
+        self._allocate(slots)
+        self._insert_bulk(keys)
+
+    def _insert_bulk(self, keys):
+        # Vectorized linear probing: each round, the first pending key aimed
+        # at an empty slot claims it; everything else moves one slot on.
+        # Returns the slot each key landed in.
+        table, mask = self.table, np.uint64(self.mask)
+        pending, order = keys, np.arange(len(keys))
+        placed = np.empty(len(keys), dtype=np.int64)
+        slots = (pending * np.uint64(_FIBONACCI)) >> np.uint64(self.shift)
+        while len(pending):
+            free = np.flatnonzero(table[slots] == 0)
+            _, first = np.unique(slots[free], return_index=True)
+            winners = free[first]
+            table[slots[winners]] = pending[winners]
+            placed[order[winners]] = slots[winners]
+            keep = np.ones(len(pending), dtype=bool)
+            keep[winners] = False
+            pending, order = pending[keep], order[keep]
+            slots = (slots[keep] + np.uint64(1)) & mask
+        return placed
+
+
+class DigestMap(DigestSet):
+    """
+    DigestSet whose keys carry fixed-width values, kept in NumPy arrays
+    aligned with the key table: one array per field of `fields`, a list
+    of (name, dtype) pairs.
+    """
+
+    def __init__(self, fields, capacity=1 << 16, max_load=0.7):
+        self.fields = fields
+        super().__init__(capacity, max_load)
+
+    def _allocate(self, slots):
+        super()._allocate(slots)
+        self.values = {name: np.zeros(slots, dtype=dtype) for name, dtype in self.fields}
+
+    def _slot(self, key):
+        # The key's slot, or the empty slot it would take
+        slots, mask = self._slots, self.mask
+        slot = ((key * _FIBONACCI) & _MASK64) >> self.shift
+        while True:
+            current = slots[slot]
+            if current == key or current == 0:
+                return slot
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        """Returns the key's values as a tuple in `fields` order, or `default`."""
+        slot = self._slot(key)
+        if self._slots[slot] != key:
+            return default
+        return tuple(values[slot].item() for values in self.values.values())
+
+    def set(self, key, *values):
+        slot = self._slot(key)
+        if self._slots[slot] != key:
+            self._slots[slot] = key
+            self.size += 1
+            if self.size > self.resize_at:
+                self._grow(len(self.table) * 2)
+                slot = self._slot(key)
+        for array, value in zip(self.values.values(), values):
+            array[slot] = value
+
+    def items(self):
+        """Returns (keys, values): the keys and a dict of their value arrays, in table order."""
+        used = self.table != 0
+        return self.table[used], {name: values[used] for name, values in self.values.items()}
+
+    def update(self, keys):
+        raise NotImplementedError("DigestMap entries are added with set()")
+
+    def _grow(self, slots):
+        keys, values = self.items()
+        self._allocate(slots)
+        placed = self._insert_bulk(keys)
+        for name, array in values.items():
+            self.values[name][placed] = array
+
+
+class BloomFilter:
+    """
+    Bloom filter over 64-bit keys, sized for a target false-positive rate.
+
+    Keys are mixed once with mix64 and the k probe positions are derived
+    from the two 32-bit halves of the result (double hashing).
+    """
+
+    def __init__(self, capacity, false_positive_rate=0.001):
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        bits = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_bits = bits
+        self.num_hashes = max(1, round(bits / capacity * math.log(2)))
+        self.bits = bytearray((bits + 7) // 8)
+
+    def __contains__(self, key):
+        bits, num_bits = self.bits, self.num_bits
+        key = mix64(key)
+        position, step = key & 0xFFFFFFFF, (key >> 32) | 1
+        for _ in range(self.num_hashes):
+            position %= num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+        return True
+
+    def add(self, key):
+        bits, num_bits = self.bits, self.num_bits
+        key = mix64(key)
+        position, step = key & 0xFFFFFFFF, (key >> 32) | 1
+        for _ in range(self.num_hashes):
+            position %= num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+            position += step
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class BattleDedupIndex:
+    """
+    Dedup index of battle digests for the crawler.
+
+    By default every digest is kept exactly in a DigestSet. With
+    `bloom_capacity` set, a BloomFilter replaces the table: memory stays
+    fixed at the filter's size, at the cost of discarding roughly
+    `false_positive_rate` of new battles as false duplicates. From Python
+    the filter is also about 6x slower than the table (bench_dedup, 300K
+    battles: 0.12M against 0.78M checks and inserts per second), so it
+    only pays off when memory is the limit.
+    """
+
+    def __init__(self, capacity=1 << 16, bloom_capacity=None, false_positive_rate=0.001):
+        self.bloom = BloomFilter(bloom_capacity, false_positive_rate) if bloom_capacity else None
+        self.digests = None if self.bloom else DigestSet(capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, digest):
+        if self.bloom is not None:
+            return digest in self.bloom
+        return digest in self.digests
+
+    def add(self, digest):
+        if self.bloom is not None:
+            self.bloom.add(digest)
+            self.size += 1
+        elif self.digests.add(digest):
+            self.size += 1
+
+    def update(self, digests):
+        if self.bloom is not None:
+            for digest in digests:
+                self.add(digest)
+        else:
+            self.digests.update(digests)
+            self.size = len(self.digests)
+
+    @property
+    def nbytes(self):
+        return self.bloom.nbytes if self.bloom else self.digests.nbytes
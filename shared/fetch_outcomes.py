@@ -0,0 +1,43 @@
+class FetchOutcomes:
+    """
+    Accounts for what each battle log fetch was worth.
+
+    A fetch counts as `useful` when it produced new information: a new
+    battle or a newly discovered player. Otherwise it counts as `wasted`,
+    or as `failed` when the request or its payload failed.
+
+    Players are not claimed here: the frontier drops a player at enqueue
+    time once its seen set has them, so no player is handed to two workers.
+    """
+
+    def __init__(self):
+        self.useful = 0
+        self.wasted = 0
+        self.failed = 0
+
+    def record(self, new_information, failed=False):
+        if failed:
+            self.failed += 1
+        elif new_information:
+            self.useful += 1
+        else:
+            self.wasted += 1
+
+    @property
+    def fetched(self):
+        return self.useful + self.wasted + self.failed
+
+    def counters(self):
+        """Fetch counts for CrawlMetrics."""
+        return {
+            "fetches_useful": self.useful,
+            "fetches_wasted": self.wasted,
+            "fetches_failed": self.failed,
+        }
+
+    def summary(self):
+        wasted_share = 100 * self.wasted / self.fetched if self.fetched else 0.0
+        return (
+            f"Fetched {self.fetched} battle logs: {self.useful} with new battles or players, "
+            f"{self.wasted} without ({wasted_share:.1f}%), {self.failed} failed."
+        )
@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import math
+import os
+from array import array
+
+from shared.dedup import BloomFilter, DigestSet
+
+
+class PlayerFrontier:
+    """
+    Bounded queue of packed player tags (see shared.tags) waiting to be fetched.
+
+    Every tag ever added is remembered in `seen`, so each player is queued
+    at most once per crawl. Tags discovered while the queue is full go to an
+    in-memory overflow buffer; once that holds `spill_threshold` tags it is
+    written to `spill_path` as one fixed-size chunk of raw uint64s. Workers
+    refill the queue from the overflow buffer first and then from the last
+    spilled chunk, truncating the file as it is read back. Memory therefore
+    stays at roughly `maxsize + spill_threshold` queued tags plus the seen
+    set, which is 8 bytes / load factor per player as a DigestSet, or fixed
+    when `seen_capacity` is given and a Bloom filter is used instead (a
+    false positive only skips one player).
+    """
+
+    def __init__(self, maxsize, spill_path=None, spill_threshold=100000, seen_capacity=None,
+                 seen_false_positive_rate=0.001):
+        self.maxsize = maxsize
+        self._init_queue()
+        self.overflow = array("Q")
+        self.spill_path = spill_path
+        self.spill_threshold = spill_threshold
+        self.spilled_chunks = 0
+        if seen_capacity:
+            self.seen = BloomFilter(seen_capacity, seen_false_positive_rate)
+        else:
+            self.seen = DigestSet()
+        if spill_path:
+            # Start from an empty spill file; resumed crawls re-add their frontier
+            open(spill_path, "wb").close()
+
+    def add(self, player_code):
+        """Queues a player unless it was added before. Returns True if queued."""
+        if player_code in self.seen:
+            return False
+        self.seen.add(player_code)
+        if self._full():
+            self.overflow.append(player_code)
+            if self.spill_path and len(self.overflow) >= self.spill_threshold:
+                self._spill()
+        else:
+            self._push(player_code)
+        return True
+
+    def observe(self, player_code, battle_time, valid_share):
+        """
+        Records a player seen in a processed battle and queues them if new.
+
+        The plain frontier ignores the evidence; see PriorityFrontier.
+        """
+        return self.add(player_code)
+
+    def record_yield(self, player_code, new_battles):
+        pass
+
+    def mark_seen(self, player_code):
+        """Records a player as already handled without queueing it."""
+        self.seen.add(player_code)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def task_done(self):
+        # Refill before marking the tag done so join() only returns once the
+        # queue, the overflow and the spill file are all empty
+        self._refill()
+        self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    def __len__(self):
+        return self._queued() + len(self.overflow) + self.spilled_chunks * self.spill_threshold
+
+    # Queue primitives, replaced by PriorityFrontier
+    def _init_queue(self):
+        self.queue = asyncio.Queue(self.maxsize)
+
+    def _full(self):
+        return self.queue.full()
+
+    def _push(self, player_code):
+        self.queue.put_nowait(player_code)
+
+    def _queued(self):
+        return self.queue.qsize()
+
+    def _refill(self):
+        while not self._full():
+            if not self.overflow and not self._unspill():
+                break
+            self._push(self.overflow.pop())
+
+    def _spill(self):
+        with open(self.spill_path, "ab") as spill_file:
+            self.overflow.tofile(spill_file)
+        self.overflow = array("Q")
+        self.spilled_chunks += 1
+
+    def _unspill(self):
+        if not self.spilled_chunks:
+            return False
+        chunk_bytes = self.spill_threshold * self.overflow.itemsize
+        with open(self.spill_path, "r+b") as spill_file:
+            spill_file.seek(-chunk_bytes, os.SEEK_END)
+            self.overflow.fromfile(spill_file, self.spill_threshold)
+            spill_file.truncate(spill_file.tell() - chunk_bytes)
+        self.spilled_chunks -= 1
+        return True
+
+    def close(self):
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+class PriorityFrontier(PlayerFrontier):
+    """
+    PlayerFrontier that hands out the players expected to yield the most new
+    valid battles per request first.
+
+    The crawler reports every player of every processed battle through
+    observe(), with the battle's time and the share of items in that battle
+    log that passed the filter. Each queued player is summarized by three
+    signals: how many of their battles are already known (every battle we
+    saw them in is one their log would repeat, but many sightings also mean
+    an active player), the mean valid share of the logs they appeared in,
+    and how far their latest battle lags the newest one in the crawl.
+
+    How these combine is learned while crawling rather than assumed: the
+    signals are bucketed, and after each fetch the crawler reports the
+    player's actual number of new valid battles with record_yield(). A
+    player's estimate is the mean yield of their bucket, shrunk towards the
+    overall mean while the bucket has few samples, and estimates are
+    refreshed every `rescore_interval` reported fetches.
+
+    Players are served by tier, in steps of 1 / `tiers_per_mean` of the
+    overall mean yield, and in discovery order within a tier. Ranking by the
+    raw estimate does worse than plain discovery order: players get fetched
+    as soon as they are seen, before the sightings that mark them as active
+    come in. Tiers still push low-yield players to the back.
+
+    Only the `maxsize` queued players are scored; the overflow and spill
+    file are drained in discovery order as in PlayerFrontier.
+    """
+
+    def __init__(self, maxsize, spill_path=None, spill_threshold=100000, seen_capacity=None,
+                 seen_false_positive_rate=0.001, recency_half_life=12 * 3600, rescore_interval=500,
+                 prior_weight=20, tiers_per_mean=2):
+        self.recency_half_life = recency_half_life
+        self.tiers_per_mean = tiers_per_mean
+        self.rescore_interval = rescore_interval
+        self.prior_weight = prior_weight
+        self.newest_time = 0
+        # bucket -> [sum of yields, fetches]
+        self.yields = {}
+        self.total_yield = 0.0
+        self.total_fetches = 0
+        self.fetches_since_rescore = 0
+        # player code -> bucket it was fetched from, until record_yield()
+        self.fetching = {}
+        self.sequence = 0
+        super().__init__(maxsize, spill_path, spill_threshold, seen_capacity, seen_false_positive_rate)
+
+    def _init_queue(self):
+        self.heap = []
+        # player code -> [sightings, sum of valid shares, latest battle time, key, discovery order]
+        self.candidates = {}
+        self.unfinished = 0
+        self.not_empty = asyncio.Event()
+        self.finished = asyncio.Event()
+        self.finished.set()
+
+    def observe(self, player_code, battle_time, valid_share):
+        if battle_time is not None and battle_time > self.newest_time:
+            self.newest_time = battle_time
+        candidate = self.candidates.get(player_code)
+        queued = False
+        if candidate is None:
+            if not self.add(player_code):
+                return False
+            queued = True
+            # None when the player went to the overflow instead
+            candidate = self.candidates.get(player_code)
+            if candidate is None:
+                return True
+        candidate[0] += 1
+        candidate[1] += valid_share
+        if battle_time is not None and battle_time > candidate[2]:
+            candidate[2] = battle_time
+        key = self._key(candidate)
+        if key != candidate[3]:
+            candidate[3] = key
+            self._push_key(player_code, key)
+        return queued
+
+    def record_yield(self, player_code, new_battles):
+        """Reports how many new valid battles fetching `player_code` produced."""
+        bucket = self.fetching.pop(player_code, None)
+        if bucket is None:
+            return
+        stats = self.yields.setdefault(bucket, [0.0, 0])
+        stats[0] += new_battles
+        stats[1] += 1
+        self.total_yield += new_battles
+        self.total_fetches += 1
+        self.fetches_since_rescore += 1
+        if self.fetches_since_rescore >= self.rescore_interval:
+            self.fetches_since_rescore = 0
+            for code, candidate in self.candidates.items():
+                candidate[3] = self._key(candidate)
+            self._rebuild_heap()
+
+    def _bucket(self, candidate):
+        sightings, valid_shares, latest = candidate[0], candidate[1], candidate[2]
+        if not sightings:
+            return None
+        age = max(0, self.newest_time - latest) / self.recency_half_life
+        return (
+            min(sightings, 6),
+            min(3, int(4 * valid_shares / sightings)),
+            min(5, int(math.log2(1 + 8 * age))),
+        )
+
+    def _key(self, candidate):
+        if not self.total_yield:
+            return (0, candidate[4])
+        overall = self.total_yield / self.total_fetches
+        total, fetches = self.yields.get(self._bucket(candidate), (0.0, 0))
+        estimate = (total + self.prior_weight * overall) / (fetches + self.prior_weight)
+        tier = min(5 * self.tiers_per_mean, int(self.tiers_per_mean * estimate / overall))
+        return (-tier, candidate[4])
+
+    def _push_key(self, player_code, key):
+        heapq.heappush(self.heap, (key, player_code))
+        # Rekeying leaves outdated entries behind; drop them once they pile up
+        if len(self.heap) > 4 * len(self.candidates) + 1024:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self.heap = [(candidate[3], code) for code, candidate in self.candidates.items()]
+        heapq.heapify(self.heap)
+
+    async def get(self):
+        while True:
+            while not self.heap:
+                self.not_empty.clear()
+                await self.not_empty.wait()
+            key, player_code = heapq.heappop(self.heap)
+            candidate = self.candidates.get(player_code)
+            if candidate is not None and candidate[3] == key:
+                del self.candidates[player_code]
+                self.fetching[player_code] = self._bucket(candidate)
+                return player_code
+
+    def task_done(self):
+        self._refill()
+        self.unfinished -= 1
+        if not self.unfinished:
+            self.finished.set()
+
+    async def join(self):
+        await self.finished.wait()
+
+    def _full(self):
+        return len(self.candidates) >= self.maxsize
+
+    def _push(self, player_code):
+        self.sequence += 1
+        candidate = [0, 0.0, 0, None, self.sequence]
+        candidate[3] = self._key(candidate)
+        self.candidates[player_code] = candidate
+        self._push_key(player_code, candidate[3])
+        self.unfinished += 1
+        self.finished.clear()
+        self.not_empty.set()
+
+    def _queued(self):
+        return len(self.candidates)
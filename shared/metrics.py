@@ -0,0 +1,180 @@
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+
+from aiohttp import web
+
+# Upper bounds in seconds, roughly 1-2.5-5 per decade; the last bucket is open
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _json_bound(value):
+    # JSON has no infinity
+    return "+Inf" if value == float("inf") else value
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf for the open bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": _json_bound(self.quantile(0.5)),
+            "p90": _json_bound(self.quantile(0.9)),
+            "p99": _json_bound(self.quantile(0.99)),
+            "buckets": {
+                **{f"{bound:g}": count for bound, count in zip(self.bounds, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class CrawlMetrics:
+    """
+    Low-overhead live metrics for a crawl.
+
+    The crawler records each response and the time spent waiting on the
+    rate limiter and processing responses; these are plain counter and
+    histogram updates. A monitor() task samples the request count, process
+    CPU time and the crawl's own counters every `tick` seconds, so rates are
+    taken over the last `window` seconds no matter who reads them, and also
+    measures event loop lag, the time its sleep overshoots.
+
+    Together they tell where a slow crawl is bound: high request latency
+    points at the network, long rate limit waits at the quota, and high CPU
+    use with event loop lag at the crawler itself.
+
+    Args:
+    counters (callable): returns a dict of monotonically increasing crawl
+        counters (e.g. unique battles); their rates are reported too
+    gauges (callable): returns a dict of point-in-time values (e.g. frontier size)
+    """
+
+    def __init__(self, counters=None, gauges=None, window=10.0, tick=0.5):
+        self.counters = counters or dict
+        self.gauges = gauges or dict
+        self.tick = tick
+        self.started = time.monotonic()
+        self.responses = Counter()
+        self.requests = 0
+        self.request_latency = Histogram()
+        self.rate_limit_wait = Histogram()
+        self.processing_time = Histogram()
+        self.loop_lag = Histogram()
+        self.samples = deque([self._sample()], maxlen=max(2, int(window / tick) + 1))
+
+    def record_response(self, status, latency, outcome=None):
+        """Counts a response by status class, or by `outcome` if it had no status."""
+        self.requests += 1
+        self.responses[f"{status // 100}xx" if status else outcome] += 1
+        self.request_latency.observe(latency)
+
+    def observe_wait(self, seconds):
+        self.rate_limit_wait.observe(seconds)
+
+    def observe_processing(self, seconds):
+        self.processing_time.observe(seconds)
+
+    def _sample(self):
+        return time.monotonic(), time.process_time(), self.requests, self.counters()
+
+    async def monitor(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.tick)
+            self.loop_lag.observe(max(0.0, time.monotonic() - before - self.tick))
+            self.samples.append(self._sample())
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict."""
+        (start, start_cpu, start_requests, start_counters) = self.samples[0]
+        (end, end_cpu, end_requests, end_counters) = self.samples[-1]
+        interval = end - start
+        rates = {"requests": (end_requests - start_requests) / interval if interval else 0.0}
+        for name, value in end_counters.items():
+            rates[name] = (value - start_counters.get(name, 0)) / interval if interval else 0.0
+        return {
+            "time": time.time(),
+            "elapsed": time.monotonic() - self.started,
+            "per_second": rates,
+            "cpu_percent": 100 * (end_cpu - start_cpu) / interval if interval else 0.0,
+            "requests": self.requests,
+            "responses": dict(self.responses),
+            "counters": self.counters(),
+            "gauges": self.gauges(),
+            "request_latency": self.request_latency.to_dict(),
+            "rate_limit_wait": self.rate_limit_wait.to_dict(),
+            "processing_time": self.processing_time.to_dict(),
+            "loop_lag": self.loop_lag.to_dict(),
+        }
+
+
+def format_metrics(snapshot, prefix="crawl"):
+    """Renders a snapshot as `name value` lines in the Prometheus text format."""
+    lines = [
+        f"{prefix}_elapsed_seconds {snapshot['elapsed']:.3f}",
+        f"{prefix}_cpu_percent {snapshot['cpu_percent']:.1f}",
+        f"{prefix}_requests_total {snapshot['requests']}",
+    ]
+    for name, rate in snapshot["per_second"].items():
+        lines.append(f"{prefix}_{name}_per_second {rate:.2f}")
+    for name, count in sorted(snapshot["responses"].items()):
+        lines.append(f'{prefix}_responses_total{{class="{name}"}} {count}')
+    for name, value in {**snapshot["counters"], **snapshot["gauges"]}.items():
+        lines.append(f"{prefix}_{name} {value:g}")
+    for name in ("request_latency", "rate_limit_wait", "processing_time", "loop_lag"):
+        histogram = snapshot[name]
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            lines.append(f'{prefix}_{name}_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{prefix}_{name}_seconds_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(metrics, port, host="127.0.0.1"):
+    """
+    Serves `metrics` over HTTP: GET /metrics as text, GET /metrics.json as JSON.
+
+    Returns:
+    aiohttp.web.AppRunner: call `await runner.cleanup()` to stop the server
+    """
+    async def text(request):
+        return web.Response(text=format_metrics(metrics.snapshot()))
+
+    async def as_json(request):
+        return web.Response(text=json.dumps(metrics.snapshot()), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/metrics", text)
+    app.router.add_get("/metrics.json", as_json)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,152 @@
+import numpy as np
+
+from shared.battle_data import dataset_signature, load_brawler_codes, pair_index_path_for
+from shared.crawl_index import load_index, open_index, save_index
+from shared.pair_matrices import count_pairs
+
+FORMAT_VERSION = 1
+HEADER = "index.json"
+# (size, size) count matrices of an index, one `<name>.npy` file each:
+# - same_team_wins[a, b]: battles a and b won on the same team
+# - same_team_losses[a, b]: battles a and b lost on the same team
+# - wins_against[a, b]: battles a won against a team with b
+# The diagonal of the same-team matrices counts the battles a brawler won or lost.
+MATRICES = ("same_team_wins", "same_team_losses", "wins_against")
+
+
+def team_members(team):
+    """
+    A team's distinct brawlers: slots repeating an earlier slot's brawler
+    become 0, so each brawler counts once per battle.
+    """
+    team = np.array(team, dtype=np.int64)
+    for slot in range(1, team.shape[1]):
+        repeated = (team[:, slot:slot + 1] == team[:, :slot]).any(axis=1)
+        team[repeated, slot] = 0
+    return team
+
+
+def pair_matrices(winners, losers, size):
+    """
+    The MATRICES of a crawl's brawler codes.
+
+    Returns:
+    dict: matrix name -> (size, size) int64 counts
+    """
+    winners, losers = team_members(winners), team_members(losers)
+    return {
+        "same_team_wins": count_pairs(winners, winners, size),
+        "same_team_losses": count_pairs(losers, losers, size),
+        "wins_against": count_pairs(winners, losers, size),
+    }
+
+
+class PairIndex:
+    """
+    Per-pair battle counts of a crawl (see MATRICES), for lookups that do
+    not scan the crawl.
+
+    An index is built once per dataset and saved next to it as a
+    `.pairs` directory of `.npy` matrices plus `index.json` (brawler names
+    and the signature of the dataset it was built from). It is opened
+    memory-mapped, so a lookup reads a few cells of the files.
+    """
+
+    def __init__(self, names, matrices, source=None):
+        self.names = names
+        self.matrices = matrices
+        self.source = source
+        self.codes = {name: code for code, name in enumerate(names) if code}
+
+    @classmethod
+    def build(cls, dataset, source=None):
+        """Counts the pairs of a crawl (`.csv` file or `.columnar` directory)."""
+        source = source or dataset_signature(dataset)
+        winners, losers, names = load_brawler_codes(dataset)
+        return cls(names, pair_matrices(winners, losers, len(names)), source)
+
+    def save(self, directory):
+        header = {"format_version": FORMAT_VERSION, "names": self.names, "source": self.source}
+        save_index(directory, self.matrices, HEADER, header)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        header, matrices = load_index(directory, MATRICES, HEADER, FORMAT_VERSION, mmap=mmap)
+        return cls(header["names"], matrices, header["source"])
+
+    def code(self, brawler):
+        """A brawler's row in the matrices; 0, whose counts are all zero, if it never played."""
+        return self.codes.get(brawler, 0)
+
+    def pair(self, brawler_1, brawler_2):
+        """
+        Counts of one pair of brawlers.
+
+        Returns:
+        dict: same_team_wins, same_team_losses and same_team (battles on the
+        same team); wins_against, losses_against and head_to_head (battles
+        of brawler_1 against brawler_2)
+        """
+        a, b = self.code(brawler_1), self.code(brawler_2)
+        same_team_wins = int(self.matrices["same_team_wins"][a, b])
+        same_team_losses = int(self.matrices["same_team_losses"][a, b])
+        wins_against = int(self.matrices["wins_against"][a, b])
+        losses_against = int(self.matrices["wins_against"][b, a])
+        return {
+            "same_team_wins": same_team_wins,
+            "same_team_losses": same_team_losses,
+            "same_team": same_team_wins + same_team_losses,
+            "wins_against": wins_against,
+            "losses_against": losses_against,
+            "head_to_head": wins_against + losses_against,
+        }
+
+    def pairs(self, pairs):
+        """
+        Counts of many pairs at once.
+
+        Args:
+        pairs (list): (brawler_1, brawler_2) tuples
+
+        Returns:
+        dict: the keys of pair(), each an int64 array in the order of `pairs`
+        """
+        codes = np.array([(self.code(a), self.code(b)) for a, b in pairs], dtype=np.int64).reshape(-1, 2)
+        a, b = codes[:, 0], codes[:, 1]
+        counts = {
+            "same_team_wins": np.asarray(self.matrices["same_team_wins"][a, b]),
+            "same_team_losses": np.asarray(self.matrices["same_team_losses"][a, b]),
+            "wins_against": np.asarray(self.matrices["wins_against"][a, b]),
+            "losses_against": np.asarray(self.matrices["wins_against"][b, a]),
+        }
+        counts["same_team"] = counts["same_team_wins"] + counts["same_team_losses"]
+        counts["head_to_head"] = counts["wins_against"] + counts["losses_against"]
+        return counts
+
+    def same_team_win_rate(self, brawler_1, brawler_2):
+        """Percentage of the pair's battles on the same team that it won; 0 without any."""
+        a, b = self.code(brawler_1), self.code(brawler_2)
+        wins = int(self.matrices["same_team_wins"][a, b])
+        total = wins + int(self.matrices["same_team_losses"][a, b])
+        return (wins / total) * 100 if total > 0 else 0
+
+
+def open_pair_index(dataset, directory=None):
+    """
+    Opens the pair index of a crawl, building it first when there is none
+    or when the crawl changed since it was built.
+
+    Args:
+    dataset (str): a crawl `.csv` file or `.columnar` directory
+    directory (str): where the index is kept; next to the crawl by default
+
+    Returns:
+    PairIndex: the memory-mapped index
+    """
+    return open_index(dataset, directory or pair_index_path_for(dataset), PairIndex.load, _build)
+
+
+def _build(dataset, source, directory):
+    # Saved, then reopened memory-mapped like a loaded index
+    PairIndex.build(dataset, source).save(directory)
+    return PairIndex.load(directory)
@@ -0,0 +1,186 @@
+import numpy as np
+
+# Rows per block when counting, to bound the temporary id arrays
+CHUNK_ROWS = 1 << 20
+# Rows of the first block scanned for first occurrences; each block doubles
+FIRST_SCAN_ROWS = 1024
+# Loop position of entries that never appear
+UNSEEN = np.iinfo(np.int64).max
+
+
+def count_pairs(first, second, size, chunk_rows=CHUNK_ROWS):
+    """
+    Counts every (first slot, second slot) brawler pair of every row.
+
+    Args:
+    first (np.ndarray): (rows, k) brawler codes, 0 for missing
+    second (np.ndarray): (rows, m) brawler codes, 0 for missing
+    size (int): number of codes, missing included
+
+    Returns:
+    np.ndarray: (size, size) int64 counts, [a, b] for a in `first` and b
+    in `second` of the same row; pairs with a missing brawler are left out
+    """
+    counts = np.zeros(size * size, dtype=np.int64)
+    for start in range(0, len(first), chunk_rows):
+        a = np.asarray(first[start:start + chunk_rows], dtype=np.int64)[:, :, None]
+        b = np.asarray(second[start:start + chunk_rows], dtype=np.int64)[:, None, :]
+        ids = a * size + b
+        counts += np.bincount(ids[(a != 0) & (b != 0)], minlength=size * size)
+    return counts.reshape(size, size)
+
+
+def antagony_matrices(winners, losers, size):
+    """
+    Win and game counts of every brawler against every other.
+
+    Returns:
+    tuple: (wins, totals), (size, size) int64 arrays where wins[a, b] is
+    the number of times a was on the winning team against b, and
+    totals[a, b] the number of times they were on opposite teams
+    """
+    wins = count_pairs(winners, losers, size)
+    return wins, wins + wins.T
+
+
+def first_events(rows, present, block_events):
+    """
+    Where each entry first appears in a row-by-row loop over a crawl that
+    visits the same number of events in every row.
+
+    Rows are scanned in growing blocks and the scan stops once every
+    `present` entry has been seen, which usually takes a small prefix of
+    the crawl.
+
+    Args:
+    rows (int): rows of the crawl
+    present (np.ndarray): bool, the entries with any events; the entry ids
+        index it flattened
+    block_events (callable): (start, end) -> (ids, valid) for those rows:
+        ids an int64 array with one row per crawl row, whose events are in
+        loop order once flattened, and valid a bool array of its shape,
+        False for events the loop skips
+
+    Returns:
+    np.ndarray: int64 loop positions shaped like `present`, int64 max where absent
+    """
+    first = np.full(present.size, UNSEEN, dtype=np.int64)
+    remaining = int(present.sum())
+    start, block = 0, FIRST_SCAN_ROWS
+    while remaining and start < rows:
+        ids, valid = block_events(start, start + block)
+        positions = start * (ids.size // len(ids)) + np.arange(ids.size, dtype=np.int64).reshape(ids.shape)
+        ids, positions = ids[valid], positions[valid]
+        entry_ids, index = np.unique(ids, return_index=True)
+        new = first[entry_ids] == UNSEEN
+        first[entry_ids[new]] = positions[index[new]]
+        remaining -= int(new.sum())
+        start += len(valid)
+        block *= 2
+    return first.reshape(present.shape)
+
+
+def first_antagony_events(winners, losers, size, present):
+    """
+    Where each antagony entry first appears in the row-by-row loop of
+    create_brawler_antagony: for each row, winner slot and loser slot, it
+    touches [winner][loser] and then [loser][winner].
+
+    Args:
+    present (np.ndarray): (size, size) bool, the pairs with any games
+
+    Returns:
+    np.ndarray: (size, size) int64 loop positions, int64 max where absent
+    """
+    def block_events(start, end):
+        w = np.asarray(winners[start:end], dtype=np.int64)[:, :, None]
+        l = np.asarray(losers[start:end], dtype=np.int64)[:, None, :]
+        # (rows, winner slot, loser slot, direction), in loop order
+        ids = np.stack(np.broadcast_arrays(w * size + l, l * size + w), axis=-1)
+        return ids, np.broadcast_to(((w != 0) & (l != 0))[..., None], ids.shape)
+
+    return first_events(len(winners), present, block_events)
+
+
+def antagony_stats(winners, losers, names):
+    """
+    The antagony counts create_brawler_antagony builds, from code arrays.
+
+    Brawlers and their opponents come in the order the script's loop
+    first touches them, so antagony_json renders the same file.
+
+    Args:
+    winners (np.ndarray): (rows, 3) brawler codes, 0 for missing
+    losers (np.ndarray): (rows, 3) brawler codes, 0 for missing
+    names (list): brawler of each code; names[0] is the missing value
+
+    Returns:
+    dict: brawler -> opponent -> {"wins", "total"}
+    """
+    size = len(names)
+    wins, totals = antagony_matrices(winners, losers, size)
+    first = first_antagony_events(winners, losers, size, totals > 0)
+    outer_first = first.min(axis=1)
+    stats = {}
+    for brawler in np.argsort(outer_first, kind="stable"):
+        if outer_first[brawler] == UNSEEN:
+            break
+        row = first[brawler]
+        opponents = np.argsort(row, kind="stable")[:int((row != UNSEEN).sum())]
+        stats[names[brawler]] = {
+            names[opponent]: {"wins": int(wins[brawler, opponent]), "total": int(totals[brawler, opponent])}
+            for opponent in opponents
+        }
+    return stats
+
+
+def complete_teams(winners, losers):
+    """Rows whose teams both have three distinct brawlers."""
+    complete = np.ones(len(winners), dtype=bool)
+    for team in (winners, losers):
+        team = np.asarray(team)
+        complete &= (team != 0).all(axis=1)
+        complete &= (team[:, 0] != team[:, 1]) & (team[:, 0] != team[:, 2]) & (team[:, 1] != team[:, 2])
+    return complete
+
+
+def synergy_matrices(winners, losers, size):
+    """
+    Teammate win and loss counts, as create_brawler_synergy counts them:
+    only battles whose teams both have three distinct brawlers, and every
+    ordered pair of teammates.
+
+    Returns:
+    tuple: (wins, losses), (size, size) int64 arrays where wins[a, b] is
+    the number of times a and b won on the same team
+    """
+    complete = complete_teams(winners, losers)
+    winners, losers = np.asarray(winners)[complete], np.asarray(losers)[complete]
+    wins, losses = count_pairs(winners, winners, size), count_pairs(losers, losers, size)
+    # A slot paired with itself lands on the diagonal; teammates never do
+    np.fill_diagonal(wins, 0)
+    np.fill_diagonal(losses, 0)
+    return wins, losses
+
+
+def synergy_scores(wins, losses, winrates):
+    """
+    Pair win rates and synergy scores.
+
+    The synergy of a pair is 0.5 plus its win rate minus the mean of the
+    two brawlers' overall win rates; pairs without games have a win rate
+    of 0.
+
+    Args:
+    wins (np.ndarray): (n, n) teammate wins
+    losses (np.ndarray): (n, n) teammate losses
+    winrates (np.ndarray): (n,) overall win rate of each brawler
+
+    Returns:
+    tuple: (winrate, synergy), (n, n) float64 arrays
+    """
+    totals = wins + losses
+    winrate = np.divide(wins, totals, out=np.zeros(totals.shape), where=totals > 0)
+    winrates = np.asarray(winrates, dtype=np.float64)
+    synergy = 0.5 + winrate - (winrates[:, None] + winrates[None, :]) / 2
+    return winrate, synergy
@@ -0,0 +1,203 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from shared.battlelog_decode import json_loads
+
+# Fields of a /players/{tag} response that are kept
+PROFILE_FIELDS = ("tag", "name", "trophies", "highestTrophies", "expLevel")
+_MISSING = object()
+
+
+def parse_profile(body):
+    """
+    Decodes a /players/{tag} response into a dict of PROFILE_FIELDS.
+
+    Returns:
+    dict: the profile, or None if the body is not a valid profile
+    """
+    try:
+        data = json_loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "tag" not in data:
+        return None
+    return {field: data.get(field) for field in PROFILE_FIELDS}
+
+
+class ProfileCache:
+    """
+    Player profiles by tag, kept for `ttl` seconds and at most `max_size`
+    of them, the least recently used evicted first.
+
+    Failed lookups can be cached as None for the shorter `negative_ttl`,
+    so a missing player is not asked for again on every sighting.
+    """
+
+    def __init__(self, max_size=100000, ttl=6 * 3600, negative_ttl=300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # tag -> (expiry, profile), least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, tag, default=None):
+        entry = self.entries.get(tag)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self.entries[tag]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(tag)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tag, profile):
+        ttl = self.ttl if profile is not None else self.negative_ttl
+        self.entries[tag] = (self.clock() + ttl, profile)
+        self.entries.move_to_end(tag)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+class ProfileService:
+    """
+    Async player profile lookups, cached and deduplicated.
+
+    `fetch(tag)` is a coroutine returning the raw /players/{tag} body, or
+    None if the request failed; the crawler passes one that goes through
+    its rate limiter, circuit breaker and retries, so profile requests
+    share the battle log requests' quota.
+
+    Lookups are answered from the ProfileCache when possible. A lookup for
+    a tag that is already being fetched waits for that request instead of
+    making another. The others are queued and dispatched in batches of up
+    to `batch_size` concurrent requests, after waiting `batch_window`
+    seconds for the rest of a batch to arrive. The API has no multi-player
+    endpoint, so a batch bounds how many profile requests compete with
+    battle log fetches at a time rather than saving requests itself.
+
+    `budget`, when set, is a callable returning how many profile requests
+    may have been made so far; lookups past it return None without a
+    request, which caps the request overhead of profile data.
+    """
+
+    def __init__(self, fetch, cache=None, batch_size=16, batch_window=0.005, budget=None):
+        self.fetch = fetch
+        self.cache = cache if cache is not None else ProfileCache()
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.budget = budget
+        self.pending = {}
+        self.queue = []
+        self.dispatcher = None
+        self.lookups = 0
+        self.coalesced = 0
+        self.requests = 0
+        self.failures = 0
+        self.skipped = 0
+        self.found = 0
+
+    async def get(self, tag):
+        """
+        Returns:
+        dict: the player's profile (see PROFILE_FIELDS), or None if it is
+        unavailable or over budget
+        """
+        self.lookups += 1
+        profile = await self._lookup(tag)
+        if profile is not None:
+            self.found += 1
+        return profile
+
+    async def _lookup(self, tag):
+        profile = self.cache.get(tag, _MISSING)
+        if profile is not _MISSING:
+            return profile
+        future = self.pending.get(tag)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if self.budget is not None and self.requests + len(self.queue) >= self.budget():
+                self.skipped += 1
+                return None
+            future = asyncio.get_running_loop().create_future()
+            self.pending[tag] = future
+            self.queue.append(tag)
+            if self.dispatcher is None or self.dispatcher.done():
+                self.dispatcher = asyncio.create_task(self._dispatch())
+        # Shielded so a cancelled caller does not cancel the shared lookup
+        return await asyncio.shield(future)
+
+    async def get_many(self, tags):
+        """
+        Looks up several players at once.
+
+        Returns:
+        dict: tag -> profile or None
+        """
+        tags = list(dict.fromkeys(tags))
+        profiles = await asyncio.gather(*(self.get(tag) for tag in tags))
+        return dict(zip(tags, profiles))
+
+    async def _dispatch(self):
+        # Let the other lookups of this round of battle logs join the batch
+        await asyncio.sleep(self.batch_window)
+        while self.queue:
+            batch, self.queue = self.queue[:self.batch_size], self.queue[self.batch_size:]
+            await asyncio.gather(*(self._resolve(tag) for tag in batch))
+
+    async def _resolve(self, tag):
+        self.requests += 1
+        profile = None
+        try:
+            body = await self.fetch(tag)
+            if body is not None:
+                profile = parse_profile(body)
+        finally:
+            if profile is None:
+                self.failures += 1
+            self.cache.put(tag, profile)
+            future = self.pending.pop(tag)
+            if not future.done():
+                future.set_result(profile)
+
+    async def close(self):
+        """Cancels queued lookups; their callers get None."""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, return_exceptions=True)
+        for future in self.pending.values():
+            if not future.done():
+                future.set_result(None)
+        self.pending.clear()
+        self.queue.clear()
+
+    def counters(self):
+        """Lookup counts for CrawlMetrics."""
+        return {
+            "profile_lookups": self.lookups,
+            "profile_cache_hits": self.cache.hits,
+            "profile_coalesced": self.coalesced,
+            "profile_requests": self.requests,
+            "profile_failures": self.failures,
+            "profile_skipped": self.skipped,
+            "profile_found": self.found,
+        }
+
+    def summary(self):
+        found_share = 100 * self.found / self.lookups if self.lookups else 0.0
+        return (
+            f"Looked up {self.lookups} player profiles: {self.cache.hits} from the cache, "
+            f"{self.coalesced} joined an in-flight request, {self.requests} requested "
+            f"({self.failures} failed), {self.skipped} skipped over the request budget; "
+            f"{found_share:.1f}% found a profile."
+        )
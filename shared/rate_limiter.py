@@ -0,0 +1,123 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header into a number of seconds.
+
+    Args:
+    value (str): header value, either delta-seconds or an HTTP date
+
+    Returns:
+    float: seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RateLimiter:
+    """
+    Shared request gate for API crawlers.
+
+    A token bucket keeps the request rate under the API key's quota, and an
+    AIMD window controls how many requests may be in flight: the window grows
+    by about one request per round trip while responses are fast, and is
+    halved on a 429 or when latency climbs past `slow_latency`. A Retry-After
+    header pauses every caller until the server is ready again.
+
+    Usage:
+    await limiter.acquire()
+    ... make the request ...
+    limiter.release(response.status, latency, response.headers.get('Retry-After'))
+    """
+
+    def __init__(self, requests_per_second, burst=None, initial_concurrency=5,
+                 min_concurrency=1, max_concurrency=64, slow_latency=2.0,
+                 default_retry_after=1.0):
+        self.rate = requests_per_second
+        self.burst = burst if burst is not None else max(1.0, requests_per_second)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.slow_latency = slow_latency
+        self.default_retry_after = default_retry_after
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self.slot_freed = asyncio.Event()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        # Wait for a slot in the concurrency window
+        while self.in_flight >= int(self.concurrency):
+            self.slot_freed.clear()
+            await self.slot_freed.wait()
+        self.in_flight += 1
+
+        # Then wait for a token, honoring any Retry-After pause
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """
+        Frees the caller's slot and feeds the outcome back into the window.
+
+        Args:
+        status (int): HTTP status of the response, or None if the request failed
+        latency (float): seconds the request took
+        retry_after (str): raw Retry-After header value, if any
+        """
+        now = time.monotonic()
+        if status == 429:
+            self.throttled += 1
+            pause = parse_retry_after(retry_after)
+            self.paused_until = max(self.paused_until, now + (pause if pause is not None else self.default_retry_after))
+            self.tokens = 0
+            self._decrease(now, latency)
+        elif status is None or status >= 500 or (latency is not None and latency > self.slow_latency):
+            self._decrease(now, latency)
+        else:
+            # Additive increase: roughly one extra slot per full window of successes
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        self._release_slot()
+
+    def _decrease(self, now, latency):
+        # Only back off once per round trip so a burst of bad responses from
+        # the same window does not collapse it to the minimum
+        if now - self.last_decrease < (latency or self.slow_latency):
+            return
+        self.last_decrease = now
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self.slot_freed.set()
@@ -0,0 +1,84 @@
+import asyncio
+import random
+import time
+from collections import Counter
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """
+    Capped exponential backoff with full jitter.
+
+    Args:
+    attempt (int): retry number, starting at 1
+    base (float): delay scale of the first retry in seconds
+    cap (float): upper bound of the delay in seconds
+
+    Returns:
+    float: seconds to sleep before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Pauses request dispatch while the API looks degraded.
+
+    After `failure_threshold` consecutive failures (5xx, timeouts, dropped
+    connections) the breaker opens and callers of wait() are held for
+    `reset_timeout` seconds. It then lets a single probe request through;
+    the probe's outcome either closes the breaker or opens it again.
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=30.0, probe_interval=0.5):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    async def wait(self):
+        while self.state != "closed":
+            if self.state == "open":
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    continue
+                self.state = "half_open"
+            if not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            await asyncio.sleep(self.probe_interval)
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+        self.probe_in_flight = False
+
+
+class RequestStats:
+    """Per-outcome request counters (ok, not_found, throttled, server_error, timeout, ...)."""
+
+    def __init__(self):
+        self.outcomes = Counter()
+
+    def record(self, outcome):
+        self.outcomes[outcome] += 1
+
+    def get(self, outcome):
+        return self.outcomes[outcome]
+
+    def summary(self):
+        return ", ".join(f"{outcome}={count}" for outcome, count in sorted(self.outcomes.items()))
@@ -0,0 +1,136 @@
+import asyncio
+import glob
+import os
+
+from shared.battlelog_decode import json_loads
+from shared.checkpoint import read_journal_players
+
+# Most players a ranking endpoint returns
+RANKING_LIMIT = 200
+
+
+def read_seed_file(path):
+    """
+    Reads player tags, one per line, with or without the '#'. Blank lines
+    are skipped and tags are upper-cased.
+
+    Returns:
+    list: '#'-prefixed tags in file order
+    """
+    tags = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            tag = line.strip().upper()
+            if tag:
+                tags.append(tag if tag.startswith("#") else "#" + tag)
+    return tags
+
+
+def previous_run_tags(directory, exclude=None):
+    """
+    Tags collected by earlier crawls whose checkpoint journals are in
+    `directory`, newest crawl first. Each crawl's unvisited frontier comes
+    before the players it visited, whose logs have likely refilled since.
+
+    Args:
+    directory (str): where the crawls' CSVs and journals are, e.g. raw_data
+    exclude (str): journal to leave out, such as the current crawl's
+
+    Returns:
+    list: player tags, possibly repeated across crawls
+    """
+    journals = [path for path in glob.glob(os.path.join(directory, "*.journal")) if path != exclude]
+    tags = []
+    for journal in sorted(journals, key=os.path.getmtime, reverse=True):
+        visited, frontier = read_journal_players(journal)
+        tags += frontier + visited
+    return tags
+
+
+def parse_ranking(body):
+    """Tags of a /rankings/{location}/players response, best ranked first."""
+    try:
+        items = json_loads(body).get("items", ())
+    except (ValueError, AttributeError):
+        return []
+    return [item["tag"] for item in items if isinstance(item, dict) and item.get("tag")]
+
+
+def interleave(sources, limit=None):
+    """
+    Merges tag lists round-robin, dropping repeats, so that a `limit`
+    keeps a share of every source instead of the head of the first.
+
+    Returns:
+    list: distinct tags
+    """
+    merged = {}
+    iterators = [iter(source) for source in sources]
+    while iterators and (limit is None or len(merged) < limit):
+        for iterator in list(iterators):
+            tag = next(iterator, None)
+            if tag is None:
+                iterators.remove(iterator)
+                continue
+            merged[tag] = None
+            if limit is not None and len(merged) >= limit:
+                break
+    return list(merged)
+
+
+class SeedSources:
+    """
+    Where a crawl's initial frontier comes from, besides its start tag.
+
+    - `tags`: seed tags given directly
+    - `files`: seed files (see read_seed_file)
+    - `rankings`: ranking locations to read players from, 'global' or
+      country codes such as 'US'; the top RANKING_LIMIT players of each
+    - `previous_runs`: directory of earlier crawls to reuse the tags of
+      (see previous_run_tags)
+
+    At most `limit` distinct tags are kept, taken from the sources in turn.
+    """
+
+    def __init__(self, tags=(), files=(), rankings=(), previous_runs=None, limit=20000):
+        self.tags = list(tags)
+        self.files = list(files)
+        self.rankings = list(rankings)
+        self.previous_runs = previous_runs
+        self.limit = limit
+        # source name -> tags it supplied
+        self.counts = {}
+
+    def __bool__(self):
+        return bool(self.tags or self.files or self.rankings or self.previous_runs)
+
+    async def collect(self, fetch, exclude_journal=None):
+        """
+        Gathers the seed tags.
+
+        Args:
+        fetch (callable): coroutine taking an API path and returning the
+            raw body, or None if the request failed
+        exclude_journal (str): journal of the current crawl, left out of
+            the previous runs
+
+        Returns:
+        list: distinct seed tags, at most `limit`
+        """
+        sources = {}
+        if self.tags:
+            sources["tags"] = self.tags
+        for path in self.files:
+            sources[path] = read_seed_file(path)
+        bodies = await asyncio.gather(
+            *(fetch(f"/rankings/{location}/players?limit={RANKING_LIMIT}") for location in self.rankings)
+        )
+        for location, body in zip(self.rankings, bodies):
+            sources[f"ranking {location}"] = parse_ranking(body) if body is not None else []
+        if self.previous_runs:
+            sources["previous runs"] = previous_run_tags(self.previous_runs, exclude_journal)
+        self.counts = {name: len(tags) for name, tags in sources.items()}
+        return interleave(sources.values(), self.limit)
+
+    def summary(self):
+        return ", ".join(f"{name}: {count}" for name, count in self.counts.items())
@@ -0,0 +1,182 @@
+import asyncio
+import queue
+
+from shared.dedup import DigestSet, mix64
+
+# Fields of a shard's slot in the shared status array
+STATUS_FIELDS = ("rows", "unique_battles", "duplicate_battles", "sent", "received", "idle")
+# Items per hand-off message, and seconds between flushes of partial batches
+HANDOFF_BATCH = 512
+HANDOFF_INTERVAL = 0.05
+
+
+def shard_of(code, shards):
+    """
+    Shard owning a packed player tag or battle digest.
+
+    Packed tags are structured (see shared.tags), so they are mixed before
+    taking the remainder; every process maps a key to the same shard.
+    """
+    return mix64(code) % shards
+
+
+class ShardRouter:
+    """
+    One crawler process's view of a sharded crawl.
+
+    Players and battles are partitioned by shard_of(): a shard fetches only
+    the players it owns and is the only one to dedup and write the battles
+    it owns. Sightings of other shards' players and battles they own are
+    batched per destination and handed off through that shard's inbox, a
+    multiprocessing queue. Each shard keeps the digests it has already
+    forwarded, so a battle seen again through another of its players is not
+    sent twice.
+
+    The process publishes its counters and whether it is idle in its slot
+    of `status`, a shared array with len(STATUS_FIELDS) values per shard,
+    and stops once the coordinator sets `stop`. Before writing a row it
+    takes it from the crawl's `target` in that array (see reserve_row()),
+    so the shards together never write more than `target` rows.
+
+    Args:
+    index (int): this shard
+    inboxes (list): one multiprocessing queue per shard
+    status: multiprocessing.Array of int64 shared by all shards
+    stop: multiprocessing.Event set by the coordinator to end the crawl
+    target (int): rows of the whole crawl; None for no limit
+    """
+
+    def __init__(self, index, inboxes, status, stop, target=None):
+        self.index = index
+        self.shards = len(inboxes)
+        self.inboxes = inboxes
+        self.status = status
+        self.stop = stop
+        self.target = target
+        self.target_reached = False
+        self.outgoing = [([], []) for _ in range(self.shards)]
+        self.outgoing_items = 0
+        self.forwarded = DigestSet()
+        self.sent = 0
+        self.received = 0
+
+    def owns_player(self, player_code):
+        return shard_of(player_code, self.shards) == self.index
+
+    def owns_battle(self, battle_hash):
+        return shard_of(battle_hash, self.shards) == self.index
+
+    def forward_player(self, player_code, battle_time, valid_share):
+        players, _ = self.outgoing[shard_of(player_code, self.shards)]
+        players.append((player_code, battle_time, valid_share))
+        self._count_outgoing()
+
+    def forward_battle(self, battle_hash, row):
+        """
+        Hands a battle to its owner unless this shard forwarded it before.
+
+        Returns:
+        bool: True if the battle was new to this shard
+        """
+        if not self.forwarded.add(battle_hash):
+            return False
+        _, battles = self.outgoing[shard_of(battle_hash, self.shards)]
+        battles.append((battle_hash, row))
+        self._count_outgoing()
+        return True
+
+    def _count_outgoing(self):
+        self.outgoing_items += 1
+        if self.outgoing_items >= HANDOFF_BATCH:
+            self.flush()
+
+    def flush(self):
+        for shard, (players, battles) in enumerate(self.outgoing):
+            if players or battles:
+                self.inboxes[shard].put((players, battles))
+                self.outgoing[shard] = ([], [])
+                self.sent += 1
+        self.outgoing_items = 0
+
+    def reserve_row(self):
+        """
+        Takes one row of the crawl's target for this shard. The rows field
+        of each shard's status slot is raised here, under the array's lock,
+        so every shard sees the rows taken so far and not only those of
+        the last publish().
+
+        Returns:
+        bool: True if the shard may write the row, False once the target is reached
+        """
+        if self.target is None:
+            return True
+        if self.target_reached:
+            return False
+        width = len(STATUS_FIELDS)
+        rows = STATUS_FIELDS.index("rows")
+        with self.status.get_lock():
+            if sum(self.status[shard * width + rows] for shard in range(self.shards)) >= self.target:
+                self.target_reached = True
+                return False
+            self.status[self.index * width + rows] += 1
+        return True
+
+    def publish(self, rows, battle_tracker, idle):
+        values = (rows, battle_tracker.unique_battles, battle_tracker.duplicate_battles,
+                  self.sent, self.received, int(idle))
+        start = self.index * len(STATUS_FIELDS)
+        with self.status.get_lock():
+            self.status[start:start + len(STATUS_FIELDS)] = values
+
+    async def receive(self, on_players, on_battles):
+        """
+        Applies hand-offs from other shards until cancelled.
+
+        Args:
+        on_players (callable): called with a list of (code, battle time, valid share)
+        on_battles (callable): called with a list of (digest, row or None)
+        """
+        inbox = self.inboxes[self.index]
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Drain without blocking first; only wait in a thread when empty
+                players, battles = inbox.get_nowait()
+            except queue.Empty:
+                try:
+                    players, battles = await loop.run_in_executor(None, inbox.get, True, HANDOFF_INTERVAL)
+                except queue.Empty:
+                    continue
+            on_players(players)
+            on_battles(battles)
+            self.received += 1
+
+    async def run(self, crawl, rows, idle):
+        """
+        Flushes hand-offs and publishes status every HANDOFF_INTERVAL, and
+        sets `crawl.target_reached` once the coordinator stops the crawl.
+
+        Args:
+        rows (callable): returns the rows this shard has written
+        idle (callable): returns True when the shard has nothing to fetch
+        """
+        while not self.stop.is_set():
+            self.flush()
+            self.publish(rows(), crawl.battle_tracker, idle())
+            await asyncio.sleep(HANDOFF_INTERVAL)
+        crawl.target_reached.set()
+
+
+def read_status(status, shards):
+    """Returns one dict of STATUS_FIELDS per shard."""
+    with status.get_lock():
+        values = status[:]
+    width = len(STATUS_FIELDS)
+    return [dict(zip(STATUS_FIELDS, values[shard * width:(shard + 1) * width])) for shard in range(shards)]
+
+
+def crawl_finished(statuses):
+    """True when no shard has anything to fetch and no hand-off is in transit."""
+    return all(status["idle"] for status in statuses) and (
+        sum(status["sent"] for status in statuses) == sum(status["received"] for status in statuses)
+    )
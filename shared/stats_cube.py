@@ -0,0 +1,254 @@
+import numpy as np
+
+from shared.battle_data import dataset_signature, load_battle_codes, stats_cube_path_for
+from shared.columnar import BRAWLER_COLUMNS
+from shared.crawl_index import load_index, open_index, save_index
+from shared.pair_matrices import CHUNK_ROWS, UNSEEN, first_events
+
+FORMAT_VERSION = 1
+HEADER = "cube.json"
+# Arrays of a saved cube
+ARRAYS = ("counts", "battles", "first_seen")
+# Last axis of the count cube
+WIN, LOSS = 0, 1
+# Brawler slots per battle, missing ones included
+SLOTS = len(BRAWLER_COLUMNS)
+
+
+def count_cube(battles, chunk_rows=CHUNK_ROWS):
+    """
+    Counts brawler slots by mode, map, brawler and result.
+
+    Args:
+    battles (ColumnarBattles): the crawl's codes (see load_battle_codes)
+
+    Returns:
+    tuple: (counts, battle_counts), where counts is a (modes, maps,
+    brawlers, 2) int64 array, counts[mode, map, brawler, WIN] being the
+    times the brawler won in that mode on that map, and battle_counts a
+    (modes, maps) int64 array of battles
+    """
+    modes, maps, brawlers = (len(battles.vocabularies[name]) for name in ("battle_mode", "map_name", "brawler"))
+    counts = np.zeros(modes * maps * brawlers * 2, dtype=np.int64)
+    battle_counts = np.zeros(modes * maps, dtype=np.int64)
+    for start in range(0, battles.rows, chunk_rows):
+        end = start + chunk_rows
+        cell = np.asarray(battles.codes["battle_mode"][start:end], dtype=np.int64) * maps
+        cell += battles.codes["map_name"][start:end]
+        battle_counts += np.bincount(cell, minlength=modes * maps)
+        for slot, column in enumerate(BRAWLER_COLUMNS):
+            brawler = np.asarray(battles.codes[column][start:end], dtype=np.int64)
+            result = WIN if slot < 3 else LOSS
+            ids = (cell * brawlers + brawler) * 2 + result
+            counts += np.bincount(ids[brawler != 0], minlength=counts.size)
+    return counts.reshape(modes, maps, brawlers, 2), battle_counts.reshape(modes, maps)
+
+
+def first_map_brawler_events(battles, present):
+    """
+    Where each (map, brawler) first appears in the row-by-row loop of
+    create_map_brawler_winrates, which visits each row's winner slots and
+    then its loser slots.
+
+    Args:
+    present (np.ndarray): (maps, brawlers) bool, the pairs with any games
+
+    Returns:
+    np.ndarray: (maps, brawlers) int64 loop positions, int64 max where absent
+    """
+    brawlers = present.shape[1]
+
+    def block_events(start, end):
+        map_codes = np.asarray(battles.codes["map_name"][start:end], dtype=np.int64)[:, None]
+        slots = np.stack([np.asarray(battles.codes[column][start:end], dtype=np.int64) for column in BRAWLER_COLUMNS], axis=1)
+        return map_codes * brawlers + slots, slots != 0
+
+    return first_events(battles.rows, present, block_events)
+
+
+class StatsCube:
+    """
+    Brawler win and loss counts of a crawl by battle mode, map and brawler,
+    for any slice of modes and maps without another pass over the crawl.
+
+    - counts: (modes, maps, brawlers, 2) slot counts, [..., WIN] and [..., LOSS]
+    - battles: (modes, maps) battle counts, for pick rates
+    - first_seen: (maps, brawlers) position of each map and brawler's first
+      slot in the crawl, which keeps the order of brawler_map_winrates.json
+    - vocabularies: the names of the codes; code 0 is a missing value
+
+    A cube is built once per dataset and saved next to it as a `.cube`
+    directory of `.npy` arrays plus `cube.json` (vocabularies and the
+    signature of the dataset it was built from).
+    """
+
+    def __init__(self, counts, battles, first_seen, vocabularies, source=None):
+        self.counts = counts
+        self.battles = battles
+        self.first_seen = first_seen
+        self.vocabularies = vocabularies
+        self.source = source
+        self.codes = {
+            name: {value: code for code, value in enumerate(values) if code} for name, values in vocabularies.items()
+        }
+
+    @classmethod
+    def build(cls, dataset, source=None):
+        """Counts a crawl (`.csv` file or `.columnar` directory)."""
+        source = source or dataset_signature(dataset)
+        return cls.from_battles(load_battle_codes(dataset), source)
+
+    @classmethod
+    def from_battles(cls, battles, source=None):
+        counts, battle_counts = count_cube(battles)
+        first_seen = first_map_brawler_events(battles, counts.sum(axis=(0, 3)) > 0)
+        return cls(counts, battle_counts, first_seen, battles.vocabularies, source)
+
+    def save(self, directory):
+        # Slot counts fit 32 bits for any crawl this side of 700M battles
+        counts = self.counts.astype(np.uint32) if self.counts.max(initial=0) < 2 ** 32 else self.counts
+        arrays = {"counts": counts, "battles": self.battles, "first_seen": self.first_seen}
+        header = {"format_version": FORMAT_VERSION, "vocabularies": self.vocabularies, "source": self.source}
+        save_index(directory, arrays, HEADER, header)
+
+    @classmethod
+    def load(cls, directory):
+        header, arrays = load_index(directory, ARRAYS, HEADER, FORMAT_VERSION)
+        counts = arrays["counts"].astype(np.int64)
+        return cls(counts, arrays["battles"], arrays["first_seen"], header["vocabularies"], header["source"])
+
+    def _select(self, name, values):
+        # None selects every value; unknown names select nothing
+        if values is None:
+            return np.arange(len(self.vocabularies[name]))
+        if isinstance(values, str):
+            values = [values]
+        return np.array([self.codes[name][value] for value in values if value in self.codes[name]], dtype=np.int64)
+
+    def select(self, battle_mode=None, map_name=None):
+        """
+        Sums a slice of the cube.
+
+        Args:
+        battle_mode (str or list): modes to keep; all of them by default
+        map_name (str or list): maps to keep; all of them by default
+
+        Returns:
+        tuple: (wins, losses, battles), where wins and losses are int64
+        arrays indexed by brawler code and battles the number of battles
+        """
+        cells = np.ix_(self._select("battle_mode", battle_mode), self._select("map_name", map_name))
+        counts = self.counts[cells].sum(axis=(0, 1))
+        return counts[:, WIN], counts[:, LOSS], int(self.battles[cells].sum())
+
+    def brawler_stats(self, battle_mode=None, map_name=None, min_games=1):
+        """
+        Brawlers of a slice ranked by win rate, ties by games.
+
+        Args:
+        battle_mode (str or list): modes to keep; all of them by default
+        map_name (str or list): maps to keep; all of them by default
+        min_games (int): leave out brawlers with fewer games in the slice
+
+        Returns:
+        list: dicts of brawler, wins, losses, games, win_rate (share of
+        games won), pick_rate (share of the slice's brawler slots) and rank
+        """
+        wins, losses, battles = self.select(battle_mode, map_name)
+        games = wins + losses
+        keep = np.flatnonzero(games >= max(min_games, 1))
+        win_rates = wins[keep] / games[keep]
+        order = keep[np.lexsort((-games[keep], -win_rates))]
+        brawlers = self.vocabularies["brawler"]
+        return [
+            {
+                "brawler": brawlers[code],
+                "wins": int(wins[code]),
+                "losses": int(losses[code]),
+                "games": int(games[code]),
+                "win_rate": float(wins[code] / games[code]),
+                "pick_rate": float(games[code] / (SLOTS * battles)),
+                "rank": rank,
+            }
+            for rank, code in enumerate(order.tolist(), start=1)
+        ]
+
+    def grouped(self, by, battle_mode=None, map_name=None, min_games=1):
+        """
+        brawler_stats() of every mode or every map of a slice.
+
+        Args:
+        by (str): 'battle_mode' or 'map_name'
+
+        Returns:
+        dict: mode or map -> brawler_stats() list, for those with battles
+        """
+        selection = {"battle_mode": battle_mode, "map_name": map_name}
+        groups = {}
+        for code in self._select(by, selection[by]).tolist():
+            if not code:
+                continue
+            value = self.vocabularies[by][code]
+            stats = self.brawler_stats(**{**selection, by: value, "min_games": min_games})
+            if stats:
+                groups[value] = stats
+        return groups
+
+    def brawler_totals(self):
+        """
+        Wins and games of every brawler that played, in name order, as
+        create_brawler_stats groups them.
+
+        Returns:
+        tuple: (brawlers, wins, games, slots), slots being every brawler
+        slot of the crawl, missing ones included
+        """
+        wins, losses, battles = self.select()
+        games = wins + losses
+        names = self.vocabularies["brawler"]
+        codes = sorted((code for code in np.flatnonzero(games).tolist() if code), key=names.__getitem__)
+        return [names[code] for code in codes], wins[codes], games[codes], SLOTS * battles
+
+    def map_brawler_stats(self):
+        """
+        Wins and losses per map and brawler, in the order the loop of
+        create_map_brawler_winrates first met them, for map_winrates_json.
+
+        Returns:
+        dict: map -> brawler -> {"wins", "losses"}
+        """
+        counts = self.counts.sum(axis=0)
+        maps, brawlers = self.vocabularies["map_name"], self.vocabularies["brawler"]
+        stats = {}
+        map_first = self.first_seen.min(axis=1)
+        for map_code in np.argsort(map_first, kind="stable").tolist():
+            if map_first[map_code] == UNSEEN:
+                break
+            row = self.first_seen[map_code]
+            seen = np.argsort(row, kind="stable")[:int((row != UNSEEN).sum())].tolist()
+            stats[maps[map_code]] = {
+                brawlers[code]: {"wins": int(counts[map_code, code, WIN]), "losses": int(counts[map_code, code, LOSS])}
+                for code in seen
+            }
+        return stats
+
+
+def open_stats_cube(dataset, directory=None):
+    """
+    Opens the stats cube of a crawl, building it first when there is none
+    or when the crawl changed since it was built.
+
+    Args:
+    dataset (str): a crawl `.csv` file or `.columnar` directory
+    directory (str): where the cube is kept; next to the crawl by default
+
+    Returns:
+    StatsCube: the cube
+    """
+    return open_index(dataset, directory or stats_cube_path_for(dataset), StatsCube.load, _build)
+
+
+def _build(dataset, source, directory):
+    cube = StatsCube.build(dataset, source)
+    cube.save(directory)
+    return cube
@@ -0,0 +1,45 @@
+# Characters used in Brawl Stars player and club tags
+TAG_ALPHABET = "0289PYLQGRJCUV"
+_BASE = len(TAG_ALPHABET) + 1
+_DIGITS = {char: index + 1 for index, char in enumerate(TAG_ALPHABET)}
+# 15^16 < 2^64, so tags of up to 16 characters fit in an unsigned 64-bit int
+MAX_TAG_LENGTH = 16
+
+
+def encode_tag(player_tag):
+    """
+    Packs a player tag into a nonzero integer below 2^64.
+
+    Each character maps to a digit 1-14 of a base-15 number, so leading
+    '0' characters survive the round trip and 0 is never a valid code.
+
+    Args:
+    player_tag (str): tag such as '#PLYYP2RRQ', with or without the '#'
+
+    Returns:
+    int: the packed tag
+
+    Raises:
+    ValueError: if the tag is empty, too long or uses other characters
+    """
+    body = player_tag[1:] if player_tag.startswith("#") else player_tag
+    if not body or len(body) > MAX_TAG_LENGTH:
+        raise ValueError(f"Invalid player tag: {player_tag!r}")
+    code = 0
+    try:
+        for char in body:
+            code = code * _BASE + _DIGITS[char]
+    except KeyError:
+        raise ValueError(f"Invalid player tag: {player_tag!r}") from None
+    return code
+
+
+def decode_tag(code):
+    """
+    Unpacks an integer produced by encode_tag back into a '#'-prefixed tag.
+    """
+    chars = []
+    while code:
+        code, digit = divmod(code, _BASE)
+        chars.append(TAG_ALPHABET[digit - 1])
+    return "#" + "".join(reversed(chars))
@@ -0,0 +1,91 @@
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# A gzipped battle log is about a fifth of its raw size
+ACCEPT_ENCODING = "gzip, deflate"
+# aiohttp's defaults are 10 s of DNS caching and 15 s of keep-alive; a crawl
+# talks to one host for hours, so hold on to both for longer
+DNS_CACHE_SECONDS = 300
+KEEPALIVE_SECONDS = 60
+
+
+def create_session(limit=100, limit_per_host=0, headers=None, trace_configs=None):
+    """
+    aiohttp session over a pooled, keep-alive connection pool.
+
+    Connections are reused across requests up to `limit` in total and
+    `limit_per_host` per host (0 means no per-host limit), resolved names
+    are cached for DNS_CACHE_SECONDS and responses are requested compressed.
+    Use the session and each response with `async with` so connections
+    always go back to the pool, even when a request fails midway.
+
+    Args:
+    limit (int): most open connections in total
+    limit_per_host (int): most open connections to one host
+    headers (dict): headers sent with every request
+    trace_configs (list): aiohttp.TraceConfig instances, e.g. ConnectionStats.trace_config()
+
+    Returns:
+    aiohttp.ClientSession
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=DNS_CACHE_SECONDS,
+        keepalive_timeout=KEEPALIVE_SECONDS,
+        # Abort TLS connections the server dropped instead of leaking them
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})},
+        trace_configs=trace_configs,
+    )
+
+
+def create_sync_session(pool_size=10, headers=None):
+    """
+    requests session that keeps connections alive between calls.
+
+    A bare requests.get() builds a new session, and with it a new TCP and
+    TLS connection, for every call.
+
+    Args:
+    pool_size (int): connections kept open per host
+    headers (dict): headers sent with every request
+
+    Returns:
+    requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})})
+    return session
+
+
+class ConnectionStats:
+    """Counts connections opened and reused by an aiohttp session."""
+
+    def __init__(self):
+        self.opened = 0
+        self.reused = 0
+
+    def trace_config(self):
+        async def on_create(session, context, params):
+            self.opened += 1
+
+        async def on_reuse(session, context, params):
+            self.reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def reuse_ratio(self):
+        """Share of requests that went over an already open connection."""
+        total = self.opened + self.reused
+        return self.reused / total if total else 0.0
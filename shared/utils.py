@@ -1,5 +1,4 @@
 import os
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +10,30 @@ if not API_KEY:
 HEADERS = {
     'Authorization': f'Bearer {API_KEY}'
 }
+# Seconds to wait for the API before giving up on a lookup
+REQUEST_TIMEOUT = 10
+
+# Built on the first lookup, so modules that only import print_progress_bar
+# do not load the HTTP stack:
+# - a session shared by every call, so lookups reuse one kept-alive connection
+# - the profiles already fetched, so repeated lookups of a player are free
+_session = None
+_profiles = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        from shared.transport import create_sync_session
+        _session = create_sync_session(headers=HEADERS)
+    return _session
+
+def get_profile_cache():
+    global _profiles
+    if _profiles is None:
+        from shared.profiles import ProfileCache
+        _profiles = ProfileCache(max_size=10000)
+    return _profiles
 
 def get_player_name(player_tag):
     """
@@ -22,15 +45,24 @@ def get_player_name(player_tag):
     Returns:
         str: The name of the player.
     """
+    from shared.profiles import parse_profile
+
+    profiles = get_profile_cache()
+    player_data = profiles.get(player_tag)
+    if player_data is not None:
+        return player_data.get('name') or 'Unknown'
     BASE_URL = f'https://api.brawlstars.com/v1/players/{player_tag.replace("#", "%23")}'
-    response = requests.get(BASE_URL, headers=HEADERS)
-    
-    if response.status_code == 200:
-        player_data = response.json()
-        return player_data.get('name', 'Unknown')
-    else:
-        print(f"Failed to fetch player data: {response.status_code}, {response.text} using request URL: {BASE_URL}")
-        return 'Unknown'
+    # The with block returns the connection to the pool on every path
+    with get_session().get(BASE_URL, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 200:
+            player_data = parse_profile(response.content)
+            if player_data is None:
+                return 'Unknown'
+            profiles.put(player_tag, player_data)
+            return player_data.get('name') or 'Unknown'
+        else:
+            print(f"Failed to fetch player data: {response.status_code}, {response.text} using request URL: {BASE_URL}")
+            return 'Unknown'
 
 def print_progress_bar(iteration, total, prefix='', suffix='', decimals=1, length=50, fill='█', print_end="\r"):
     """
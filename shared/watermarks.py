@@ -0,0 +1,78 @@
+import numpy as np
+
+from shared.dedup import DigestMap
+
+
+def next_poll_time(now, battle_times, min_interval, max_interval, fraction=0.5):
+    """
+    Schedules a player's next battle log poll.
+
+    A log always holds the player's most recent battles, so the time it
+    spans says how fast it rolls over. Polling again after `fraction` of
+    that span keeps an active player's new battles from dropping out of the
+    log between polls without re-fetching a quiet player too often.
+
+    Args:
+    now (float): current Unix time
+    battle_times (list): Unix times of the battles in the fetched log
+    min_interval (float): shortest time between polls, in seconds
+    max_interval (float): longest time between polls, in seconds
+    fraction (float): share of the log's span to wait
+
+    Returns:
+    float: Unix time of the next poll
+    """
+    if len(battle_times) < 2:
+        return now + max_interval
+    span = max(battle_times) - min(battle_times)
+    return now + min(max_interval, max(min_interval, fraction * span))
+
+
+class PlayerWatermarks:
+    """
+    Per-player newest ingested battleTime and next scheduled poll.
+
+    Battles at or before a player's watermark were already processed, so a
+    re-fetch only needs the items after it. Entries are keyed by packed
+    player tags (see shared.tags) and persisted through the checkpoint
+    journal, so they survive across runs of the same crawl.
+
+    Entries are kept in a DigestMap as two uint32 Unix times, about 24
+    bytes per player. Only --refresh reads them back, so other crawls pass
+    `track=False`: they still journal watermarks for a later refresh but
+    keep none in memory.
+    """
+
+    def __init__(self, track=True):
+        self.track = track
+        self.players = DigestMap([("watermark", np.uint32), ("next_poll", np.uint32)])
+
+    def get(self, player_code):
+        """Returns the player's watermark, or 0 if they were never fetched."""
+        entry = self.players.get(player_code)
+        return entry[0] if entry else 0
+
+    def update(self, player_code, watermark, next_poll):
+        if self.track:
+            self.players.set(player_code, watermark, next_poll)
+
+    def due(self, now, active_window=None):
+        """
+        Players whose next poll is due, most overdue first.
+
+        Args:
+        now (float): current Unix time
+        active_window (float): skip players whose newest battle is older than this many seconds
+
+        Returns:
+        list: packed tags of the players to poll
+        """
+        player_codes, values = self.players.items()
+        due = values["next_poll"] <= now
+        if active_window is not None:
+            due &= values["watermark"] >= now - active_window
+        player_codes = player_codes[due]
+        return player_codes[np.lexsort((player_codes, values["next_poll"][due]))].tolist()
+
+    def __len__(self):
+        return len(self.players)